@@ -0,0 +1,130 @@
+"""
+Микро-бенчмарк форматов сериализации кэша API на документах индекса movies.
+
+Документы берутся из индекса Elasticsearch (--elastic) или собираются из фикстур
+админки тем же способом, что и в ETL ps_to_es (FilmWork.to_es).
+
+Запуск из корня репозитория:
+    python docs/cache_codecs_research/benchmark.py
+    python docs/cache_codecs_research/benchmark.py --elastic http://localhost:9200
+"""
+import argparse
+import gzip
+import json
+import pickle
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, List
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR / 'src' / 'api'))
+
+from engines.cache.codecs import CODECS, CacheSerializer  # noqa: E402
+from models.film import Film  # noqa: E402
+
+FIXTURES_PATH = ROOT_DIR / 'deploy' / 'admin_panel' / 'fixtures.json.gz'
+REPEATS = 5
+
+
+def load_from_fixtures(path: Path) -> List[dict]:
+    """Собирает документы индекса movies из фикстур админки."""
+    objects = json.load(gzip.open(path))
+    by_model = defaultdict(dict)
+    for obj in objects:
+        by_model[obj['model']][obj['pk']] = obj['fields']
+
+    genres = defaultdict(list)
+    for link in by_model['movies.filmworkgenre'].values():
+        genre_id = link['genre']
+        genres[link['film_work']].append(
+            {'uuid': genre_id, 'name': by_model['movies.genre'][genre_id]['name']},
+        )
+    persons = defaultdict(lambda: defaultdict(list))
+    for link in by_model['movies.filmworkperson'].values():
+        person_id = link['person']
+        person = {'uuid': person_id, 'full_name': by_model['movies.person'][person_id]['full_name']}
+        persons[link['film_work']][link['role']].append(person)
+
+    docs = []
+    for film_id, film in by_model['movies.filmwork'].items():
+        film_persons = persons[film_id]
+        doc = {
+            'uuid': film_id,
+            'imdb_rating': film['rating'],
+            'genres': genres[film_id],
+            'title': film['title'],
+            'description': film['description'],
+        }
+        for role in ('director', 'actor', 'writer'):
+            doc[f'{role}s_names'] = ','.join(p['full_name'] for p in film_persons[role])
+            doc[f'{role}s'] = film_persons[role]
+        docs.append(doc)
+    return docs
+
+
+def load_from_elastic(host: str, size: int) -> List[dict]:
+    """Загружает документы из индекса movies."""
+    from elasticsearch import Elasticsearch
+
+    elastic = Elasticsearch([host])
+    response = elastic.search(index='movies', body={'query': {'match_all': {}}, 'size': size})
+    return [hit['_source'] for hit in response['hits']['hits']]
+
+
+def measure(func: Callable, items: list) -> float:
+    """Возвращает медианное время обработки одного элемента в микросекундах."""
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for item in items:
+            func(item)
+        timings.append((time.perf_counter() - started) / len(items) * 1_000_000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--elastic', help='Адрес Elasticsearch, например http://localhost:9200.')
+    parser.add_argument('--size', type=int, default=1000, help='Количество документов из Elasticsearch.')
+    parser.add_argument('--threshold', type=int, default=1024, help='Порог сжатия zstd в байтах.')
+    args = parser.parse_args()
+
+    sources = load_from_elastic(args.elastic, args.size) if args.elastic else load_from_fixtures(FIXTURES_PATH)
+    print(f'Документов: {len(sources)}\n')
+
+    # Прежний путь: в кэше pickle сырого _source, при попадании строится модель и сериализуется ответ.
+    pickled = [pickle.dumps(source) for source in sources]
+    legacy_size = statistics.mean(len(payload) for payload in pickled)
+    legacy_encode = measure(pickle.dumps, sources)
+    legacy_hit = measure(lambda payload: Film(**pickle.loads(payload)).json().encode(), pickled)
+
+    # Новый путь: в кэше данные в форме ответа API.
+    docs = [Film(**source).dict() for source in sources]
+    serializers = {}
+    for name in ('pickle', 'orjson', 'msgpack'):
+        serializers[name] = CacheSerializer(CODECS[name])
+        serializers[f'{name}+zstd'] = CacheSerializer(CODECS[name], compression_threshold=args.threshold)
+
+    header = f'{"Формат":<22}{"Размер, байт":>14}{"Запись, мкс":>14}{"Чтение, мкс":>14}{"Ответ, мкс":>13}'
+    print(header)
+    print('-' * len(header))
+    print(f'{"pickle _source (было)":<22}{legacy_size:>14.0f}{legacy_encode:>14.1f}{"-":>14}{legacy_hit:>13.1f}')
+    for name, serializer in serializers.items():
+        payloads = [serializer.encode(doc) for doc in docs]
+        size = statistics.mean(len(payload) for payload in payloads)
+        encode = measure(serializer.encode, docs)
+        decode = measure(serializer.decode, payloads)
+        to_json = measure(serializer.to_json, payloads)
+        print(f'{name:<22}{size:>14.0f}{encode:>14.1f}{decode:>14.1f}{to_json:>13.1f}')
+
+    print(
+        '\nЗапись - сериализация для кэша; Чтение - декодирование в объекты Python;\n'
+        'Ответ - получение тела HTTP-ответа из данных кэша при попадании.',
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Бенчмарк преобразования сообщений о просмотрах для kafka_to_clickhouse: по строкам против колонок.
+
+Сравниваются два пути одной пачки сообщений:
+    - по строкам (было): transformer -> MovieWatch на сообщение (orjson.loads, два uuid.UUID,
+      utcfromtimestamp, astuple), вставка списком кортежей;
+    - по колонкам (стало): columnar_transformer -> MovieWatch.get_columns (один orjson.loads на пачку,
+      даты по номеру дня), вставка с columnar=True.
+
+Для каждого пути замеряются:
+    - transform - только преобразование сообщений;
+    - transform + native - преобразование и сериализация блока в формат Native так, как это делает
+      clickhouse-driver при INSERT (без сети и сервера);
+    - insert - полная вставка в ClickHouse, если указан --clickhouse (таблица создается и удаляется скриптом).
+Печатается скорость в строках в секунду (медиана по --repeats повторам).
+
+Запуск из корня репозитория:
+    python docs/columnar_transform_research/benchmark.py
+    python docs/columnar_transform_research/benchmark.py --rows 100000 --clickhouse localhost
+"""
+import argparse
+import io
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, List
+
+import orjson
+from clickhouse_driver import Client
+from clickhouse_driver.block import ColumnOrientedBlock, RowOrientedBlock
+from clickhouse_driver.context import Context
+from clickhouse_driver.streams.native import BlockOutputStream
+
+ETL_PATH = Path(__file__).resolve().parents[2] / 'src' / 'kafka_to_clickhouse'
+sys.path.append(str(ETL_PATH))
+
+from etl_tasks.movie_watch.data_structures import MovieWatch  # noqa: E402
+
+TABLE = 'movie_watches_benchmark'
+COLUMNS = [('MovieID', 'UUID'), ('UserID', 'UUID'), ('ViewDate', 'Date'), ('ViewTimestamp', 'UInt16')]
+# Ревизия протокола, с которой блок пишется вместе с BlockInfo (как для современных серверов).
+PROTOCOL_REVISION = 54449
+
+
+class FakeMessage:
+    """Сообщение Kafka с теми же методами, что использует MovieWatch."""
+
+    __slots__ = ('_value', '_timestamp')
+
+    def __init__(self, value: bytes, timestamp_ms: int):
+        self._value = value
+        self._timestamp = (1, timestamp_ms)
+
+    def value(self) -> bytes:
+        return self._value
+
+    def timestamp(self) -> tuple:
+        return self._timestamp
+
+
+def make_messages(rows: int) -> List[FakeMessage]:
+    movies = [str(uuid.uuid4()) for _ in range(1000)]
+    now_ms = int(time.time() * 1000)
+    return [
+        FakeMessage(
+            orjson.dumps({
+                'movie_id': random.choice(movies),
+                'client_id': str(uuid.uuid4()),
+                'view_ts': random.randint(0, 10000),
+            }),
+            now_ms - random.randint(0, 3 * 24 * 60 * 60 * 1000),
+        )
+        for _ in range(rows)
+    ]
+
+
+def make_context() -> Context:
+    context = Context()
+    context.server_info = SimpleNamespace(used_revision=PROTOCOL_REVISION, timezone='UTC')
+    context.settings = {}
+    context.client_settings = {
+        'strings_as_bytes': False,
+        'strings_encoding': 'utf-8',
+        'use_numpy': False,
+        'opentelemetry_traceparent': None,
+        'opentelemetry_tracestate': '',
+        'quota_key': '',
+        'input_format_null_as_default': False,
+        'namedtuple_as_json': False,
+    }
+    return context
+
+
+def rows_transform(messages: List[FakeMessage]) -> list:
+    return [MovieWatch.create_from_message(message).get_tuple() for message in messages]
+
+
+def columns_transform(messages: List[FakeMessage]) -> list:
+    return MovieWatch.get_columns(messages)
+
+
+def rows_native(messages: List[FakeMessage]) -> None:
+    block = RowOrientedBlock(COLUMNS, rows_transform(messages))
+    BlockOutputStream(io.BytesIO(), make_context()).write(block)
+
+
+def columns_native(messages: List[FakeMessage]) -> None:
+    block = ColumnOrientedBlock(COLUMNS, columns_transform(messages))
+    BlockOutputStream(io.BytesIO(), make_context()).write(block)
+
+
+def measure(func: Callable, messages: List[FakeMessage], repeats: int) -> float:
+    """Медианная скорость, строк в секунду."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(messages)
+        timings.append(time.perf_counter() - started)
+    return len(messages) / statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000, help='сообщений в пачке (как num_messages)')
+    parser.add_argument('--repeats', type=int, default=5, help='повторов каждого замера')
+    parser.add_argument('--clickhouse', help='хост ClickHouse для замера полной вставки')
+    args = parser.parse_args()
+
+    messages = make_messages(args.rows)
+    assert [list(column) for column in zip(*rows_transform(messages[:100]))] == [
+        [uuid.UUID(value) for value in column] if i < 2 else column
+        for i, column in enumerate(columns_transform(messages[:100]))
+    ], 'пути преобразования дают разные данные'
+
+    variants = [
+        ('transform', rows_transform, columns_transform),
+        ('transform + native', rows_native, columns_native),
+    ]
+    if args.clickhouse:
+        client = Client(host=args.clickhouse)
+        client.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        ddl = (ETL_PATH / 'etl_tasks/movie_watch/table.sql').read_text()
+        client.execute(ddl.replace('movie_watches', TABLE, 1))
+        query = MovieWatch.get_insert_query().replace('movie_watches', TABLE, 1)
+        variants.append((
+            'insert',
+            lambda batch: client.execute(query, rows_transform(batch)),
+            lambda batch: client.execute(query, columns_transform(batch), columnar=True),
+        ))
+
+    print(f'Сообщений в пачке: {args.rows}, повторов: {args.repeats}')
+    print(f'| {"Замер":<20} | по строкам, строк/с | по колонкам, строк/с | ускорение |')
+    print(f'|{"-" * 22}|--------------------:|---------------------:|----------:|')
+    for name, rows_func, columns_func in variants:
+        rows_speed = measure(rows_func, messages, args.repeats)
+        columns_speed = measure(columns_func, messages, args.repeats)
+        print(f'| {name:<20} | {rows_speed:19,.0f} | {columns_speed:20,.0f} | {columns_speed / rows_speed:8.1f}x |')
+
+    if args.clickhouse:
+        client.execute(f'DROP TABLE {TABLE}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+Бенчмарк переименования популярной персоны в индексе фильмов: полная пересборка против частичного обновления.
+
+Во временный индекс с маппингом movies загружаются --films фильмов с одной "звездой" среди актеров
+и --background фильмов без нее. Затем персона переименовывается --repeats раз двумя способами:
+    - полная пересборка (было): каждый фильм со звездой заново собирается (FilmWork.to_es)
+      и целиком загружается запросом _bulk;
+    - частичное обновление (стало): один запрос _update_by_query со скриптом
+      PersonNestedUpdate.to_es_update, меняющий только вложенные поля персон.
+Оба способа завершаются refresh индекса, чтобы сравнивать время до появления изменений в поиске.
+
+Полная пересборка в ETL дополнительно выполняет для каждого фильма тяжелый запрос enrich.sql,
+частичное обновление - только запрос имен измененных персон (person_update/enrich.sql).
+Если указан --postgres, оба запроса выполняются для персоны с наибольшим числом фильмов в базе
+и печатаются отдельными строками. С --populate-postgres в пустую базу сначала загружаются
+те же фильмы (схема из deploy/db/sql_scripts), после замера схема content удаляется.
+
+С --offline Elasticsearch не нужен: замеряется работа ETL на одно переименование
+(сборка и сериализация тела запроса), объем запроса, отправляемого в Elasticsearch,
+и, если указан --postgres, запросы к Postgres.
+
+Запуск из корня репозитория (нужен запущенный Elasticsearch):
+    python docs/nested_update_research/benchmark.py
+    python docs/nested_update_research/benchmark.py --offline
+    python docs/nested_update_research/benchmark.py --offline --postgres "dbname=scratch" --populate-postgres
+    python docs/nested_update_research/benchmark.py --elastic http://localhost:9200 --films 500 \\
+        --postgres "dbname=movies_database user=app password=123qwe host=localhost options='-c search_path=content'"
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+from elasticsearch import Elasticsearch, helpers
+from elasticsearch.serializer import JSONSerializer
+
+ETL_PATH = Path(__file__).resolve().parents[2] / 'src' / 'ps_to_es'
+DB_SCRIPTS_PATH = Path(__file__).resolve().parents[2] / 'deploy' / 'db' / 'sql_scripts'
+sys.path.append(str(ETL_PATH))
+
+from etl_tasks.film_work.data_structures import (  # noqa: E402
+    FilmWork,
+    FilmWorkGenre,
+    FilmWorkPerson,
+    PersonNestedUpdate,
+)
+
+INDEX = 'nested_update_benchmark'
+ROLES = ('actor', 'director', 'writer')
+
+
+def random_person(role: str) -> FilmWorkPerson:
+    return FilmWorkPerson(str(uuid.uuid4()), f'Person {random.randint(0, 10 ** 6)}', role)
+
+
+def make_film(star: FilmWorkPerson, genres: List[FilmWorkGenre]) -> FilmWork:
+    persons = [random_person(random.choice(ROLES)) for _ in range(15)]
+    if star:
+        persons.insert(random.randint(0, len(persons)), star)
+    return FilmWork(
+        id=str(uuid.uuid4()),
+        title=f'Film {random.randint(0, 10 ** 6)}',
+        rating=round(random.uniform(1, 10), 1),
+        description='Lorem ipsum dolor sit amet. ' * 20,
+        updated_at=datetime.datetime.now(datetime.timezone.utc),
+        genres=random.sample(genres, 3),
+        persons=persons,
+    )
+
+
+def create_index(es: Elasticsearch) -> None:
+    mapping = json.loads((ETL_PATH / 'etl_tasks/film_work/index_mapping.json').read_text())
+    settings = json.loads((ETL_PATH / 'etl_tasks/film_work/index_settings.json').read_text())
+    es.indices.delete(index=INDEX, ignore=404)
+    es.indices.create(index=INDEX, body={'mappings': mapping, 'settings': settings})
+
+
+def rename(films: List[FilmWork], star_id: str, new_name: str) -> List[FilmWork]:
+    """Фильмы такими, какими их вернул бы enrich.sql после переименования персоны."""
+    return [
+        FilmWork(
+            id=film.id,
+            title=film.title,
+            rating=film.rating,
+            description=film.description,
+            updated_at=film.updated_at,
+            genres=film.genres,
+            persons=[
+                FilmWorkPerson(person.id, new_name, person.role) if person.id == star_id else person
+                for person in film.persons
+            ],
+        )
+        for film in films
+    ]
+
+
+def full_rebuild(es: Elasticsearch, films: List[FilmWork], star_id: str, new_name: str) -> float:
+    started = time.perf_counter()
+    documents = [film.to_es() for film in rename(films, star_id, new_name)]
+    helpers.bulk(es, documents, index=INDEX)
+    es.indices.refresh(index=INDEX)
+    return (time.perf_counter() - started) * 1000
+
+
+def partial_update(es: Elasticsearch, star_id: str, new_name: str) -> float:
+    started = time.perf_counter()
+    body = PersonNestedUpdate.to_es_update([PersonNestedUpdate(star_id, new_name)])
+    result = es.update_by_query(index=INDEX, body=body, conflicts='proceed', refresh=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    assert not result['failures'] and not result['version_conflicts'], result
+    return elapsed
+
+
+def check_renamed(es: Elasticsearch, star_id: str, name: str, films: int) -> None:
+    """Проверяет, что звезда переименована во всех фильмах, включая поле actors_names."""
+    query = {
+        'bool': {
+            'filter': [
+                {'nested': {'path': 'actors', 'query': {'term': {'actors.uuid': star_id}}}},
+                {'match_phrase': {'actors_names': name}},
+            ],
+        },
+    }
+    count = es.count(index=INDEX, body={'query': query})['count']
+    assert count == films, f'переименовано {count} фильмов из {films}'
+
+
+def offline_requests(films: List[FilmWork], star_id: str, repeats: int) -> None:
+    """Время сборки и сериализации тела запроса каждого способа и его объем, без отправки в Elasticsearch."""
+    serializer = JSONSerializer()
+
+    def bulk_body(name: str) -> bytes:
+        lines = []
+        # Так же, как helpers.bulk превращает документы в строки запроса
+        for document in [film.to_es() for film in rename(films, star_id, name)]:
+            action, data = helpers.expand_action(document)
+            action['index']['_index'] = INDEX
+            lines += [serializer.dumps(action), serializer.dumps(data)]
+        return ('\n'.join(lines) + '\n').encode()
+
+    def update_body(name: str) -> bytes:
+        return serializer.dumps(PersonNestedUpdate.to_es_update([PersonNestedUpdate(star_id, name)])).encode()
+
+    print(f'| {"Способ":<52} | p50, мс | max, мс | запрос, байт |')
+    print(f'|{"-" * 54}|--------:|--------:|-------------:|')
+    for title, build in [
+        ('Полная пересборка, тело _bulk (было)', bulk_body),
+        ('Частичное обновление, тело _update_by_query (стало)', update_body),
+    ]:
+        timings = []
+        for i in range(repeats):
+            started = time.perf_counter()
+            body = build(f'Star Name {i}')
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f'| {title:<52} | {statistics.median(timings):7.2f} | {max(timings):7.2f} | {len(body):12,} |')
+
+
+def populate_postgres(dsn: str, films: List[FilmWork]) -> bool:
+    """
+    Создает в пустой базе схему content (deploy/db/sql_scripts) и загружает в нее фильмы с их персонами и жанрами.
+    Возвращает False, если таблица фильмов уже есть: тогда база не меняется.
+    """
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    with psycopg2.connect(dsn) as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('content.film_work')")
+        if cursor.fetchone()[0] is not None:
+            return False
+        for script in sorted(DB_SCRIPTS_PATH.glob('*.sql')):
+            cursor.execute(script.read_text())
+        now = datetime.datetime.now(datetime.timezone.utc)
+        genres = {genre.id: genre for film in films for genre in film.genres}
+        persons = {person.id: person for film in films for person in film.persons}
+        execute_values(
+            cursor,
+            'INSERT INTO content.genre (id, name, created_at, updated_at) VALUES %s',
+            [(genre.id, genre.name, now, now) for genre in genres.values()],
+        )
+        execute_values(
+            cursor,
+            'INSERT INTO content.person (id, full_name, created_at, updated_at) VALUES %s',
+            [(person.id, person.full_name, now, now) for person in persons.values()],
+        )
+        execute_values(
+            cursor,
+            'INSERT INTO content.film_work (id, title, description, rating, type, created_at, updated_at) VALUES %s',
+            [(film.id, film.title, film.description, film.rating, 'movie', now, now) for film in films],
+        )
+        execute_values(
+            cursor,
+            'INSERT INTO content.genre_film_work (id, film_work_id, genre_id, created_at) VALUES %s',
+            [(str(uuid.uuid4()), film.id, genre.id, now) for film in films for genre in film.genres],
+        )
+        execute_values(
+            cursor,
+            'INSERT INTO content.person_film_work (id, film_work_id, person_id, role, created_at) VALUES %s',
+            [(str(uuid.uuid4()), film.id, person.id, person.role, now) for film in films for person in film.persons],
+        )
+        cursor.execute('ANALYZE')
+    return True
+
+
+def drop_postgres(dsn: str) -> None:
+    import psycopg2
+
+    with psycopg2.connect(dsn) as connection, connection.cursor() as cursor:
+        cursor.execute('DROP SCHEMA content CASCADE')
+
+
+def postgres_queries(dsn: str, repeats: int) -> dict[str, List[float]]:
+    """
+    Время запросов к Postgres на одно переименование персоны с наибольшим числом фильмов в базе:
+    enrich.sql по всем ее фильмам у полной пересборки и person_update/enrich.sql у частичного обновления.
+    """
+    import psycopg2
+
+    rebuild_query = (ETL_PATH / 'etl_tasks/film_work/enrich.sql').read_text()
+    update_query = (ETL_PATH / 'etl_tasks/film_work/person_update/enrich.sql').read_text()
+    with psycopg2.connect(dsn) as connection, connection.cursor() as cursor:
+        cursor.execute('SET search_path TO content')
+        cursor.execute(
+            'SELECT person_id FROM person_film_work GROUP BY person_id ORDER BY COUNT(*) DESC LIMIT 1',
+        )
+        person_id, = cursor.fetchone()
+        cursor.execute('SELECT film_work_id FROM person_film_work WHERE person_id = %s', (person_id,))
+        film_ids = [row[0] for row in cursor.fetchall()]
+        print(f'Postgres: у персоны {person_id} фильмов {len(film_ids)}')
+        results = {}
+        for name, query, params in [
+            ('enrich.sql в Postgres (пересборка)', rebuild_query, (film_ids,)),
+            ('person_update/enrich.sql в Postgres (обновление)', update_query, ([person_id],)),
+        ]:
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                cursor.execute(query, params)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = timings
+    return results
+
+
+def elastic_requests(address: str, films: List[FilmWork], background: List[FilmWork], star_id: str,
+                     repeats: int) -> dict[str, List[float]]:
+    """Время до refresh индекса после переименования каждым способом."""
+    es = Elasticsearch([address])
+    create_index(es)
+    helpers.bulk(es, [film.to_es() for film in films + background], index=INDEX)
+    es.indices.refresh(index=INDEX)
+    results = {'Полная пересборка, _bulk (было)': [], 'Частичное обновление, _update_by_query (стало)': []}
+    for i in range(repeats):
+        name = f'Star Name {2 * i + 1}'
+        results['Полная пересборка, _bulk (было)'].append(full_rebuild(es, films, star_id, name))
+        check_renamed(es, star_id, name, len(films))
+        name = f'Star Name {2 * i + 2}'
+        results['Частичное обновление, _update_by_query (стало)'].append(partial_update(es, star_id, name))
+        check_renamed(es, star_id, name, len(films))
+    es.indices.delete(index=INDEX)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--elastic', default='http://localhost:9200', help='адрес Elasticsearch')
+    parser.add_argument('--films', type=int, default=500, help='фильмов с переименуемой персоной')
+    parser.add_argument('--background', type=int, default=10000, help='фильмов без нее')
+    parser.add_argument('--repeats', type=int, default=10, help='переименований каждым способом')
+    parser.add_argument('--postgres', help='DSN базы ETL для замера запросов к Postgres')
+    parser.add_argument(
+        '--populate-postgres',
+        action='store_true',
+        help='загрузить те же фильмы в пустую базу --postgres и удалить их после замера',
+    )
+    parser.add_argument('--offline', action='store_true', help='не обращаться к Elasticsearch')
+    args = parser.parse_args()
+
+    genres = [FilmWorkGenre(str(uuid.uuid4()), f'Genre {i}') for i in range(20)]
+    star = FilmWorkPerson(str(uuid.uuid4()), 'Star Name 0', 'actor')
+    films = [make_film(star, genres) for _ in range(args.films)]
+    background = [make_film(None, genres) for _ in range(args.background)]
+    print(f'Фильмов со звездой: {args.films}, без нее: {args.background}, переименований: {args.repeats}')
+    if args.offline:
+        offline_requests(films, star.id, args.repeats)
+
+    results = {}
+    if not args.offline:
+        results.update(elastic_requests(args.elastic, films, background, star.id, args.repeats))
+    if args.postgres:
+        populated = False
+        if args.populate_postgres:
+            populated = populate_postgres(args.postgres, films + background)
+            if not populated:
+                print('Таблицы content уже есть, --populate-postgres пропущен.')
+        try:
+            results.update(postgres_queries(args.postgres, args.repeats))
+        finally:
+            if populated:
+                drop_postgres(args.postgres)
+    if not results:
+        return
+
+    print(f'| {"Способ":<48} | p50, мс | max, мс |')
+    print(f'|{"-" * 50}|--------:|--------:|')
+    for name, timings in results.items():
+        print(f'| {name:<48} | {statistics.median(timings):7.2f} | {max(timings):7.2f} |')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Бенчмарк запроса списка фильмов с фильтром по жанру (/films/?filter_type=genres) на индексе movies.
+
+Сравниваются три варианта тела запроса:
+    - nested в контексте запроса (scoring) - как строил запрос ElasticSearchEngine раньше;
+    - nested в bool.filter - без подсчета релевантности, с кэшем фильтров;
+    - nested в bool.filter с request_cache=true - как строит запрос ElasticSearchEngine сейчас.
+
+Для каждого варианта кэш запросов шарда очищается, затем по каждому жанру
+выполняется REPEATS запросов. Печатаются медиана и 95-й перцентиль времени ответа
+(took Elasticsearch и полное время запроса клиента).
+
+Запуск из корня репозитория (нужен запущенный Elasticsearch с загруженным ETL индексом movies):
+    python docs/search_filter_research/benchmark.py
+    python docs/search_filter_research/benchmark.py --elastic http://localhost:9200 --repeats 50
+Если индекса movies нет, --populate N создает его с маппингом ETL из N случайных фильмов
+и удаляет после замера:
+    python docs/search_filter_research/benchmark.py --populate 100000
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+from elasticsearch import Elasticsearch, helpers
+
+ETL_PATH = Path(__file__).resolve().parents[2] / 'src' / 'ps_to_es'
+sys.path.append(str(ETL_PATH))
+
+from etl_tasks.film_work.data_structures import (  # noqa: E402
+    FilmWork,
+    FilmWorkGenre,
+    FilmWorkPerson,
+)
+
+INDEX = 'movies'
+PAGE_SIZE = 20
+SOURCE_FIELDS = ['uuid', 'title', 'imdb_rating']
+
+
+def get_genre_ids(es: Elasticsearch) -> List[str]:
+    """Возвращает UUID всех жанров, встречающихся в индексе."""
+    body = {
+        'size': 0,
+        'aggs': {
+            'genres': {
+                'nested': {'path': 'genres'},
+                'aggs': {'ids': {'terms': {'field': 'genres.uuid', 'size': 1000}}},
+            },
+        },
+    }
+    result = es.search(index=INDEX, body=body)
+    return [bucket['key'] for bucket in result['aggregations']['genres']['ids']['buckets']]
+
+
+def scoring_body(genre_id: str) -> dict:
+    return {
+        'query': {'nested': {'path': 'genres', 'query': {'term': {'genres.uuid': genre_id}}}},
+        'from': 0,
+        'size': PAGE_SIZE,
+        '_source': {'includes': SOURCE_FIELDS},
+    }
+
+
+def filter_body(genre_id: str) -> dict:
+    return {
+        'query': {
+            'bool': {
+                'filter': [
+                    {'nested': {'path': 'genres', 'query': {'term': {'genres.uuid': genre_id}}}},
+                ],
+            },
+        },
+        'from': 0,
+        'size': PAGE_SIZE,
+        '_source': {'includes': SOURCE_FIELDS},
+    }
+
+
+def populate(es: Elasticsearch, films: int) -> None:
+    """Создает индекс movies с маппингом ETL и загружает в него случайные фильмы с 3 жанрами из 20."""
+    mapping = json.loads((ETL_PATH / 'etl_tasks/film_work/index_mapping.json').read_text())
+    settings = json.loads((ETL_PATH / 'etl_tasks/film_work/index_settings.json').read_text())
+    es.indices.create(index=INDEX, body={'mappings': mapping, 'settings': settings})
+    genres = [FilmWorkGenre(str(uuid.uuid4()), f'Genre {i}') for i in range(20)]
+    persons = [FilmWorkPerson(str(uuid.uuid4()), f'Person {i}', random.choice(('actor', 'director', 'writer')))
+               for i in range(1000)]
+    documents = (
+        FilmWork(
+            id=str(uuid.uuid4()),
+            title=f'Film {i}',
+            rating=round(random.uniform(1, 10), 1),
+            description='Lorem ipsum dolor sit amet. ' * 20,
+            updated_at=datetime.datetime.now(datetime.timezone.utc),
+            genres=random.sample(genres, 3),
+            persons=random.sample(persons, 15),
+        ).to_es()
+        for i in range(films)
+    )
+    helpers.bulk(es, documents, index=INDEX, chunk_size=2000)
+    es.indices.refresh(index=INDEX)
+
+
+def percentile(values: List[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[int(q) - 1]
+
+
+def run(es: Elasticsearch, genre_ids: List[str], make_body, request_cache: bool, repeats: int):
+    es.indices.clear_cache(index=INDEX, request=True)
+    took, wall = [], []
+    for _ in range(repeats):
+        for genre_id in genre_ids:
+            started = time.perf_counter()
+            result = es.search(index=INDEX, body=make_body(genre_id), request_cache=request_cache)
+            wall.append((time.perf_counter() - started) * 1000)
+            took.append(result['took'])
+    return took, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--elastic', default='http://localhost:9200', help='адрес Elasticsearch')
+    parser.add_argument('--repeats', type=int, default=20, help='запросов на каждый жанр')
+    parser.add_argument('--populate', type=int, help='создать индекс movies из стольких случайных фильмов')
+    args = parser.parse_args()
+
+    es = Elasticsearch([args.elastic])
+    populated = False
+    if args.populate:
+        if es.indices.exists(index=INDEX):
+            print(f'Индекс {INDEX} уже есть, --populate пропущен.')
+        else:
+            populate(es, args.populate)
+            populated = True
+    genre_ids = get_genre_ids(es)
+    print(
+        f'Elasticsearch {es.info()["version"]["number"]}, фильмов в индексе: {es.count(index=INDEX)["count"]}, '
+        f'жанров: {len(genre_ids)}, запросов на вариант: {len(genre_ids) * args.repeats}',
+    )
+
+    variants = [
+        ('nested в query (было)', scoring_body, False),
+        ('nested в bool.filter', filter_body, False),
+        ('bool.filter + request_cache (стало)', filter_body, True),
+    ]
+    print(f'| {"Вариант":<36} | took p50, мс | took p95, мс | клиент p50, мс | клиент p95, мс |')
+    print(f'|{"-" * 38}|-------------:|-------------:|---------------:|---------------:|')
+    for name, make_body, request_cache in variants:
+        took, wall = run(es, genre_ids, make_body, request_cache, args.repeats)
+        print(
+            f'| {name:<36} | {statistics.median(took):12.1f} | {percentile(took, 95):12.1f} '
+            f'| {statistics.median(wall):14.2f} | {percentile(wall, 95):14.2f} |',
+        )
+    if populated:
+        es.indices.delete(index=INDEX)
+
+
+if __name__ == '__main__':
+    main()
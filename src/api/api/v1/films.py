@@ -2,7 +2,9 @@ from http import HTTPStatus
 from typing import Optional
 
 from core import endpoints_params as ep_params
-from core.config import NOT_FOUND_MESSAGE
+from core.config import INVALID_CURSOR_MESSAGE, NOT_FOUND_MESSAGE
+from core.responses import PreSerializedORJSONResponse
+from engines.search.general import InvalidCursorError
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from models.film import Film, FilmBrief, FilmFilterType, FilmSortingType
 from models.general import Page
@@ -21,11 +23,25 @@ router = APIRouter(prefix='/films', tags=['Фильмы'])
 async def film_details(
     uuid: str = Query(**ep_params.DEFAULT_UUID),
     film_service: FilmService = Depends(get_film_service),
-) -> Film:
-    result = await film_service.get_by_uuid(uuid)
+) -> PreSerializedORJSONResponse:
+    result = await film_service.get_by_uuid_json(uuid)
     if not result:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=NOT_FOUND_MESSAGE)
-    return result
+    # Готовый JSON из кэша отдается без построения модели Film.
+    return PreSerializedORJSONResponse(content=result)
+
+
+@router.get(
+    path='/batch/',
+    name='Детали нескольких фильмов',
+    description='Получение детальной информации по списку фильмов за один запрос.',
+    response_model=list[Film],
+)
+async def film_details_batch(
+    uuids: list[str] = Query(**ep_params.DEFAULT_UUIDS),
+    film_service: FilmService = Depends(get_film_service),
+) -> list[Film]:
+    return await film_service.get_by_uuids(uuids)
 
 
 @router.get(
@@ -38,9 +54,13 @@ async def film_search(
     query: str = Query(**ep_params.DEFAULT_QUERY),
     page_number: Optional[int] = Query(**ep_params.DEFAULT_PAGE_NUMBER),
     page_size: Optional[int] = Query(**ep_params.DEFAULT_PAGE_SIZE),
+    cursor: Optional[str] = Query(**ep_params.DEFAULT_PAGE_CURSOR),
     film_service: FilmService = Depends(get_film_service),
 ) -> Page[FilmBrief]:
-    page = await film_service.search(query, page_number, page_size)
+    try:
+        page = await film_service.search(query, page_number, page_size, cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=INVALID_CURSOR_MESSAGE)
     return page
 
 
@@ -57,6 +77,7 @@ async def film_list(
     filter_value: Optional[str] = Query(**ep_params.DEFAULT_FILM_FILTER_VALUE),
     page_number: Optional[int] = Query(**ep_params.DEFAULT_PAGE_NUMBER),
     page_size: Optional[int] = Query(**ep_params.DEFAULT_PAGE_SIZE),
+    cursor: Optional[str] = Query(**ep_params.DEFAULT_PAGE_CURSOR),
     film_service: FilmService = Depends(get_film_service),
 ) -> Page[FilmBrief]:
     allowed_roles = {'subscriber', 'contributor', 'editor', 'administrator'}
@@ -64,7 +85,11 @@ async def film_list(
         # Анонимным пользователям разрешаем просматривать только первую страницу.
         page_number = 1
         page_size = 20
-    page = await film_service.get_sorted_filtered(
-        sort, filter_type, filter_value, page_number, page_size,
-    )
+        cursor = None
+    try:
+        page = await film_service.get_sorted_filtered(
+            sort, filter_type, filter_value, page_number, page_size, cursor,
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=INVALID_CURSOR_MESSAGE)
     return page
@@ -2,6 +2,7 @@ from http import HTTPStatus
 
 from core import endpoints_params as ep_params
 from core.config import NOT_FOUND_MESSAGE
+from core.responses import PreSerializedORJSONResponse
 from fastapi import APIRouter, Depends, HTTPException, Query
 from models.general import Page
 from models.genre import Genre, GenreBrief
@@ -20,11 +21,24 @@ router = APIRouter(prefix='/genres', tags=['Жанры'])
 async def genre_details(
     uuid: str = Query(**ep_params.DEFAULT_UUID),
     genre_service: GenreService = Depends(get_genre_service),
-) -> Genre:
-    genre = await genre_service.get_by_uuid(uuid)
+) -> PreSerializedORJSONResponse:
+    genre = await genre_service.get_by_uuid_json(uuid)
     if not genre:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=NOT_FOUND_MESSAGE)
-    return genre
+    return PreSerializedORJSONResponse(content=genre)
+
+
+@router.get(
+    path='/batch/',
+    name='Детали нескольких жанров',
+    description='Получение детальной информации по списку жанров за один запрос.',
+    response_model=list[Genre],
+)
+async def genre_details_batch(
+    uuids: list[str] = Query(**ep_params.DEFAULT_UUIDS),
+    genre_service: GenreService = Depends(get_genre_service),
+) -> list[Genre]:
+    return await genre_service.get_by_uuids(uuids)
 
 
 @router.get(
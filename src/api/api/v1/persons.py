@@ -2,7 +2,9 @@ from http import HTTPStatus
 from typing import Optional
 
 from core import endpoints_params as ep_params
-from core.config import NOT_FOUND_MESSAGE
+from core.config import INVALID_CURSOR_MESSAGE, NOT_FOUND_MESSAGE
+from core.responses import PreSerializedORJSONResponse
+from engines.search.general import InvalidCursorError
 from fastapi import APIRouter, Depends, HTTPException, Query
 from models.general import Page
 from models.person import Person, PersonBrief
@@ -21,11 +23,24 @@ router = APIRouter(prefix='/persons', tags=['Персоны'])
 async def person_details(
     uuid: str = Query(**ep_params.DEFAULT_UUID),
     person_service: PersonService = Depends(get_person_service),
-) -> Person:
-    person = await person_service.get_by_uuid(uuid)
+) -> PreSerializedORJSONResponse:
+    person = await person_service.get_by_uuid_json(uuid)
     if not person:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=NOT_FOUND_MESSAGE)
-    return person
+    return PreSerializedORJSONResponse(content=person)
+
+
+@router.get(
+    path='/batch/',
+    name='Детали нескольких персон',
+    description='Получение детальной информации по списку персон за один запрос.',
+    response_model=list[Person],
+)
+async def person_details_batch(
+    uuids: list[str] = Query(**ep_params.DEFAULT_UUIDS),
+    person_service: PersonService = Depends(get_person_service),
+) -> list[Person]:
+    return await person_service.get_by_uuids(uuids)
 
 
 @router.get(
@@ -38,7 +53,11 @@ async def person_search(
     query: str = Query(**ep_params.DEFAULT_QUERY),
     page_number: Optional[int] = Query(**ep_params.DEFAULT_PAGE_NUMBER),
     page_size: Optional[int] = Query(**ep_params.DEFAULT_PAGE_SIZE),
+    cursor: Optional[str] = Query(**ep_params.DEFAULT_PAGE_CURSOR),
     person_service: PersonService = Depends(get_person_service),
 ) -> Page[PersonBrief]:
-    page = await person_service.search(query, page_number, page_size)
+    try:
+        page = await person_service.search(query, page_number, page_size, cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=INVALID_CURSOR_MESSAGE)
     return page
@@ -32,15 +32,51 @@ PROJECT_TAGS_METADATA = [
 ]
 
 NOT_FOUND_MESSAGE = 'Объект не найден.'
+INVALID_CURSOR_MESSAGE = 'Некорректный курсор страницы.'
 
 # Настройки Redis
 REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
-CACHE_TTL = timedelta(minutes=5)
+CACHE_TTL = timedelta(seconds=int(os.getenv('CACHE_TTL', 5 * 60)))
+# Канал Redis, в который ETL публикует id измененных объектов (пустая строка - не подписываться).
+# С подпиской измененные данные удаляются из кэша сразу, поэтому CACHE_TTL можно увеличить до часов.
+CACHE_INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'cache_invalidation')
+
+# Настройки кэширования: redis, tiered (память процесса + Redis) или dummy
+CACHE_ENGINE = os.getenv('CACHE_ENGINE', 'redis')
+MEMORY_CACHE_MAX_SIZE = int(os.getenv('MEMORY_CACHE_MAX_SIZE', 64 * 1024 * 1024))
+MEMORY_CACHE_TTL = timedelta(seconds=int(os.getenv('MEMORY_CACHE_TTL', 30)))
+# Как часто писать в лог попадания, промахи и вытеснения локального кэша (0 - не писать).
+MEMORY_CACHE_STATS_INTERVAL = timedelta(seconds=int(os.getenv('MEMORY_CACHE_STATS_INTERVAL', 60)))
+
+# Формат данных в кэше: orjson, msgpack или pickle.
+# Записи больше CACHE_COMPRESSION_THRESHOLD байт сжимаются zstd (0 - не сжимать).
+CACHE_CODEC = os.getenv('CACHE_CODEC', 'orjson')
+CACHE_COMPRESSION_THRESHOLD = int(os.getenv('CACHE_COMPRESSION_THRESHOLD', 16 * 1024))
+CACHE_COMPRESSION_LEVEL = int(os.getenv('CACHE_COMPRESSION_LEVEL', 3))
+
+# Stale-while-revalidate: после CACHE_TTL запись еще CACHE_STALE_TTL отдается из кэша,
+# пока обновляется в фоне. 0 - режим выключен, запись удаляется сразу по истечении CACHE_TTL.
+CACHE_STALE_TTL = timedelta(seconds=int(os.getenv('CACHE_STALE_TTL', 0)))
+# Чем больше beta, тем раньше (с большей вероятностью) запускается упреждающее обновление.
+CACHE_XFETCH_BETA = float(os.getenv('CACHE_XFETCH_BETA', 1.0))
+
+# Кэширование поиска: запрос попадает в кэш после SEARCH_CACHE_MIN_HITS обращений к нему (0 - не кэшировать).
+# SEARCH_CACHE_SKETCH_WIDTH - размер счетчика частоты запросов (байт на строку).
+SEARCH_CACHE_MIN_HITS = int(os.getenv('SEARCH_CACHE_MIN_HITS', 3))
+SEARCH_CACHE_SKETCH_WIDTH = int(os.getenv('SEARCH_CACHE_SKETCH_WIDTH', 64 * 1024))
+
+# Объединение одновременных промахов кэша (single-flight). С блокировкой в Redis - между всеми процессами.
+SINGLE_FLIGHT_REDIS_LOCK = os.getenv('SINGLE_FLIGHT_REDIS_LOCK', 'false').lower() == 'true'
+SINGLE_FLIGHT_LOCK_TTL = timedelta(seconds=int(os.getenv('SINGLE_FLIGHT_LOCK_TTL', 10)))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv('SINGLE_FLIGHT_POLL_INTERVAL', 0.05))
 
 # Настройки Elasticsearch
 ELASTIC_HOST = os.getenv('ELASTIC_HOST', 'elastic')
 ELASTIC_PORT = int(os.getenv('ELASTIC_PORT', 9200))
+# Время жизни снимка индекса (point in time) между запросами страниц по курсору, например 1m.
+# Пустая строка - обход без снимка (снимки поддерживаются начиная с Elasticsearch 7.10).
+ELASTIC_PIT_KEEP_ALIVE = os.getenv('ELASTIC_PIT_KEEP_ALIVE', '')
 
 # Корень проекта
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
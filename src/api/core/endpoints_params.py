@@ -17,6 +17,17 @@ DEFAULT_PAGE_SIZE = {
     'description': 'Результатов на странице.',
 }
 
+DEFAULT_PAGE_CURSOR = {
+    'alias': 'page[cursor]',
+    'title': 'Курсор',
+    'default': None,
+    'description': (
+        'Пагинация по курсору вместо номера страницы: "*" для первой страницы, '
+        'далее - next_cursor из предыдущего ответа. Работает на любой глубине.'
+    ),
+    'example': '*',
+}
+
 DEFAULT_UUID = {
     'title': 'UUID объекта',
     'default': None,
@@ -24,6 +35,16 @@ DEFAULT_UUID = {
     'example': '2f89e116-4827-4ff4-853c-b6e058f71e31',
 }
 
+DEFAULT_UUIDS = {
+    'alias': 'uuid',
+    'title': 'UUID объектов',
+    'default': ...,
+    'min_items': 1,
+    'max_items': 100,
+    'description': 'Список UUID объектов (параметр повторяется для каждого объекта).',
+    'example': ['2f89e116-4827-4ff4-853c-b6e058f71e31', '4af6c9c9-0be0-4864-b1e9-7f87dd59ee1f'],
+}
+
 DEFAULT_QUERY = {
     'title': 'Поиск',
     'default': None,
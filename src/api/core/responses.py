@@ -0,0 +1,15 @@
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+
+
+class PreSerializedORJSONResponse(ORJSONResponse):
+    """
+    Ответ, принимающий как объекты, так и уже сериализованный JSON (например, взятый из кэша).
+    Готовый JSON отдается как есть, без повторной сериализации и валидации моделью ответа.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return super().render(content)
@@ -0,0 +1,147 @@
+import datetime
+import pickle
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+import msgpack
+import orjson
+import zstandard
+
+
+class CodecError(ValueError):
+    """Данные из кэша не удалось декодировать."""
+
+
+class Codec(ABC):
+    """
+    Абстрактный класс формата сериализации данных кэша.
+    """
+
+    @property
+    @abstractmethod
+    def tag(self) -> bytes:
+        """Однобайтовая метка формата, с которой начинаются данные в кэше."""
+        pass
+
+    @abstractmethod
+    def dumps(self, data: Any) -> bytes:
+        """Сериализует данные."""
+        pass
+
+    @abstractmethod
+    def loads(self, raw: bytes) -> Any:
+        """Десериализует данные."""
+        pass
+
+    def to_json(self, raw: bytes) -> bytes:
+        """Возвращает данные в виде JSON."""
+        return orjson.dumps(self.loads(raw))
+
+
+class PickleCodec(Codec):
+    """
+    Сериализация pickle (прежний формат кэша).
+    """
+
+    tag = b'P'
+
+    def dumps(self, data: Any) -> bytes:
+        return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, raw: bytes) -> Any:
+        return pickle.loads(raw)
+
+
+class OrjsonCodec(Codec):
+    """
+    Сериализация в JSON. Данные в кэше совпадают с телом ответа API, поэтому отдаются без перекодирования.
+    """
+
+    tag = b'J'
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data)
+
+    def loads(self, raw: bytes) -> Any:
+        return orjson.loads(raw)
+
+    def to_json(self, raw: bytes) -> bytes:
+        return raw
+
+
+def msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not msgpack serializable')
+
+
+class MsgpackCodec(Codec):
+    """
+    Сериализация msgpack - самый компактный формат.
+    """
+
+    tag = b'M'
+
+    def dumps(self, data: Any) -> bytes:
+        return msgpack.packb(data, default=msgpack_default, use_bin_type=True)
+
+    def loads(self, raw: bytes) -> Any:
+        return msgpack.unpackb(raw, raw=False)
+
+
+CODECS: dict[str, Codec] = {
+    'pickle': PickleCodec(),
+    'orjson': OrjsonCodec(),
+    'msgpack': MsgpackCodec(),
+}
+CODECS_BY_TAG: dict[bytes, Codec] = {codec.tag: codec for codec in CODECS.values()}
+ZSTD_TAG = b'Z'
+
+
+class CacheSerializer:
+    """
+    Кодирует данные для кэша выбранным кодеком и сжимает zstd, если они больше порога.
+
+    Данные в кэше начинаются с метки формата, поэтому декодируются записи любого известного
+    формата: смена кодека в настройках не делает невалидными уже закэшированные данные.
+    """
+
+    def __init__(
+        self,
+        codec: Codec,
+        compression_threshold: Optional[int] = None,
+        compression_level: int = 3,
+    ):
+        self.codec = codec
+        self.compression_threshold = compression_threshold
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, data: Any) -> bytes:
+        """Кодирует данные."""
+        payload = self.codec.tag + self.codec.dumps(data)
+        if self.compression_threshold is not None and len(payload) > self.compression_threshold:
+            payload = ZSTD_TAG + self._compressor.compress(payload)
+        return payload
+
+    def decode(self, payload: bytes) -> Any:
+        """Декодирует данные."""
+        codec, raw = self._unpack(payload)
+        return codec.loads(raw)
+
+    def to_json(self, payload: bytes) -> bytes:
+        """Возвращает данные в виде JSON, по возможности не десериализуя их."""
+        codec, raw = self._unpack(payload)
+        return codec.to_json(raw)
+
+    def is_known(self, payload: bytes) -> bool:
+        """Проверяет, что данные записаны в известном формате."""
+        return payload[:1] == ZSTD_TAG or payload[:1] in CODECS_BY_TAG
+
+    def _unpack(self, payload: bytes) -> tuple[Codec, bytes]:
+        if payload[:1] == ZSTD_TAG:
+            payload = self._decompressor.decompress(payload[1:])
+        codec = CODECS_BY_TAG.get(payload[:1])
+        if codec is None:
+            raise CodecError('Unknown cache data format.')
+        return codec, payload[1:]
@@ -13,3 +13,6 @@ class DummyCacheEngine(CacheEngine):
 
     async def load_from_cache(self, cache_key: str) -> Any:
         return None
+
+    async def delete_from_cache(self, cache_keys: list[str]) -> None:
+        pass
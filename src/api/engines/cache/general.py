@@ -1,5 +1,30 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from engines.cache.codecs import CacheSerializer, OrjsonCodec
+
+
+@dataclass
+class CacheEntry:
+    """
+    Запись кэша в закодированном виде вместе с оставшимся временем жизни.
+    Данные декодируются только при обращении к ним.
+    """
+
+    payload: bytes
+    serializer: CacheSerializer
+    ttl: Optional[float] = None
+
+    @property
+    def data(self) -> Any:
+        """Декодированные данные."""
+        return self.serializer.decode(self.payload)
+
+    @property
+    def json(self) -> bytes:
+        """Данные в виде JSON (без построения промежуточных объектов, если это позволяет формат)."""
+        return self.serializer.to_json(self.payload)
 
 
 class CacheEngine(ABC):
@@ -7,6 +32,8 @@ class CacheEngine(ABC):
     Абстрактный класс кэширования.
     """
 
+    serializer = CacheSerializer(OrjsonCodec())
+
     @abstractmethod
     async def save_to_cache(self, cache_key: str, data: Any) -> None:
         """Сохраняет данные в кэш."""
@@ -16,3 +43,32 @@ class CacheEngine(ABC):
     async def load_from_cache(self, cache_key: str) -> Any:
         """Загружает данные из кэша."""
         pass
+
+    @abstractmethod
+    async def delete_from_cache(self, cache_keys: list[str]) -> None:
+        """Удаляет данные из кэша."""
+        pass
+
+    async def add_tags(self, cache_key: str, tags: list[str]) -> None:
+        """Помечает запись кэша тегами, чтобы позже удалить все записи с тегом разом."""
+        pass
+
+    async def invalidate_tags(self, tags: list[str]) -> list[str]:
+        """Удаляет из кэша все записи с указанными тегами и возвращает их ключи."""
+        return []
+
+    async def load_entry(self, cache_key: str) -> Optional[CacheEntry]:
+        """Загружает данные из кэша вместе с оставшимся временем жизни (в секундах), если оно известно."""
+        data = await self.load_from_cache(cache_key)
+        if data is None:
+            return None
+        return CacheEntry(payload=self.serializer.encode(data), serializer=self.serializer)
+
+    async def load_many(self, cache_keys: list[str]) -> list[Any]:
+        """Загружает данные из кэша по списку ключей (None для отсутствующих) в порядке ключей."""
+        return [await self.load_from_cache(cache_key) for cache_key in cache_keys]
+
+    async def save_many(self, data: dict[str, Any]) -> None:
+        """Сохраняет в кэш данные по нескольким ключам."""
+        for cache_key, value in data.items():
+            await self.save_to_cache(cache_key, value)
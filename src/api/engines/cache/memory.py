@@ -0,0 +1,140 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Optional
+
+from engines.cache.codecs import CacheSerializer
+from engines.cache.general import CacheEngine, CacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MemoryCacheStats:
+    """
+    Метрики локального кэша.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    rejections: int = 0
+    items: int = 0
+    size: int = 0
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_ratio = self.hits / lookups if lookups else 0.0
+        return (
+            f'hits {self.hits}, misses {self.misses} (hit ratio {hit_ratio:.1%}), '
+            f'evictions {self.evictions}, expirations {self.expirations}, rejections {self.rejections}, '
+            f'items {self.items}, size {self.size} bytes'
+        )
+
+
+class MemoryCacheEngine(CacheEngine):
+    """
+    Реализация кеширования в памяти процесса (LRU с ограничением по размеру в байтах и TTL).
+    Данные хранятся закодированными: так известен их точный размер, а вызывающий код
+    не может случайно изменить закэшированный объект.
+    Метрики кэша пишутся в лог раз в stats_interval (при обращении к кэшу), если он задан.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: timedelta,
+        serializer: Optional[CacheSerializer] = None,
+        stats_interval: Optional[timedelta] = None,
+    ):
+        self.max_size = max_size
+        self.expire = ttl.total_seconds()
+        if serializer:
+            self.serializer = serializer
+        self.stats = MemoryCacheStats()
+        self.stats_interval = stats_interval.total_seconds() if stats_interval else None
+        self._report_at = time.monotonic() + self.stats_interval if self.stats_interval else None
+        self._entries: OrderedDict[str, tuple[bytes, float, Optional[float]]] = OrderedDict()
+
+    async def save_to_cache(
+        self, cache_key: str, data: Any, source_ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Сохраняет данные в кэш.
+
+        Args:
+            cache_key: ключ кэша.
+            data: данные.
+            source_ttl: оставшееся время жизни данных в источнике (например, в Redis), если они взяты оттуда.
+        """
+        self.save_payload(cache_key, self.serializer.encode(data), source_ttl)
+
+    def save_payload(
+        self, cache_key: str, payload: bytes, source_ttl: Optional[float] = None,
+    ) -> None:
+        """Сохраняет в кэш уже закодированные данные."""
+        self._remove(cache_key)
+        if len(payload) > self.max_size:
+            self.stats.rejections += 1
+            logger.debug(f'Data by key "{cache_key}" is too large for memory cache.')
+            return
+
+        now = time.monotonic()
+        source_expire_at = now + source_ttl if source_ttl is not None else None
+        self._entries[cache_key] = (payload, now + self.expire, source_expire_at)
+        self.stats.size += len(payload)
+        self.stats.items += 1
+        while self.stats.size > self.max_size:
+            evicted_key, (evicted_payload, *_) = self._entries.popitem(last=False)
+            self._forget(evicted_payload)
+            self.stats.evictions += 1
+            logger.debug(f'Evict data from memory cache by key "{evicted_key}".')
+
+    async def load_from_cache(self, cache_key: str) -> Any:
+        """Загружает данные из кэша."""
+        entry = await self.load_entry(cache_key)
+        return entry.data if entry else None
+
+    async def delete_from_cache(self, cache_keys: list[str]) -> None:
+        """Удаляет данные из кэша."""
+        for cache_key in cache_keys:
+            self._remove(cache_key)
+
+    async def load_entry(self, cache_key: str) -> Optional[CacheEntry]:
+        """
+        Загружает данные из кэша вместе с оставшимся временем жизни.
+        Для данных, взятых из другого источника, возвращается время жизни в этом источнике.
+        """
+        now = time.monotonic()
+        if self._report_at is not None and now >= self._report_at:
+            self._report_at = now + self.stats_interval
+            logger.info(f'Memory cache: {self.stats}')
+
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        payload, expire_at, source_expire_at = entry
+        if expire_at <= now:
+            self._remove(cache_key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(cache_key)
+        self.stats.hits += 1
+        ttl = (source_expire_at or expire_at) - now
+        return CacheEntry(payload=payload, serializer=self.serializer, ttl=ttl)
+
+    def _remove(self, cache_key: str) -> None:
+        entry = self._entries.pop(cache_key, None)
+        if entry is not None:
+            self._forget(entry[0])
+
+    def _forget(self, payload: bytes) -> None:
+        self.stats.size -= len(payload)
+        self.stats.items -= 1
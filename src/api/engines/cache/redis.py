@@ -1,10 +1,10 @@
 import logging
-import pickle
 from datetime import timedelta
-from typing import Any
+from typing import Any, Optional
 
 from aioredis import Redis
-from engines.cache.general import CacheEngine
+from engines.cache.codecs import CacheSerializer
+from engines.cache.general import CacheEngine, CacheEntry
 
 logger = logging.getLogger(__name__)
 
@@ -14,22 +14,103 @@ class RedisCacheEngine(CacheEngine):
     Реализация кеширования на основе сервиса Redis.
     """
 
-    def __init__(self, redis: Redis, ttl: timedelta = 60):
+    def __init__(
+        self, redis: Redis, ttl: timedelta = 60, serializer: Optional[CacheSerializer] = None,
+    ):
         self.redis = redis
         self.expire = int(ttl.total_seconds())
+        if serializer:
+            self.serializer = serializer
 
     async def save_to_cache(self, cache_key: str, data: Any) -> None:
         """Сохраняет данные в кэш."""
         logger.info(f'Put data to Redis by key "{cache_key}".')
         await self.redis.set(
-            key=cache_key, value=pickle.dumps(data), expire=self.expire,
+            key=cache_key, value=self.serializer.encode(data), expire=self.expire,
         )
 
     async def load_from_cache(self, cache_key: str) -> Any:
         """Загружает данные из кэша."""
         logger.info(f'Get data from Redis by key "{cache_key}".')
         data = await self.redis.get(key=cache_key)
-        if not data:
+        if not self._is_valid(cache_key, data):
+            return None
+        return self.serializer.decode(data)
+
+    async def load_entry(self, cache_key: str) -> Optional[CacheEntry]:
+        """Загружает данные из кэша вместе с оставшимся временем жизни за один запрос к Redis."""
+        logger.info(f'Get data with TTL from Redis by key "{cache_key}".')
+        pipeline = self.redis.pipeline()
+        data_future = pipeline.get(key=cache_key)
+        ttl_future = pipeline.pttl(key=cache_key)
+        await pipeline.execute()
+        data, ttl = await data_future, await ttl_future
+        if not self._is_valid(cache_key, data):
             return None
-        data = pickle.loads(data)
-        return data
+        # PTTL возвращает отрицательное значение, если у ключа нет срока жизни.
+        return CacheEntry(
+            payload=data, serializer=self.serializer, ttl=ttl / 1000 if ttl >= 0 else None,
+        )
+
+    async def load_many(self, cache_keys: list[str]) -> list[Any]:
+        """Загружает данные из кэша по списку ключей одним запросом MGET."""
+        if not cache_keys:
+            return []
+        logger.info(f'Get {len(cache_keys)} keys from Redis.')
+        values = await self.redis.mget(*cache_keys)
+        return [
+            self.serializer.decode(value) if self._is_valid(cache_key, value) else None
+            for cache_key, value in zip(cache_keys, values)
+        ]
+
+    async def save_many(self, data: dict[str, Any]) -> None:
+        """Сохраняет в кэш данные по нескольким ключам одним конвейером (pipeline) команд SET."""
+        if not data:
+            return
+        logger.info(f'Put {len(data)} keys to Redis.')
+        pipeline = self.redis.pipeline()
+        for cache_key, value in data.items():
+            pipeline.set(key=cache_key, value=self.serializer.encode(value), expire=self.expire)
+        await pipeline.execute()
+
+    async def delete_from_cache(self, cache_keys: list[str]) -> None:
+        """Удаляет данные из кэша."""
+        if not cache_keys:
+            return
+        logger.info(f'Delete {len(cache_keys)} keys from Redis.')
+        await self.redis.delete(*cache_keys)
+
+    async def add_tags(self, cache_key: str, tags: list[str]) -> None:
+        """Помечает запись кэша тегами. Тег - множество ключей Redis, живущее не меньше помеченных записей."""
+        pipeline = self.redis.pipeline()
+        for tag in tags:
+            pipeline.sadd(self._tag_key(tag), cache_key)
+            pipeline.expire(self._tag_key(tag), self.expire)
+        await pipeline.execute()
+
+    async def invalidate_tags(self, tags: list[str]) -> list[str]:
+        """
+        Удаляет из кэша все записи с указанными тегами и возвращает их ключи.
+        Сами теги не удаляются: по ним другие процессы очищают свой локальный кэш, а истекают они вместе с записями.
+        """
+        if not tags:
+            return []
+        pipeline = self.redis.pipeline()
+        members_futures = [pipeline.smembers(self._tag_key(tag), encoding='utf-8') for tag in tags]
+        await pipeline.execute()
+        cache_keys = list({key for future in members_futures for key in await future})
+        await self.delete_from_cache(cache_keys)
+        return cache_keys
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f'tag:{tag}'
+
+    def _is_valid(self, cache_key: str, data: Optional[bytes]) -> bool:
+        if not data:
+            return False
+        if not self.serializer.is_known(data):
+            # Например, запись в старом формате, сохраненная до смены способа сериализации.
+            logger.warning(f'Skip data in unknown format from Redis by key "{cache_key}".')
+            return False
+        return True
@@ -0,0 +1,79 @@
+import logging
+from typing import Any, Optional
+
+from engines.cache.general import CacheEngine, CacheEntry
+from engines.cache.memory import MemoryCacheEngine
+from engines.cache.redis import RedisCacheEngine
+
+logger = logging.getLogger(__name__)
+
+
+class TieredCacheEngine(CacheEngine):
+    """
+    Двухуровневое кеширование: локальный кэш процесса перед общим кэшем (Redis).
+    Оба уровня должны использовать один способ сериализации: данные из Redis
+    переносятся в локальный кэш без перекодирования.
+    """
+
+    def __init__(self, local_cache: MemoryCacheEngine, shared_cache: RedisCacheEngine):
+        self.local_cache = local_cache
+        self.shared_cache = shared_cache
+
+    async def save_to_cache(self, cache_key: str, data: Any) -> None:
+        """Сохраняет данные в оба уровня кэша."""
+        await self.local_cache.save_to_cache(cache_key, data, source_ttl=self.shared_cache.expire)
+        await self.shared_cache.save_to_cache(cache_key, data)
+
+    async def load_from_cache(self, cache_key: str) -> Any:
+        """Загружает данные из локального кэша, а при промахе - из общего."""
+        entry = await self.load_entry(cache_key)
+        return entry.data if entry else None
+
+    async def load_entry(self, cache_key: str) -> Optional[CacheEntry]:
+        """Загружает данные вместе с оставшимся временем жизни в общем кэше."""
+        entry = await self.local_cache.load_entry(cache_key)
+        if entry is not None:
+            return entry
+
+        entry = await self.shared_cache.load_entry(cache_key)
+        if entry is not None:
+            self.local_cache.save_payload(cache_key, entry.payload, source_ttl=entry.ttl)
+        return entry
+
+    async def load_many(self, cache_keys: list[str]) -> list[Any]:
+        """Загружает данные из локального кэша, а недостающие - одним запросом из общего."""
+        result = await self.local_cache.load_many(cache_keys)
+        missing = [index for index, data in enumerate(result) if data is None]
+        if not missing:
+            return result
+
+        shared_data = await self.shared_cache.load_many([cache_keys[index] for index in missing])
+        for index, data in zip(missing, shared_data):
+            if data is not None:
+                result[index] = data
+                # MGET не возвращает время жизни, поэтому оно считается полным (не дольше жизни локального кэша).
+                await self.local_cache.save_to_cache(
+                    cache_keys[index], data, source_ttl=self.shared_cache.expire,
+                )
+        return result
+
+    async def save_many(self, data: dict[str, Any]) -> None:
+        """Сохраняет данные в оба уровня кэша."""
+        for cache_key, value in data.items():
+            await self.local_cache.save_to_cache(cache_key, value, source_ttl=self.shared_cache.expire)
+        await self.shared_cache.save_many(data)
+
+    async def delete_from_cache(self, cache_keys: list[str]) -> None:
+        """Удаляет данные из обоих уровней кэша."""
+        await self.local_cache.delete_from_cache(cache_keys)
+        await self.shared_cache.delete_from_cache(cache_keys)
+
+    async def add_tags(self, cache_key: str, tags: list[str]) -> None:
+        """Теги хранятся только в общем кэше: все ключи локального кэша есть и в нем."""
+        await self.shared_cache.add_tags(cache_key, tags)
+
+    async def invalidate_tags(self, tags: list[str]) -> list[str]:
+        """Удаляет записи с тегами из общего кэша, а затем те же ключи - из локального."""
+        cache_keys = await self.shared_cache.invalidate_tags(tags)
+        await self.local_cache.delete_from_cache(cache_keys)
+        return cache_keys
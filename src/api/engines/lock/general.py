@@ -0,0 +1,19 @@
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Optional
+
+
+class LockEngine(ABC):
+    """
+    Абстрактный класс распределенной блокировки.
+    """
+
+    @abstractmethod
+    async def acquire(self, lock_key: str, ttl: timedelta) -> Optional[str]:
+        """Пытается захватить блокировку. Возвращает токен владельца или None, если блокировка занята."""
+        pass
+
+    @abstractmethod
+    async def release(self, lock_key: str, token: str) -> None:
+        """Освобождает блокировку, если она все еще принадлежит владельцу токена."""
+        pass
@@ -0,0 +1,44 @@
+import logging
+import uuid
+from datetime import timedelta
+from typing import Optional
+
+from aioredis import Redis
+from engines.lock.general import LockEngine
+
+logger = logging.getLogger(__name__)
+
+# Удаляет ключ только если в нем записан токен владельца.
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLockEngine(LockEngine):
+    """
+    Реализация распределенной блокировки на основе сервиса Redis (SET NX PX).
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def acquire(self, lock_key: str, ttl: timedelta) -> Optional[str]:
+        """Пытается захватить блокировку. Возвращает токен владельца или None, если блокировка занята."""
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(
+            key=lock_key,
+            value=token,
+            pexpire=int(ttl.total_seconds() * 1000),
+            exist=Redis.SET_IF_NOT_EXIST,
+        )
+        if not acquired:
+            logger.debug(f'Lock "{lock_key}" is held by another worker.')
+            return None
+        return token
+
+    async def release(self, lock_key: str, token: str) -> None:
+        """Освобождает блокировку, если она все еще принадлежит владельцу токена."""
+        await self.redis.eval(RELEASE_SCRIPT, keys=[lock_key], args=[token])
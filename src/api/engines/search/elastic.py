@@ -1,18 +1,37 @@
+import base64
+import binascii
 from typing import Optional
 
-from elasticsearch import AsyncElasticsearch, NotFoundError
+import orjson
+from elasticsearch import AsyncElasticsearch, NotFoundError, RequestError
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import MultiMatch, Nested, Term
-from engines.search.general import SearchEngine, SearchParams, SearchResult
+from engines.search.general import (
+    InvalidCursorError,
+    SearchEngine,
+    SearchParams,
+    SearchResult,
+)
+
+# Курсор, с которого начинается постраничный обход по курсорам.
+CURSOR_START = '*'
+# Поле с уникальными значениями, по которому упорядочиваются документы с одинаковыми значениями сортировки.
+TIEBREAKER_FIELD = 'uuid'
 
 
 class ElasticSearchEngine(SearchEngine):
     """
     Класс поискового движка ElasticSearch.
+
+    Пагинация по номеру страницы использует from/size и ограничена max_result_window.
+    Пагинация по курсору использует search_after и одинаково быстра на любой глубине.
+    Если задан pit_keep_alive, обход по курсору идет по снимку индекса (point in time),
+    поэтому изменения индекса во время обхода не приводят к пропускам и повторам.
     """
 
-    def __init__(self, service: AsyncElasticsearch):
+    def __init__(self, service: AsyncElasticsearch, pit_keep_alive: Optional[str] = None):
         self.elastic = service
+        self.pit_keep_alive = pit_keep_alive
 
     async def get_by_pk(self, table: str, pk: str) -> Optional[dict]:
         """Возвращает объект по ключу."""
@@ -22,6 +41,16 @@ class ElasticSearchEngine(SearchEngine):
             return None
         return doc['_source']
 
+    async def get_by_pks(self, table: str, pks: list[str]) -> list[Optional[dict]]:
+        """Возвращает объекты по списку ключей (None для ненайденных) за один запрос mget."""
+        if not pks:
+            return []
+        try:
+            docs = await self.elastic.mget(index=table, body={'ids': pks})
+        except NotFoundError:
+            return [None] * len(pks)
+        return [doc['_source'] if doc.get('found') else None for doc in docs['docs']]
+
     async def search(self, table: str, params: SearchParams) -> SearchResult:
         """Возвращает объекты подходящие под параметры поиска."""
         try:
@@ -42,23 +71,32 @@ class ElasticSearchEngine(SearchEngine):
             if params.sort_field:
                 search = search.sort(params.sort_field)
 
-            # Фильтрация
+            # Фильтрация. В контексте фильтра (bool.filter) релевантность не считается,
+            # а результат кэшируется Elasticsearch в кэше фильтров.
             if params.filter_field:
-                search = search.query(
+                search = search.filter(
                     Nested(
                         path=params.filter_field,
                         query=Term(**{f'{params.filter_field}__uuid': params.filter_value}),
                     ),
                 )
 
+            # Проекция: только нужные поля, без описаний и вложенных списков
+            if params.source_fields:
+                search = search.source(includes=params.source_fields)
+
             # Пагинация
+            if params.cursor:
+                return await self._search_after(table, search, params)
             if params.page_number and params.page_size:
                 start = (params.page_number - 1) * params.page_size
                 end = start + params.page_size
                 search = search[start:end]
 
             body = search.to_dict()
-            docs = await self.elastic.search(index=table, body=body)
+            docs = await self.elastic.search(
+                index=table, body=body, request_cache=self._use_request_cache(params),
+            )
         except NotFoundError:
             return SearchResult(items=[], total=0)
         result = SearchResult(
@@ -66,3 +104,76 @@ class ElasticSearchEngine(SearchEngine):
             total=docs['hits']['total']['value'],
         )
         return result
+
+    async def _search_after(self, table: str, search: Search, params: SearchParams) -> SearchResult:
+        """Возвращает страницу, следующую за курсором, и курсор следующей за ней страницы."""
+        after, pit_id = None, None
+        if params.cursor != CURSOR_START:
+            after, pit_id = self._decode_cursor(params.cursor)
+        elif self.pit_keep_alive:
+            pit = await self.elastic.transport.perform_request(
+                'POST', f'/{table}/_pit', params={'keep_alive': self.pit_keep_alive},
+            )
+            pit_id = pit['id']
+
+        search = search.sort(params.sort_field or '_score', TIEBREAKER_FIELD)
+        search = search.extra(size=params.page_size)
+        if after:
+            search = search.extra(search_after=after)
+        body = search.to_dict()
+        try:
+            if pit_id:
+                # Запрос по снимку выполняется без указания индекса.
+                body['pit'] = {'id': pit_id, 'keep_alive': self.pit_keep_alive}
+                docs = await self.elastic.search(body=body)
+                pit_id = docs.get('pit_id', pit_id)
+            else:
+                docs = await self.elastic.search(
+                    index=table, body=body, request_cache=self._use_request_cache(params),
+                )
+        except RequestError as e:
+            # Значения курсора не подходят к сортировке запроса: курсор изменен или выдан для другого запроса.
+            if after is None:
+                raise
+            raise InvalidCursorError('Invalid pagination cursor.') from e
+        except NotFoundError as e:
+            # Снимок курсора истек или не существует. Без снимка это отсутствие индекса.
+            if after is None or not pit_id:
+                raise
+            raise InvalidCursorError('Pagination cursor has expired.') from e
+
+        hits = docs['hits']['hits']
+        next_cursor = None
+        if len(hits) == params.page_size:
+            next_cursor = self._encode_cursor(hits[-1]['sort'], pit_id)
+        elif pit_id:
+            # Обход закончен: освобождаем снимок, не дожидаясь истечения keep_alive.
+            await self.elastic.transport.perform_request(
+                'DELETE', '/_pit', body={'id': pit_id},
+            )
+        return SearchResult(
+            items=[doc['_source'] for doc in hits],
+            total=docs['hits']['total']['value'],
+            next_cursor=next_cursor,
+        )
+
+    @staticmethod
+    def _use_request_cache(params: SearchParams) -> bool:
+        """
+        Списки без поиска по тексту повторяются часто и с ограниченным набором параметров,
+        поэтому их результаты сохраняются в кэше запросов шарда (до обновления индекса).
+        Поисковые запросы слишком разнообразны и только вытесняли бы их из этого кэша.
+        """
+        return not (params.query_fields and params.query_value)
+
+    @staticmethod
+    def _encode_cursor(after: list, pit_id: Optional[str]) -> str:
+        return base64.urlsafe_b64encode(orjson.dumps({'after': after, 'pit': pit_id})).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[list, Optional[str]]:
+        try:
+            data = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return list(data['after']), data.get('pit')
+        except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            raise InvalidCursorError('Invalid pagination cursor.') from e
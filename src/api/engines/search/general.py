@@ -4,6 +4,10 @@ from typing import Optional
 from pydantic import BaseModel
 
 
+class InvalidCursorError(ValueError):
+    """Курсор пагинации поврежден или выдан не для этого запроса."""
+
+
 class SearchResult(BaseModel):
     """
     Ответ поискового движка.
@@ -11,6 +15,7 @@ class SearchResult(BaseModel):
 
     items: list[dict]
     total: int = 0
+    next_cursor: Optional[str] = None
 
 
 class SearchParams(BaseModel):
@@ -25,6 +30,10 @@ class SearchParams(BaseModel):
     filter_value: Optional[str]
     page_number: int = 1
     page_size: int = 20
+    # Поля документа, которые нужно вернуть (по умолчанию - все).
+    source_fields: Optional[list[str]]
+    # Курсор следующей страницы. Если задан, page_number не используется.
+    cursor: Optional[str]
 
 
 class SearchEngine(ABC):
@@ -37,6 +46,11 @@ class SearchEngine(ABC):
         """Возвращает объект по ключу."""
         pass
 
+    @abstractmethod
+    async def get_by_pks(self, table: str, pks: list[str]) -> list[Optional[dict]]:
+        """Возвращает объекты по списку ключей (None для ненайденных) в порядке ключей."""
+        pass
+
     @abstractmethod
     async def search(self, table: str, params: SearchParams) -> SearchResult:
         """Возвращает объекты подходящие под параметры поиска."""
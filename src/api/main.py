@@ -9,6 +9,8 @@ from fastapi import FastAPI, Request
 from fastapi.responses import ORJSONResponse
 from jose import JWTError, jwt
 from sentry_sdk.integrations.asgi import SentryAsgiMiddleware
+from services.invalidator import invalidator_start, invalidator_stop
+from services.refresher import refresher_start, refresher_stop
 
 import api
 
@@ -47,13 +49,17 @@ async def jwt_handler(request: Request, call_next):
 
 @app.on_event('startup')
 async def startup():
+    refresher_start()
     await asyncio.gather(
         redis_connect(), elastic_connect(),
     )
+    await invalidator_start()
 
 
 @app.on_event('shutdown')
 async def shutdown():
+    await invalidator_stop()
+    await refresher_stop()
     await asyncio.gather(
         redis_disconnect(), elastic_disconnect(),
     )
@@ -35,3 +35,7 @@ class Page(FastJsonModel, Generic[PT]):
     page_size: Optional[int] = Field(
         title='Объектов на странице', example=20,
     )
+    next_cursor: Optional[str] = Field(
+        title='Курсор следующей страницы',
+        description='Передается в page[cursor] для получения следующей страницы. Нет на последней странице.',
+    )
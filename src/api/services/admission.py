@@ -0,0 +1,72 @@
+import unicodedata
+from typing import Optional
+
+# Количество строк (независимых хеш-функций) в count-min sketch.
+SKETCH_DEPTH = 4
+# Предел счетчика: дальше частоту различать не нужно, а байтовые счетчики не переполняются.
+COUNTER_LIMIT = 255
+
+
+def normalize_query(query: Optional[str]) -> Optional[str]:
+    """
+    Приводит поисковый запрос к ключу для кэша и политики допуска: NFKC, без учета регистра, с одиночными пробелами.
+    В Elasticsearch этот вид не отправляется: casefold отличается от lowercase анализатора индекса
+    (например, ß -> ss), и часть запросов находила бы другие документы.
+    """
+    if query is None:
+        return None
+    return ' '.join(unicodedata.normalize('NFKC', query).casefold().split())
+
+
+def collapse_whitespace(query: Optional[str]) -> Optional[str]:
+    """Убирает пробелы в начале и конце запроса и заменяет их повторы одним пробелом: на поиск это не влияет."""
+    if query is None:
+        return None
+    return ' '.join(query.split())
+
+
+class FrequencySketch:
+    """
+    Приблизительный счетчик частоты ключей (count-min sketch) с постепенным забыванием.
+    Памяти занимает SKETCH_DEPTH * width байт независимо от количества ключей.
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self.sample_size = width * 10
+        self.additions = 0
+        self._rows = [bytearray(width) for _ in range(SKETCH_DEPTH)]
+
+    def increment(self, key: str) -> int:
+        """Учитывает обращение к ключу и возвращает оценку его частоты."""
+        estimate = COUNTER_LIMIT
+        for seed, row in enumerate(self._rows):
+            index = hash((seed, key)) % self.width
+            if row[index] < COUNTER_LIMIT:
+                row[index] += 1
+            estimate = min(estimate, row[index])
+
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+        return estimate
+
+    def _age(self) -> None:
+        """Уменьшает все счетчики вдвое, чтобы старая популярность не мешала новой."""
+        self._rows = [bytearray(counter >> 1 for counter in row) for row in self._rows]
+        self.additions //= 2
+
+
+class TinyLFUAdmission:
+    """
+    Политика допуска в кэш в стиле TinyLFU: ключ кэшируется только после min_hits обращений.
+    Так голова распределения запросов попадает в кэш, а разовые запросы - нет.
+    """
+
+    def __init__(self, min_hits: int, width: int):
+        self.min_hits = min_hits
+        self.sketch = FrequencySketch(width)
+
+    def admit(self, key: str) -> bool:
+        """Учитывает обращение к ключу и решает, нужно ли работать с ним через кэш."""
+        return self.sketch.increment(key) >= self.min_hits
@@ -1,3 +1,4 @@
+from functools import partial
 from typing import Optional
 
 from engines.search.general import SearchParams
@@ -19,8 +20,9 @@ class FilmService(GeneralService):
         filter_value: str,
         page_number: int,
         page_size: int,
+        cursor: Optional[str] = None,
     ) -> Page[item_brief_dataclass]:
-        """Возвращает список фильмов с фильтрацией и сортировкой."""
+        """Возвращает список фильмов с фильтрацией и сортировкой. Страницы по курсору не кэшируются."""
         sort_value = sort.value if sort else None
         filter_field_value = filter_field.value if filter_field else None
         cache_key = f'{self.table}:get_sorted_filtered(sort={sort_value},filter_field={filter_field_value},filter_value={filter_value},page_number={page_number},page_size={page_size}))'
@@ -30,17 +32,11 @@ class FilmService(GeneralService):
             filter_value=filter_value,
             page_number=page_number,
             page_size=page_size,
+            cursor=cursor,
+            source_fields=self.brief_source_fields,
         )
+        if cursor:
+            return self._make_page(await self._fetch_page(params), None, page_size)
 
-        search_results = await self.cache_engine.load_from_cache(cache_key)
-        if not search_results:
-            search_results = await self.search_engine.search(table=self.table, params=params)
-            await self.cache_engine.save_to_cache(cache_key, search_results)
-
-        data_page = Page(
-            items=[self.item_brief_dataclass(**item) for item in search_results.items],
-            total=search_results.total,
-            page_number=page_number,
-            page_size=page_size,
-        )
-        return data_page
+        page_data = await self._get_cached(cache_key, partial(self._fetch_page, params, cache_key))
+        return self._make_page(page_data, page_number, page_size)
@@ -1,18 +1,40 @@
+import time
 from abc import ABCMeta, abstractmethod
-from typing import Optional, TypeVar
+from functools import partial
+from typing import Any, Optional, TypeVar
 
+import orjson
 from engines.cache.general import CacheEngine
 from engines.search.general import SearchEngine, SearchParams
 from models.general import Page
+from services.admission import TinyLFUAdmission, collapse_whitespace, normalize_query
+from services.refresher import CacheRefresher
+from services.single_flight import Fetcher, SingleFlight
 
 ST = TypeVar('ST')
 FT = TypeVar('FT')
 
+# Вес последнего замера в скользящем среднем времени загрузки из поискового движка.
+FETCH_TIME_SMOOTHING = 0.2
+
 
 class GeneralService(metaclass=ABCMeta):
-    def __init__(self, cache_engine: CacheEngine, search_engine: SearchEngine):
+    def __init__(
+        self,
+        cache_engine: CacheEngine,
+        search_engine: SearchEngine,
+        single_flight: Optional[SingleFlight] = None,
+        refresher: Optional[CacheRefresher] = None,
+        search_admission: Optional[TinyLFUAdmission] = None,
+    ):
         self.cache_engine = cache_engine
         self.search_engine = search_engine
+        self.single_flight = single_flight or SingleFlight()
+        self.refresher = refresher
+        self.search_admission = search_admission
+        self.fetch_time = 0.0
+        # Растет при каждой инвалидации. Данные, прочитанные до нее, в кэш не сохраняются.
+        self.invalidation_generation = 0
 
     @property
     @abstractmethod
@@ -38,34 +60,162 @@ class GeneralService(metaclass=ABCMeta):
         """Класс на который будут мапиться выходные данные, если они должны быть выведены в краткой форме."""
         pass
 
+    @property
+    def brief_source_fields(self) -> list[str]:
+        """Поля документа, которые нужны для краткой формы. Списки запрашивают у поискового движка только их."""
+        return [field.alias for field in self.item_brief_dataclass.__fields__.values()]
+
     async def get_by_uuid(self, uuid: str) -> Optional[FT]:
         """Возвращает объект по UUID."""
-        cache_key = f'{self.table}:get_by_uuid(uuid={uuid})'
-
-        data = await self.cache_engine.load_from_cache(cache_key)
+        data = await self._get_cached(self._item_cache_key(uuid), partial(self._fetch_item, uuid))
         if not data:
-            data = await self.search_engine.get_by_pk(table=self.table, pk=uuid)
-            if not data:
-                return None
-            await self.cache_engine.save_to_cache(cache_key, data)
+            return None
 
         return self.item_dataclass(**data)
 
-    async def search(self, query: str, page_number: int, page_size: int) -> Page[ST]:
-        """Ищет объекты по поисковым полям. Не кеширует результаты, так как вариантов может быть очень много."""
+    async def get_by_uuid_json(self, uuid: str) -> Optional[bytes]:
+        """Возвращает объект по UUID в виде готового JSON. При попадании в кэш модели не строятся."""
+        return await self._get_cached(
+            self._item_cache_key(uuid), partial(self._fetch_item, uuid), as_json=True,
+        )
+
+    async def get_by_uuids(self, uuids: list[str]) -> list[FT]:
+        """
+        Возвращает объекты по списку UUID в порядке запроса, пропуская ненайденные.
+        Кэш и поисковый движок опрашиваются одним запросом на все объекты.
+        """
+        uuids = list(dict.fromkeys(uuids))
+        cached = await self.cache_engine.load_many([self._item_cache_key(uuid) for uuid in uuids])
+        items = dict(zip(uuids, cached))
+
+        missing = [uuid for uuid, data in items.items() if data is None]
+        if missing:
+            generation = self.invalidation_generation
+            docs = await self.search_engine.get_by_pks(table=self.table, pks=missing)
+            fetched = {
+                uuid: self.item_dataclass(**doc).dict()
+                for uuid, doc in zip(missing, docs)
+                if doc
+            }
+            cache_keys = [self._item_cache_key(uuid) for uuid in fetched]
+            if generation == self.invalidation_generation:
+                await self.cache_engine.save_many(dict(zip(cache_keys, fetched.values())))
+                if generation != self.invalidation_generation:
+                    await self.cache_engine.delete_from_cache(cache_keys)
+            items.update(fetched)
+
+        return [self.item_dataclass(**data) for data in items.values() if data is not None]
+
+    async def search(
+        self, query: str, page_number: int, page_size: int, cursor: Optional[str] = None,
+    ) -> Page[ST]:
+        """
+        Ищет объекты по поисковым полям.
+        Кэшируются только частые запросы, так как вариантов запросов может быть очень много.
+        Страницы по курсору не кэшируются.
+        """
         params = SearchParams(
             query_fields=self.query_fields,
-            query_value=query,
+            query_value=collapse_whitespace(query),
             page_number=page_number,
             page_size=page_size,
+            cursor=cursor,
+            source_fields=self.brief_source_fields,
         )
+        if cursor:
+            return self._make_page(await self._fetch_page(params), None, page_size)
 
+        cache_key = f'{self.table}:search(query={normalize_query(query)},page_number={page_number},page_size={page_size})'
+        if self.search_admission and self.search_admission.admit(cache_key):
+            page_data = await self._get_cached(cache_key, partial(self._fetch_page, params, cache_key))
+        else:
+            page_data = await self._fetch_page(params)
+        return self._make_page(page_data, page_number, page_size)
+
+    async def invalidate(self, uuids: list[str]) -> None:
+        """Удаляет из кэша объекты по списку UUID и все закэшированные страницы, на которых они есть."""
+        self.invalidation_generation += 1
+        await self.cache_engine.delete_from_cache([self._item_cache_key(uuid) for uuid in uuids])
+        await self.cache_engine.invalidate_tags([self._item_tag(uuid) for uuid in uuids])
+
+    def _item_cache_key(self, uuid: str) -> str:
+        return f'{self.table}:get_by_uuid(uuid={uuid})'
+
+    def _item_tag(self, uuid: str) -> str:
+        return f'{self.table}:item(uuid={uuid})'
+
+    async def _fetch_item(self, uuid: str) -> Optional[dict]:
+        """Загружает объект из поискового движка в том виде, в котором его отдает API."""
+        doc = await self.search_engine.get_by_pk(table=self.table, pk=uuid)
+        if not doc:
+            return None
+        return self.item_dataclass(**doc).dict()
+
+    async def _fetch_page(self, params: SearchParams, cache_key: Optional[str] = None) -> dict:
+        """
+        Загружает страницу объектов из поискового движка в том виде, в котором ее отдает API.
+        Если страница будет закэширована по cache_key, она помечается тегами объектов на ней,
+        чтобы ее можно было удалить из кэша при изменении любого из них.
+        """
         search_results = await self.search_engine.search(table=self.table, params=params)
+        items = [self.item_brief_dataclass(**item) for item in search_results.items]
+        if cache_key:
+            await self.cache_engine.add_tags(cache_key, [self._item_tag(item.uuid) for item in items])
+        return {
+            'items': [item.dict() for item in items],
+            'total': search_results.total,
+            'next_cursor': search_results.next_cursor,
+        }
 
-        data_page = Page(
-            items=[self.item_brief_dataclass(**item) for item in search_results.items],
-            total=search_results.total,
+    def _make_page(self, page_data: dict, page_number: Optional[int], page_size: int) -> Page[ST]:
+        """Собирает страницу из закэшированных данных. Данные уже проверены при загрузке, поэтому не валидируются."""
+        return Page(
+            items=[self.item_brief_dataclass.construct(**item) for item in page_data['items']],
+            total=page_data['total'],
             page_number=page_number,
             page_size=page_size,
+            next_cursor=page_data.get('next_cursor'),
         )
-        return data_page
+
+    async def _get_cached(self, cache_key: str, fetch: Fetcher, as_json: bool = False) -> Any:
+        """
+        Возвращает данные из кэша, а при промахе загружает их из поискового движка и сохраняет в кэш.
+        Одновременные промахи по одному ключу объединяются в один запрос к поисковому движку.
+        В режиме stale-while-revalidate устаревшие данные отдаются сразу, а обновляются в фоне.
+        С as_json данные возвращаются готовым JSON, без декодирования закэшированного значения.
+        """
+        fetch_to_cache = partial(self._fetch_to_cache, cache_key, fetch)
+        entry = await self.cache_engine.load_entry(cache_key)
+        if entry is not None:
+            if self.refresher and self.refresher.should_refresh(entry.ttl, self.fetch_time):
+                self.refresher.schedule(
+                    cache_key,
+                    partial(self.single_flight.do, cache_key, fetch=fetch_to_cache, background=True),
+                )
+            return entry.json if as_json else entry.data
+
+        data = await self.single_flight.do(
+            cache_key,
+            fetch=fetch_to_cache,
+            peek=partial(self.cache_engine.load_from_cache, cache_key),
+        )
+        if as_json and data is not None:
+            return orjson.dumps(data)
+        return data
+
+    async def _fetch_to_cache(self, cache_key: str, fetch: Fetcher) -> Any:
+        """
+        Загружает данные и сохраняет их в кэш.
+        Если во время загрузки или сохранения пришла инвалидация, данные могли устареть до того,
+        как попали в кэш, и удалить их было нечем: тогда они не сохраняются или сразу удаляются.
+        """
+        generation = self.invalidation_generation
+        started = time.monotonic()
+        data = await fetch()
+        self.fetch_time += (time.monotonic() - started - self.fetch_time) * FETCH_TIME_SMOOTHING
+        if data is None or generation != self.invalidation_generation:
+            return data
+        await self.cache_engine.save_to_cache(cache_key, data)
+        if generation != self.invalidation_generation:
+            await self.cache_engine.delete_from_cache([cache_key])
+        return data
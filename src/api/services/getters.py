@@ -1,40 +1,116 @@
 from functools import lru_cache
+from typing import Optional
 
 from aioredis import Redis
 from core import config
 from db.elastic import get_elastic
 from db.redis import get_redis
 from elasticsearch import AsyncElasticsearch
+from engines.cache.codecs import CODECS, CacheSerializer
+from engines.cache.dummy import DummyCacheEngine
+from engines.cache.general import CacheEngine
+from engines.cache.memory import MemoryCacheEngine
 from engines.cache.redis import RedisCacheEngine
+from engines.cache.tiered import TieredCacheEngine
+from engines.lock.redis import RedisLockEngine
 from engines.search.elastic import ElasticSearchEngine
 from fastapi import Depends
+from services.admission import TinyLFUAdmission
 from services.film import FilmService
 from services.genre import GenreService
 from services.person import PersonService
+from services.refresher import get_refresher
+from services.single_flight import SingleFlight
+
+
+@lru_cache
+def get_cache_serializer() -> CacheSerializer:
+    """Возвращает способ сериализации данных кэша, выбранный в настройках."""
+    return CacheSerializer(
+        CODECS[config.CACHE_CODEC],
+        config.CACHE_COMPRESSION_THRESHOLD or None,
+        config.CACHE_COMPRESSION_LEVEL,
+    )
+
+
+@lru_cache
+def get_memory_cache() -> MemoryCacheEngine:
+    """Возвращает локальный кэш процесса, общий для всех сервисов."""
+    return MemoryCacheEngine(
+        config.MEMORY_CACHE_MAX_SIZE,
+        config.MEMORY_CACHE_TTL,
+        get_cache_serializer(),
+        config.MEMORY_CACHE_STATS_INTERVAL or None,
+    )
+
+
+def get_cache_engine(redis: Redis) -> CacheEngine:
+    """Возвращает движок кэширования, выбранный в настройках."""
+    if config.CACHE_ENGINE == 'dummy':
+        return DummyCacheEngine()
+    redis_cache = RedisCacheEngine(
+        redis, config.CACHE_TTL + config.CACHE_STALE_TTL, get_cache_serializer(),
+    )
+    if config.CACHE_ENGINE == 'tiered':
+        return TieredCacheEngine(get_memory_cache(), redis_cache)
+    return redis_cache
+
+
+def get_single_flight(redis: Redis) -> SingleFlight:
+    """Возвращает объединитель запросов, при необходимости с блокировкой между процессами."""
+    lock_engine = RedisLockEngine(redis) if config.SINGLE_FLIGHT_REDIS_LOCK else None
+    return SingleFlight(
+        lock_engine, config.SINGLE_FLIGHT_LOCK_TTL, config.SINGLE_FLIGHT_POLL_INTERVAL,
+    )
+
+
+def get_search_admission() -> Optional[TinyLFUAdmission]:
+    """Возвращает политику допуска поисковых запросов в кэш или None, если поиск не кэшируется."""
+    if not config.SEARCH_CACHE_MIN_HITS:
+        return None
+    return TinyLFUAdmission(config.SEARCH_CACHE_MIN_HITS, config.SEARCH_CACHE_SKETCH_WIDTH)
 
 
 @lru_cache
 def get_film_service(
     redis: Redis = Depends(get_redis), elastic: AsyncElasticsearch = Depends(get_elastic),
 ) -> FilmService:
-    redis_cache = RedisCacheEngine(redis, config.CACHE_TTL)
-    elastic_search = ElasticSearchEngine(elastic)
-    return FilmService(redis_cache, elastic_search)
+    cache_engine = get_cache_engine(redis)
+    elastic_search = ElasticSearchEngine(elastic, config.ELASTIC_PIT_KEEP_ALIVE or None)
+    return FilmService(
+        cache_engine,
+        elastic_search,
+        get_single_flight(redis),
+        get_refresher(),
+        get_search_admission(),
+    )
 
 
 @lru_cache
 def get_genre_service(
     redis: Redis = Depends(get_redis), elastic: AsyncElasticsearch = Depends(get_elastic),
 ) -> GenreService:
-    redis_cache = RedisCacheEngine(redis, config.CACHE_TTL)
-    elastic_search = ElasticSearchEngine(elastic)
-    return GenreService(redis_cache, elastic_search)
+    cache_engine = get_cache_engine(redis)
+    elastic_search = ElasticSearchEngine(elastic, config.ELASTIC_PIT_KEEP_ALIVE or None)
+    return GenreService(
+        cache_engine,
+        elastic_search,
+        get_single_flight(redis),
+        get_refresher(),
+        get_search_admission(),
+    )
 
 
 @lru_cache
 def get_person_service(
     redis: Redis = Depends(get_redis), elastic: AsyncElasticsearch = Depends(get_elastic),
 ) -> PersonService:
-    redis_cache = RedisCacheEngine(redis, config.CACHE_TTL)
-    elastic_search = ElasticSearchEngine(elastic)
-    return PersonService(redis_cache, elastic_search)
+    cache_engine = get_cache_engine(redis)
+    elastic_search = ElasticSearchEngine(elastic, config.ELASTIC_PIT_KEEP_ALIVE or None)
+    return PersonService(
+        cache_engine,
+        elastic_search,
+        get_single_flight(redis),
+        get_refresher(),
+        get_search_admission(),
+    )
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import Any, Optional
+
+import aioredis.errors
+from core import config
+from db.elastic import get_elastic
+from db.redis import get_redis
+from services.general import GeneralService
+from services.getters import get_film_service, get_genre_service, get_person_service
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повторной подпиской после потери соединения с Redis, секунд.
+RESUBSCRIBE_DELAY = 1.0
+
+
+class CacheInvalidator:
+    """
+    Удаляет из кэша измененные объекты по событиям ETL.
+
+    ETL после загрузки пачки документов в Elasticsearch публикует в канал Redis сообщение
+    {"index": "movies", "ids": [...]}. Для каждого id удаляется его карточка и все закэшированные
+    страницы списков и поиска, на которых он есть. Благодаря этому CACHE_TTL можно делать большим:
+    время жизни записи остается лишь страховкой на случай потерянного сообщения.
+    """
+
+    def __init__(self, channel_name: str, services: list[GeneralService]):
+        self.channel_name = channel_name
+        self.services = {service.table: service for service in services}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Запускает прослушивание канала в фоне."""
+        self._task = asyncio.ensure_future(self._listen())
+
+    async def stop(self) -> None:
+        """Останавливает прослушивание канала."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def handle(self, message: Any) -> None:
+        """Удаляет из кэша объекты, перечисленные в сообщении."""
+        if not isinstance(message, dict):
+            logger.warning(f'Skip cache invalidation message: {message}')
+            return
+        index = message.get('index')
+        service = self.services.get(index) if isinstance(index, str) else None
+        ids = message.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(uuid, str) for uuid in ids):
+            ids = []
+        if service is None or not ids:
+            logger.warning(f'Skip cache invalidation message: {message}')
+            return
+        logger.info(f'Invalidate {len(ids)} objects of "{service.table}" in cache.')
+        await service.invalidate(ids)
+
+    async def _listen(self) -> None:
+        while True:
+            redis = await get_redis()
+            try:
+                channel, = await redis.subscribe(self.channel_name)
+                logger.info(f'Subscribed to cache invalidation channel "{self.channel_name}".')
+                while await channel.wait_message():
+                    try:
+                        await self.handle(await channel.get_json())
+                    except (aioredis.errors.RedisError, ConnectionError):
+                        raise
+                    except Exception as e:
+                        # Одно плохое сообщение не должно останавливать инвалидацию остальных.
+                        logger.exception(f'Failed to handle cache invalidation message: {e}')
+            except (aioredis.errors.RedisError, ConnectionError) as e:
+                logger.error(f'Cache invalidation channel error: {e}')
+            # Сообщения, пропущенные без подписки, не теряются бесследно: записи истекут по CACHE_TTL.
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+
+invalidator: Optional[CacheInvalidator] = None
+
+
+async def invalidator_start() -> None:
+    """Подписывается на события изменения данных, если канал задан в настройках."""
+    global invalidator
+    if not config.CACHE_INVALIDATION_CHANNEL or config.CACHE_ENGINE == 'dummy':
+        return
+    redis, elastic = await get_redis(), await get_elastic()
+    invalidator = CacheInvalidator(
+        config.CACHE_INVALIDATION_CHANNEL,
+        [
+            get_film_service(redis, elastic),
+            get_genre_service(redis, elastic),
+            get_person_service(redis, elastic),
+        ],
+    )
+    invalidator.start()
+
+
+async def invalidator_stop() -> None:
+    """Отписывается от событий изменения данных."""
+    if invalidator:
+        await invalidator.stop()
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import math
+import random
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+
+class CacheRefresher:
+    """
+    Обновляет записи кэша в фоне (stale-while-revalidate).
+
+    Запись живет в кэше CACHE_TTL + stale_ttl. Последние stale_ttl секунд она считается устаревшей:
+    пользователь сразу получает старые данные, а обновление из поискового движка идет в фоне.
+    Чтобы популярные ключи не устаревали одновременно, обновление запускается заранее
+    с вероятностью, растущей к концу срока свежести (алгоритм XFetch).
+    """
+
+    def __init__(self, stale_ttl: timedelta, beta: float = 1.0):
+        self.stale_ttl = stale_ttl.total_seconds()
+        self.beta = beta
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def should_refresh(self, ttl: Optional[float], fetch_time: float) -> bool:
+        """
+        Решает, пора ли обновлять запись.
+
+        Args:
+            ttl: оставшееся время жизни записи в кэше.
+            fetch_time: типичное время загрузки данных из поискового движка.
+        """
+        if ttl is None:
+            return False
+        fresh_ttl = ttl - self.stale_ttl
+        # -log(random()) - экспоненциально распределенная величина, поэтому
+        # устаревшая запись (fresh_ttl <= 0) обновляется всегда.
+        return fresh_ttl <= -fetch_time * self.beta * math.log(1.0 - random.random())
+
+    def schedule(self, cache_key: str, refresh: Callable[[], Awaitable]) -> None:
+        """Запускает обновление записи в фоне, если оно еще не запущено."""
+        if cache_key in self._tasks:
+            return
+        logger.debug(f'Schedule background refresh by key "{cache_key}".')
+        task = asyncio.ensure_future(refresh())
+        task.add_done_callback(lambda done: self._forget(cache_key, done))
+        self._tasks[cache_key] = task
+
+    async def shutdown(self) -> None:
+        """Отменяет незавершенные обновления."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _forget(self, cache_key: str, task: asyncio.Task) -> None:
+        self._tasks.pop(cache_key, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f'Background refresh by key "{cache_key}" failed: {task.exception()}')
+
+
+refresher: Optional[CacheRefresher] = None
+
+
+def get_refresher() -> Optional[CacheRefresher]:
+    """Возвращает фоновый обновлятель кэша или None, если stale-while-revalidate отключен."""
+    return refresher
+
+
+def refresher_start() -> None:
+    """Включает фоновое обновление кэша, если оно разрешено настройками."""
+    global refresher
+    if config.CACHE_STALE_TTL:
+        refresher = CacheRefresher(config.CACHE_STALE_TTL, config.CACHE_XFETCH_BETA)
+        logger.info('Stale-while-revalidate cache mode is enabled.')
+
+
+async def refresher_stop() -> None:
+    """Останавливает фоновое обновление кэша."""
+    if refresher:
+        await refresher.shutdown()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from datetime import timedelta
+from functools import partial
+from typing import Any, Awaitable, Callable, Optional
+
+from engines.lock.general import LockEngine
+
+logger = logging.getLogger(__name__)
+
+Fetcher = Callable[[], Awaitable[Any]]
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные запросы за одними и теми же данными в один.
+
+    Внутри процесса данные по ключу загружает только одна корутина, остальные ждут ее результат.
+    Если передан движок блокировок, то запросы объединяются и между процессами: загрузку выполняет
+    владелец блокировки, а остальные процессы дожидаются появления данных в кэше.
+    """
+
+    def __init__(
+        self,
+        lock_engine: Optional[LockEngine] = None,
+        lock_ttl: timedelta = timedelta(seconds=10),
+        poll_interval: float = 0.05,
+    ):
+        self.lock_engine = lock_engine
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(
+        self, key: str, fetch: Fetcher, peek: Optional[Fetcher] = None, background: bool = False,
+    ) -> Any:
+        """
+        Возвращает результат fetch, выполняя его не более одного раза для одновременных вызовов с одним ключом.
+
+        Args:
+            key: ключ объединения запросов (обычно ключ кэша).
+            fetch: загрузка данных из источника.
+            peek: проверка кэша, пока данные загружает другой процесс.
+            background: фоновое обновление - если данные уже загружает другой процесс, ничего не делать.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fetch, peek, background))
+            task.add_done_callback(partial(self._forget, key))
+            self._calls[key] = task
+        else:
+            logger.debug(f'Join in-flight request by key "{key}".')
+        # Отмена одного из ожидающих не должна отменять загрузку для остальных.
+        return await asyncio.shield(task)
+
+    async def _run(
+        self, key: str, fetch: Fetcher, peek: Optional[Fetcher], background: bool,
+    ) -> Any:
+        if self.lock_engine is None:
+            return await fetch()
+
+        lock_key = f'lock:{key}'
+        token = await self.lock_engine.acquire(lock_key, self.lock_ttl)
+        if token is None and background:
+            return None
+        try:
+            if peek is not None:
+                # Данные могли появиться, пока мы ждали блокировку или пока ее держал другой процесс.
+                data = await peek() if token else await self._wait(peek)
+                if data is not None:
+                    return data
+            return await fetch()
+        finally:
+            if token:
+                await self.lock_engine.release(lock_key, token)
+
+    async def _wait(self, peek: Fetcher) -> Any:
+        """Ждет, пока другой процесс положит данные в кэш, но не дольше времени жизни блокировки."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl.total_seconds()
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            data = await peek()
+            if data is not None:
+                return data
+        return None
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Исключение уже получили ожидающие, здесь лишь подавляем предупреждение asyncio.
+            task.exception()
@@ -1,4 +1,4 @@
-from confluent_kafka import Consumer
+from confluent_kafka import Consumer, Producer
 from settings.settings import KafkaTaskSettings
 
 
@@ -10,3 +10,11 @@ def get_consumer(settings: KafkaTaskSettings) -> Consumer:
         'enable.auto.commit': settings.enable_auto_commit,
     })
     return consumer
+
+
+def get_producer(settings: KafkaTaskSettings) -> Producer:
+    producer = Producer({
+        'bootstrap.servers': settings.bootstrap_servers,
+        'acks': 'all',
+    })
+    return producer
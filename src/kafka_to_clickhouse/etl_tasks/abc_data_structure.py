@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List
 
 from confluent_kafka import Message
 
@@ -18,3 +19,12 @@ class TransferClass(ABC):
     @abstractmethod
     def get_tuple(self) -> tuple:
         pass
+
+    @classmethod
+    def get_columns(cls, messages: List[Message]) -> List[list]:
+        """
+        Transform a batch of messages into columns for a columnar insert.
+        Override it to decode the batch without building an object per message.
+        """
+        rows = [cls.create_from_message(message).get_tuple() for message in messages]
+        return [list(column) for column in zip(*rows)]
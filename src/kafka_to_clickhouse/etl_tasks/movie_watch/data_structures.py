@@ -1,11 +1,18 @@
 import datetime
 import uuid
 from dataclasses import astuple, dataclass
+from typing import Dict, List
 
 from confluent_kafka import Message
 from etl_tasks.abc_data_structure import TransferClass
 from orjson import orjson
 
+MS_IN_DAY = 24 * 60 * 60 * 1000
+EPOCH_DATE = datetime.date(1970, 1, 1)
+# View dates by day number, kept between batches. Messages cover a few days, the limit only guards memory
+_view_dates: Dict[int, datetime.date] = {}
+VIEW_DATES_CACHE_SIZE = 1000
+
 
 @dataclass(frozen=True)
 class MovieWatch(TransferClass):
@@ -33,3 +40,33 @@ class MovieWatch(TransferClass):
 
     def get_tuple(self) -> tuple:
         return astuple(self)
+
+    @staticmethod
+    def get_columns(messages: List[Message]) -> List[list]:
+        """
+        Transform a batch of messages into columns (MovieID, UserID, ViewDate, ViewTimestamp).
+
+        UUIDs stay strings: clickhouse-driver parses them once while writing the column.
+        View dates are computed from the timestamp in whole days and reused across batches.
+        """
+        # Every value is decoded on its own: a value holding several objects or broken values
+        # would shift the records of the other messages in a single joined array.
+        records = [orjson.loads(message.value()) for message in messages]
+
+        dates = _view_dates
+        if len(dates) > VIEW_DATES_CACHE_SIZE:
+            dates.clear()
+        view_dates = []
+        for message in messages:
+            day = message.timestamp()[1] // MS_IN_DAY
+            view_date = dates.get(day)
+            if view_date is None:
+                view_date = dates[day] = EPOCH_DATE + datetime.timedelta(days=day)
+            view_dates.append(view_date)
+
+        return [
+            [record['movie_id'] for record in records],
+            [record['client_id'] for record in records],
+            view_dates,
+            [record.get('view_ts', 0) for record in records],
+        ]
@@ -1,58 +1,174 @@
-import gc
-import time
-from typing import List, Tuple
+import signal
+from typing import List, Optional
 
 from clickhouse_driver import Client
-from clickhouse_driver.errors import ServerException
-from confluent_kafka import Message
+from confluent_kafka import Consumer, KafkaException, Message, TopicPartition
 from engines.click_house import get_client
 from settings.settings import Settings
-from utils import extractor, get_kafka_tasks, get_logger, loader, transformer
+from supervisor import Supervisor
+from utils import (
+    KafkaTask,
+    check_clickhouse_tables,
+    extractor,
+    get_kafka_tasks,
+    get_logger,
+    isolating_loader,
+    log_batch_stats,
+    setup_gc,
+)
 
 logger = get_logger('main')
 
 
-def etl_process() -> None:
-    """Infinity ETL process for data migration from Kafka to ClickHouse."""
+def flush(clickhouse: Client, task: KafkaTask) -> bool:
+    """Load the accumulated batch of a task to ClickHouse and commit its offsets. Returns False if the insert failed."""
+    accumulator = task.accumulator
+    try:
+        # Messages that can not be loaded are set aside, so they do not hold up the partition
+        dead_letters = isolating_loader(
+            clickhouse=clickhouse,
+            data_class=task.data_class,
+            kafka_messages=accumulator.messages,
+            columnar=task.columnar,
+        )
+        if dead_letters:
+            task.dead_letters.send(dead_letters)
+    except Exception as e:
+        # ClickHouse or the dead letter queue is unavailable: the batch is kept and loaded again
+        # after a growing pause, offsets stay uncommitted
+        delay = accumulator.postpone()
+        logger.exception(f'"{task.name}" batch is not loaded, retry in {delay:.1f} seconds: {e!r}')
+        return False
+
+    offsets = accumulator.offsets()
+    try:
+        task.consumer.commit(offsets=offsets, asynchronous=False)
+    except KafkaException as e:
+        # Rows are already in ClickHouse: after a rebalance they are read again
+        # and collapsed by ReplacingMergeTree, so the batch is not loaded twice here
+        logger.exception(f'Kafka commit error: {e}')
+    else:
+        logger.info('Set offsets to ' + ', '.join(
+            f'{offset.topic}[{offset.partition}]={offset.offset}' for offset in offsets
+        ))
+    log_batch_stats(task_name=task.name, rows=len(accumulator))
+    accumulator.clear()
+    return True
+
+
+def subscribe(clickhouse: Client, task: KafkaTask) -> None:
+    """
+    Subscribe the consumer of a task for its topics.
+    Before partitions are revoked in a rebalance the batch is flushed, so their offsets are committed
+    by this consumer and the next owner of the partitions does not load the same messages again.
+    """
+    def on_assign(consumer: Consumer, partitions: List[TopicPartition]) -> None:
+        logger.info(f'"{task.name}" assigned partitions: {format_partitions(partitions)}')
+
+    def on_revoke(consumer: Consumer, partitions: List[TopicPartition]) -> None:
+        logger.info(f'"{task.name}" revoked partitions: {format_partitions(partitions)}')
+        if len(task.accumulator) and not flush(clickhouse=clickhouse, task=task):
+            # Uncommitted messages are read again by the next owner of the partitions
+            task.accumulator.discard(partitions)
+
+    def on_lost(consumer: Consumer, partitions: List[TopicPartition]) -> None:
+        # The partitions may already belong to another consumer, so offsets can not be committed
+        logger.warning(f'"{task.name}" lost partitions: {format_partitions(partitions)}')
+        task.accumulator.discard(partitions)
+
+    logger.debug(f'"{task.name}" subscribes for topics: {task.settings.kafka.topics}')
+    task.consumer.subscribe(
+        topics=task.settings.kafka.topics, on_assign=on_assign, on_revoke=on_revoke, on_lost=on_lost,
+    )
+
+
+def format_partitions(partitions: List[TopicPartition]) -> str:
+    return ', '.join(f'{partition.topic}[{partition.partition}]' for partition in partitions) or '-'
+
+
+def etl_process(task_name: Optional[str] = None) -> None:
+    """
+    Infinity ETL process for data migration from Kafka to ClickHouse.
+    Runs all tasks or, in a worker process of the supervisor, only the given one.
+    Stops on SIGTERM or SIGINT after the accumulated batches are flushed.
+    """
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        logger.info(f'Received signal {signum}, stopping...')
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
     logger.info('Initializing the application...')
     settings = Settings()
     clickhouse: Client = get_client(settings.clickhouse)
-    kafka_consumers: List[Tuple] = get_kafka_tasks(
-        settings=settings, clickhouse=clickhouse,
-    )
+    if task_name is None:
+        check_clickhouse_tables(settings=settings, clickhouse=clickhouse)
+    kafka_tasks: List[KafkaTask] = get_kafka_tasks(settings=settings, task_name=task_name)
+    for task in kafka_tasks:
+        subscribe(clickhouse=clickhouse, task=task)
+    # Waiting for messages is shared between tasks, so a quiet topic does not hold up the others
+    poll_timeout: float = settings.poll_timeout / len(kafka_tasks)
+    setup_gc(settings.gc)
     logger.info('Starting an infinite ETL loop...')
-    while True:
-        for kafka_consumer, data_class, num_messages in kafka_consumers:
-            kafka_messages: List[Message] = extractor(
-                kafka_consumer=kafka_consumer, num_messages=num_messages,
-            )
-
-            task_data: List[tuple] = transformer(
-                data_class=data_class, kafka_messages=kafka_messages,
-            )
-
-            if kafka_messages:
-                last_kafka_message = kafka_messages[-1]
-                try:
-                    loader(
-                        clickhouse=clickhouse,
-                        query=data_class.get_insert_query(),
-                        task_data=task_data,
-                    )
-                except ServerException as e:
-                    logger.exception(f'ClickHouse error: {e}')
-                else:
-                    kafka_consumer.commit(last_kafka_message)
-                    logger.info(f'Set offset to {last_kafka_message.offset()}.')
-            else:
-                logger.debug('No new messages.')
-
-            kafka_messages.clear()
-            gc.collect()
-
-        logger.debug(f'The cycle is over, we fall asleep for {settings.cycles_delay} seconds.')
-        time.sleep(settings.cycles_delay)
+    while not stopping:
+        # A batch waiting for a retry does not hold up the other tasks, unless all of them wait
+        all_waiting = all(task.accumulator.is_waiting() for task in kafka_tasks)
+        for task in kafka_tasks:
+            accumulator = task.accumulator
+            if accumulator.free_rows:
+                if task.paused:
+                    task.consumer.resume(task.consumer.assignment())
+                    task.paused = False
+                # Returns at once while there is a backlog, otherwise waits for new messages
+                # no longer than until the batch has to be flushed by time
+                kafka_messages: List[Message] = extractor(
+                    kafka_consumer=task.consumer,
+                    num_messages=min(task.num_messages, accumulator.free_rows),
+                    timeout=min(poll_timeout, accumulator.time_left()),
+                )
+                accumulator.add(kafka_messages)
+            elif accumulator.is_waiting():
+                # The full batch waits for a retry after a failed insert. Its partitions are paused,
+                # but the consumer is still polled: that serves rebalances and keeps it in the group,
+                # which drops a consumer not polled for max.poll.interval.ms.
+                # Partitions assigned since the previous poll are paused as well.
+                task.consumer.pause(task.consumer.assignment())
+                task.paused = True
+                # Messages fetched before the pause are kept with the batch
+                accumulator.add(extractor(
+                    kafka_consumer=task.consumer,
+                    num_messages=task.num_messages,
+                    timeout=min(poll_timeout, accumulator.time_left()) if all_waiting else 0,
+                ))
+
+            if accumulator.is_ready():
+                flush(clickhouse=clickhouse, task=task)
+
+    for task in kafka_tasks:
+        if len(task.accumulator):
+            flush(clickhouse=clickhouse, task=task)
+        # Leaves the consumer group at once instead of waiting for the session timeout
+        task.consumer.close()
+    clickhouse.disconnect()
+    logger.info('Stopped.')
+
+
+def main() -> None:
+    settings = Settings()
+    if any(task.workers > 1 for task in settings.tasks):
+        logger.info('Starting the supervisor of worker processes...')
+        clickhouse: Client = get_client(settings.clickhouse)
+        check_clickhouse_tables(settings=settings, clickhouse=clickhouse)
+        # Workers open their own connections
+        clickhouse.disconnect()
+        Supervisor(settings=settings, target=etl_process).run()
+    else:
+        etl_process()
 
 
 if __name__ == '__main__':
-    etl_process()
+    main()
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, List, Type
+from typing import Any, List, Optional, Type
 
 import yaml
 from etl_tasks.abc_data_structure import TransferClass
@@ -16,6 +16,8 @@ class KafkaTaskSettings(BaseModel):
     enable_auto_commit: str
     group_id: str
     topics: List[str]
+    # Messages that can not be loaded to ClickHouse are sent here (only logged and skipped if not set)
+    dlq_topic: Optional[str] = None
 
 
 class ClickHouseTaskSettings(BaseModel):
@@ -23,9 +25,42 @@ class ClickHouseTaskSettings(BaseModel):
     table_ddl: FilePath
 
 
+class FlushSettings(BaseModel):
+    # A batch is loaded to ClickHouse when any of the limits is reached
+    max_rows: int = 100000
+    max_bytes: int = 16 * 1024 * 1024
+    max_delay_ms: int = 5000
+    # Pause before retrying a batch after a failed insert, doubled after every failure up to max_retry_delay_ms
+    retry_delay_ms: int = 5000
+    max_retry_delay_ms: int = 60000
+
+
+class SupervisorSettings(BaseModel):
+    # Pause before restarting a worker process that has exited
+    restart_delay: float = 5.0
+    # How long workers may flush their batches after SIGTERM before they are killed, seconds
+    shutdown_timeout: float = 30.0
+
+
+class GCSettings(BaseModel):
+    # Generation thresholds of the garbage collector (CPython defaults are 700, 10, 10)
+    threshold0: int = 100000
+    threshold1: int = 50
+    threshold2: int = 100
+    # Move objects created at startup to the permanent generation
+    freeze: bool = True
+    # Log allocations and GC pauses of every batch
+    instrumentation: bool = False
+
+
 class TaskSettings(BaseModel):
     task_name: str
     num_messages: int
+    # Worker processes of the task in one consumer group (more than 1 starts the supervisor)
+    workers: int = 1
+    # Transform a batch into columns and insert it with columnar=True
+    columnar: bool = True
+    flush: FlushSettings = FlushSettings()
     data_class: Type[TransferClass]
     kafka: KafkaTaskSettings
     clickhouse: ClickHouseTaskSettings
@@ -35,7 +70,10 @@ class TaskSettings(BaseModel):
 
 
 class Settings(BaseSettings):
-    cycles_delay: int
+    # Longest wait for new messages in one consume call, seconds
+    poll_timeout: float = 1.0
+    supervisor: SupervisorSettings = SupervisorSettings()
+    gc: GCSettings = GCSettings()
     clickhouse: ClickHouseSettings
     tasks: list[TaskSettings]
 
@@ -0,0 +1,76 @@
+import signal
+import time
+from multiprocessing import Process
+from typing import Callable, Dict, Optional, Tuple
+
+from settings.settings import Settings
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+WorkerKey = Tuple[str, int]
+
+
+class Supervisor:
+    """
+    Runs the configured number of worker processes for every task and restarts the ones that exit.
+
+    Workers of a task join the same consumer group, so Kafka spreads the partitions of its topics between them,
+    and each worker has its own ClickHouse connection. On SIGTERM or SIGINT workers get SIGTERM,
+    flush their batches, commit offsets and leave the group; workers that do not stop in time are killed.
+    """
+
+    def __init__(self, settings: Settings, target: Callable[[str], None]):
+        self.settings = settings
+        self.target = target
+        self.workers: Dict[WorkerKey, Process] = {}
+        self._restart_at: Dict[WorkerKey, float] = {}
+        self._stopping = False
+
+    def run(self) -> None:
+        """Start the workers and watch them until a stop signal."""
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for task in self.settings.tasks:
+            for number in range(task.workers):
+                self._start((task.task_name, number))
+
+        while not self._stopping:
+            for key, process in self.workers.items():
+                if process.is_alive() or self._stopping:
+                    continue
+                if key not in self._restart_at:
+                    delay = self.settings.supervisor.restart_delay
+                    logger.error(
+                        f'Worker "{process.name}" exited with code {process.exitcode}, restart in {delay} seconds',
+                    )
+                    self._restart_at[key] = time.monotonic() + delay
+                elif time.monotonic() >= self._restart_at[key]:
+                    self._start(key)
+            time.sleep(1)
+        self._shutdown()
+
+    def _start(self, key: WorkerKey) -> None:
+        task_name, number = key
+        process = Process(target=self.target, args=(task_name,), name=f'{task_name} #{number}', daemon=True)
+        process.start()
+        self.workers[key] = process
+        self._restart_at.pop(key, None)
+        logger.info(f'Worker "{process.name}" started with pid {process.pid}')
+
+    def _stop(self, signum: int, frame: Optional[object]) -> None:
+        logger.info(f'Received signal {signum}, stopping the workers...')
+        self._stopping = True
+
+    def _shutdown(self) -> None:
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.settings.supervisor.shutdown_timeout
+        for process in self.workers.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error(f'Worker "{process.name}" did not stop in time and is killed')
+                process.kill()
+                process.join()
+            logger.info(f'Worker "{process.name}" exited with code {process.exitcode}')
@@ -1,5 +1,7 @@
 from .logger import get_logger
-from .kafka_tasks import get_kafka_tasks
+from .kafka_tasks import KafkaTask, check_clickhouse_tables, get_kafka_tasks
 from .extractor import extractor
-from .transformer import transformer
-from .loader import loader
+from .transformer import columnar_transformer, transformer
+from .dead_letters import DeadLetter, DeadLetterQueue
+from .loader import isolating_loader, loader
+from .memory import log_batch_stats, setup_gc
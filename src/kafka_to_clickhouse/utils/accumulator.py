@@ -0,0 +1,110 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+from confluent_kafka import Message, TopicPartition
+from settings.settings import FlushSettings
+
+
+class BatchAccumulator:
+    """
+    Kafka messages of one task waiting to be loaded to ClickHouse.
+
+    The batch is flushed when it reaches max_rows messages or max_bytes of message values,
+    or when its first message has waited max_delay_ms, whichever comes first.
+    Big batches keep the number of ClickHouse parts low under light load,
+    and the size limits keep up with heavy load without waiting for the timer.
+    """
+
+    def __init__(self, settings: FlushSettings):
+        self.settings = settings
+        # The list and the offsets dict are reused by every batch instead of being allocated again
+        self.messages: List[Message] = []
+        self.size_bytes: int = 0
+        self._last_offsets: Dict[Tuple[str, int], int] = {}
+        self._first_added_at: Optional[float] = None
+        self._not_before: float = 0.0
+        self._failures: int = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def add(self, messages: List[Message]) -> None:
+        """Add consumed messages to the batch."""
+        if not messages:
+            return
+        if not self.messages:
+            self._first_added_at = time.monotonic()
+        self.messages.extend(messages)
+        last_offsets = self._last_offsets
+        size_bytes = 0
+        for message in messages:
+            size_bytes += len(message.value() or b'')
+            last_offsets[(message.topic(), message.partition())] = message.offset()
+        self.size_bytes += size_bytes
+
+    @property
+    def free_rows(self) -> int:
+        """How many messages the batch can take before it is full."""
+        if self.size_bytes >= self.settings.max_bytes:
+            return 0
+        return max(0, self.settings.max_rows - len(self.messages))
+
+    def time_left(self) -> float:
+        """Seconds until the batch has to be flushed by time (max_delay_ms for an empty batch)."""
+        max_delay = self.settings.max_delay_ms / 1000
+        if not self.messages:
+            return max_delay
+        if not self.free_rows:
+            # A full batch is flushed at once or, after a failed insert, when the retry pause ends
+            deadline = self._not_before
+        else:
+            deadline = max(self._first_added_at + max_delay, self._not_before)
+        return max(0.0, deadline - time.monotonic())
+
+    def is_ready(self) -> bool:
+        """The batch has to be flushed now."""
+        if not self.messages or time.monotonic() < self._not_before:
+            return False
+        return not self.free_rows or not self.time_left()
+
+    def is_waiting(self) -> bool:
+        """The batch is full and waits for a retry after a failed insert."""
+        return not self.free_rows and not self.is_ready()
+
+    def postpone(self) -> float:
+        """Do not flush the batch again for a while after a failed insert. Returns the pause in seconds."""
+        delay_ms = min(self.settings.max_retry_delay_ms, self.settings.retry_delay_ms * 2 ** self._failures)
+        self._failures += 1
+        self._not_before = time.monotonic() + delay_ms / 1000
+        return delay_ms / 1000
+
+    def offsets(self) -> List[TopicPartition]:
+        """Offsets to commit once the batch is loaded: the next offset of every partition in the batch."""
+        return [
+            TopicPartition(topic, partition, offset + 1)
+            for (topic, partition), offset in self._last_offsets.items()
+        ]
+
+    def discard(self, partitions: List[TopicPartition]) -> None:
+        """Drop messages of partitions the consumer no longer owns: their new owner reads them again."""
+        revoked = {(partition.topic, partition.partition) for partition in partitions}
+        kept = [message for message in self.messages if (message.topic(), message.partition()) not in revoked]
+        if len(kept) == len(self.messages):
+            return
+        if not kept:
+            self.clear()
+            return
+        # The age of the batch and the retry pause stay: the kept messages are as old as before
+        self.messages[:] = kept
+        self.size_bytes = sum(len(message.value() or b'') for message in kept)
+        for partition in revoked:
+            self._last_offsets.pop(partition, None)
+
+    def clear(self) -> None:
+        """Drop the loaded batch."""
+        self.messages.clear()
+        self.size_bytes = 0
+        self._last_offsets.clear()
+        self._first_added_at = None
+        self._not_before = 0.0
+        self._failures = 0
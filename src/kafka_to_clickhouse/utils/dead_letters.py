@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from confluent_kafka import KafkaError, KafkaException, Message, Producer
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+# Longest wait for the dead letter queue to acknowledge the messages of a batch, seconds
+DELIVERY_TIMEOUT = 30.0
+MAX_ERROR_LENGTH = 1000
+
+
+@dataclass
+class DeadLetter:
+    """A message that can not be loaded to ClickHouse and the error it caused."""
+
+    message: Message
+    error: Exception
+
+
+class DeadLetterQueue:
+    """
+    Kafka topic for messages that can not be loaded to ClickHouse.
+
+    A message is sent as is, with the error and its original position in headers, so it can be
+    inspected and replayed. Without a topic the messages are only logged and skipped.
+    """
+
+    def __init__(self, task_name: str, topic: Optional[str], producer: Optional[Producer]):
+        self.task_name = task_name
+        self.topic = topic
+        self._producer = producer
+
+    def send(self, dead_letters: List[DeadLetter]) -> None:
+        """Send the messages and wait until they are delivered. Raises KafkaException if they are not."""
+        for dead_letter in dead_letters:
+            message = dead_letter.message
+            logger.error(
+                f'"{self.task_name}" message {message.topic()}[{message.partition()}]@{message.offset()} '
+                f'is not loaded: {dead_letter.error!r}',
+            )
+        if self._producer is None:
+            logger.warning(f'"{self.task_name}" has no dead letter queue, {len(dead_letters)} messages skipped.')
+            return
+
+        failures: List[KafkaError] = []
+
+        def on_delivery(error: Optional[KafkaError], message: Message) -> None:
+            if error is not None:
+                failures.append(error)
+
+        for dead_letter in dead_letters:
+            message = dead_letter.message
+            kwargs = dict(
+                value=message.value(),
+                key=message.key(),
+                headers=[
+                    ('dlq.task', self.task_name),
+                    ('dlq.error', repr(dead_letter.error)[:MAX_ERROR_LENGTH]),
+                    ('dlq.topic', message.topic()),
+                    ('dlq.partition', str(message.partition())),
+                    ('dlq.offset', str(message.offset())),
+                ],
+                on_delivery=on_delivery,
+            )
+            try:
+                self._producer.produce(self.topic, **kwargs)
+            except BufferError:
+                # The local queue of the producer is full: wait for it to be sent and try again
+                self._producer.flush(DELIVERY_TIMEOUT)
+                self._producer.produce(self.topic, **kwargs)
+
+        not_delivered = self._producer.flush(DELIVERY_TIMEOUT)
+        if failures:
+            raise KafkaException(failures[0])
+        if not_delivered:
+            raise KafkaException(f'{not_delivered} messages are not delivered to "{self.topic}"')
+        logger.info(f'"{self.task_name}" sent {len(dead_letters)} messages to "{self.topic}".')
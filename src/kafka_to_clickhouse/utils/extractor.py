@@ -6,11 +6,23 @@ from utils import get_logger
 logger = get_logger(__name__)
 
 
-def extractor(kafka_consumer: Consumer, num_messages: int) -> List[Message]:
-    """Method get data from specific Kafka's topic(s)."""
+def extractor(
+        kafka_consumer: Consumer, num_messages: int, timeout: float = 1.0,
+) -> List[Message]:
+    """
+    Method get data from specific Kafka's topic(s).
+    Waits for messages no longer than timeout seconds, returns at once if they are available.
+    """
     logger.debug(f'Trying to consume {num_messages} messages.')
     kafka_messages: List[Message] = kafka_consumer.consume(
-        num_messages=num_messages, timeout=1.0,
+        num_messages=num_messages, timeout=timeout,
     )
-    logger.debug(f'Received messages: {len(kafka_messages)}')
-    return kafka_messages
+    received: List[Message] = []
+    for kafka_message in kafka_messages:
+        if kafka_message.error():
+            # Events like the end of a partition come as messages with an error set
+            logger.warning(f'Kafka message error: {kafka_message.error()}')
+        else:
+            received.append(kafka_message)
+    logger.debug(f'Received messages: {len(received)}')
+    return received
@@ -1,16 +1,38 @@
-from typing import List, Tuple, Type
+from dataclasses import dataclass, field
+from typing import List, Optional, Type
 
 from clickhouse_driver import Client
 from confluent_kafka import Consumer, Message
 from engines.click_house import create_table, table_is_exist
-from engines.kafka import get_consumer
+from engines.kafka import get_consumer, get_producer
 from etl_tasks.abc_data_structure import TransferClass
-from settings.settings import ClickHouseTaskSettings, Settings
+from settings.settings import ClickHouseTaskSettings, Settings, TaskSettings
 from utils import get_logger
+from utils.accumulator import BatchAccumulator
+from utils.dead_letters import DeadLetterQueue
 
 logger = get_logger(__name__)
 
 
+@dataclass
+class KafkaTask:
+    """Kafka consumer of a task with its settings and the batch being accumulated."""
+
+    name: str
+    consumer: Consumer
+    data_class: Type[TransferClass]
+    num_messages: int
+    columnar: bool
+    settings: TaskSettings
+    dead_letters: DeadLetterQueue
+    accumulator: BatchAccumulator = field(init=False)
+    # Partitions of the consumer are paused while the full batch waits for a retry
+    paused: bool = field(default=False, init=False)
+
+    def __post_init__(self):
+        self.accumulator = BatchAccumulator(self.settings.flush)
+
+
 def check_clickhouse_table(
         clickhouse: Client, clickhouse_task_settings: ClickHouseTaskSettings,
 ) -> None:
@@ -33,31 +55,59 @@ def check_clickhouse_table(
         )
 
 
-def get_kafka_tasks(settings: Settings, clickhouse: Client) -> List[Tuple]:
+def check_clickhouse_tables(settings: Settings, clickhouse: Client) -> None:
     """
-    This method determine Transfer class for each task and
-    create Kafka consumers, which already subscribed for specific topics
+    This method check that tables of all tasks exist in Clickhouse else create them.
+    It is called once before the consumers are started, so worker processes do not race creating a table
 
     @param settings:
     @param clickhouse: Storage for OLAP system
-    @return: List with tuples, which include
-             Kafka's Consumer, Transfer Class & number for batch load
+    @return: None
     """
-    kafka_task_data: List[Tuple] = []
     for task in settings.tasks:
         check_clickhouse_table(
             clickhouse=clickhouse,
             clickhouse_task_settings=task.clickhouse,
         )
+
+
+def get_kafka_tasks(settings: Settings, task_name: Optional[str] = None) -> List[KafkaTask]:
+    """
+    This method determine Transfer class for each task and create Kafka consumers.
+    Consumers are subscribed for topics by the caller, which sets the rebalance callbacks
+
+    @param settings:
+    @param task_name: Create only this task (in a worker process of the supervisor)
+    @return: List with tasks, which include
+             Kafka's Consumer, Transfer Class, number for batch load, columnar flag & dead letter queue
+    @raise ValueError: No task to run: task_name is not configured or there are no tasks
+    """
+    tasks = [task for task in settings.tasks if task_name is None or task.task_name == task_name]
+    if not tasks:
+        raise ValueError(f'Task "{task_name}" is not configured' if task_name else 'No tasks are configured')
+    kafka_task_data: List[KafkaTask] = []
+    for task in tasks:
         logger.info(f'Init Kafka consumer for task "{task.task_name}"')
         kafka_task_consumer: Consumer = get_consumer(task.kafka)
         data_class: Type[TransferClass] = task.data_class
         num_messages: int = task.num_messages
+        dlq_topic: Optional[str] = task.kafka.dlq_topic
+        dead_letters = DeadLetterQueue(
+            task_name=task.task_name,
+            topic=dlq_topic,
+            producer=get_producer(task.kafka) if dlq_topic else None,
+        )
 
-        logger.debug(f'"{task.task_name}" subscribes for topics: {task.kafka.topics}')
-        kafka_task_consumer.subscribe(topics=task.kafka.topics)
         # Add task data in result List
         kafka_task_data.append(
-            tuple([kafka_task_consumer, data_class, num_messages]),
+            KafkaTask(
+                name=task.task_name,
+                consumer=kafka_task_consumer,
+                data_class=data_class,
+                num_messages=num_messages,
+                columnar=task.columnar,
+                settings=task,
+                dead_letters=dead_letters,
+            ),
         )
     return kafka_task_data
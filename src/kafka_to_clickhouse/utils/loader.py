@@ -1,12 +1,97 @@
-from typing import List
+from typing import List, Type
 
 from clickhouse_driver import Client
+from clickhouse_driver.errors import Error, ErrorCodes
+from confluent_kafka import Message
+from etl_tasks.abc_data_structure import TransferClass
+from orjson import orjson
 from utils import get_logger
+from utils.dead_letters import DeadLetter
+from utils.transformer import columnar_transformer, transformer
 
 logger = get_logger(__name__)
 
+# ClickHouse and clickhouse-driver errors caused by the inserted values rather than by the server state
+DATA_ERROR_CODES = {
+    ErrorCodes.CANNOT_PARSE_TEXT,
+    ErrorCodes.CANNOT_PARSE_ESCAPE_SEQUENCE,
+    ErrorCodes.CANNOT_PARSE_QUOTED_STRING,
+    ErrorCodes.CANNOT_PARSE_INPUT_ASSERTION_FAILED,
+    ErrorCodes.CANNOT_PARSE_DATE,
+    ErrorCodes.CANNOT_PARSE_DATETIME,
+    ErrorCodes.CANNOT_PARSE_NUMBER,
+    ErrorCodes.CANNOT_PARSE_UUID,
+    ErrorCodes.CANNOT_PARSE_DOMAIN_VALUE_FROM_STRING,
+    ErrorCodes.TYPE_MISMATCH,
+    ErrorCodes.ARGUMENT_OUT_OF_BOUND,
+    ErrorCodes.CANNOT_CONVERT_TYPE,
+    ErrorCodes.INCORRECT_DATA,
+    ErrorCodes.VALUE_IS_OUT_OF_RANGE_OF_DATA_TYPE,
+    ErrorCodes.TOO_LARGE_STRING_SIZE,
+}
 
-def loader(clickhouse: Client, query: str, task_data: List[tuple]) -> None:
-    """Load transformed Kafka messages in ClickHouse"""
-    number_inserted_rows: int = clickhouse.execute(query=query, params=task_data)
+
+def loader(
+        clickhouse: Client, query: str, task_data: List, columnar: bool = False,
+) -> None:
+    """
+    Load transformed Kafka messages in ClickHouse.
+
+    @param task_data: rows (tuples) or, if columnar, columns (lists)
+    @param columnar: task_data is a list of columns
+    """
+    number_inserted_rows: int = clickhouse.execute(
+        query=query, params=task_data, columnar=columnar,
+    )
     logger.info(f'Add {number_inserted_rows} new messages to ClickHouse.')
+
+
+def is_data_error(error: Exception) -> bool:
+    """
+    The error is caused by the messages themselves: loading them again fails the same way.
+    Errors of the connection and of the server state are worth retrying later instead.
+    """
+    if isinstance(error, Error):
+        return getattr(error, 'code', None) in DATA_ERROR_CODES
+    # Raised while a message is decoded and transformed or its values are serialised.
+    # Anything else is not known to be caused by the data, and the batch is retried.
+    return isinstance(error, (ValueError, TypeError, KeyError, orjson.JSONDecodeError))
+
+
+def isolating_loader(
+        clickhouse: Client, data_class: Type[TransferClass], kafka_messages: List[Message], columnar: bool = False,
+) -> List[DeadLetter]:
+    """
+    Transform and load Kafka messages in ClickHouse, isolating the ones that can not be loaded.
+
+    If a batch fails because of its data, its halves are loaded separately until the failing messages
+    are found one by one, so a single bad message costs about 2 * log2(batch size) inserts instead of
+    stalling the partition. Every part is transformed again from the messages: clickhouse-driver
+    converts the values of a failed insert in place.
+    Other errors are raised. The parts loaded before are then loaded again with the batch,
+    and ReplacingMergeTree collapses these duplicates.
+
+    @return: Messages that can not be loaded, with their errors
+    """
+    transform = columnar_transformer if columnar else transformer
+    dead_letters: List[DeadLetter] = []
+    parts: List[List[Message]] = [kafka_messages]
+    while parts:
+        part = parts.pop()
+        try:
+            loader(
+                clickhouse=clickhouse,
+                query=data_class.get_insert_query(),
+                task_data=transform(data_class=data_class, kafka_messages=part),
+                columnar=columnar,
+            )
+        except Exception as e:
+            if not is_data_error(e):
+                raise
+            if len(part) == 1:
+                dead_letters.append(DeadLetter(message=part[0], error=e))
+                continue
+            logger.warning(f'Failed to load {len(part)} messages, loading them by halves: {e!r}')
+            middle = len(part) // 2
+            parts += [part[middle:], part[:middle]]
+    return dead_letters
@@ -0,0 +1,78 @@
+import gc
+import sys
+import time
+from typing import List, Optional
+
+from settings.settings import GCSettings
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class GCMonitor:
+    """
+    Allocations and garbage collector pauses between two batches.
+
+    Pauses are measured by gc.callbacks, allocations by the number of memory blocks held by the interpreter:
+    under a steady load the difference between batches stays around zero.
+    """
+
+    def __init__(self):
+        self.collections: List[int] = [0, 0, 0]
+        self.pause: float = 0.0
+        self.max_pause: float = 0.0
+        self._blocks: int = sys.getallocatedblocks()
+        self._started_at: Optional[float] = None
+        gc.callbacks.append(self._callback)
+
+    def _callback(self, phase: str, info: dict) -> None:
+        if phase == 'start':
+            self._started_at = time.perf_counter()
+        elif self._started_at is not None:
+            pause = time.perf_counter() - self._started_at
+            self.pause += pause
+            self.max_pause = max(self.max_pause, pause)
+            self.collections[info['generation']] += 1
+            self._started_at = None
+
+    def report(self) -> str:
+        """Describe the collections and allocations since the previous report and start counting again."""
+        blocks = sys.getallocatedblocks()
+        report = (
+            f'allocated blocks {blocks} ({blocks - self._blocks:+}), '
+            f'gc collections by generation {self.collections}, '
+            f'gc pause {self.pause * 1000:.1f} ms (max {self.max_pause * 1000:.1f} ms)'
+        )
+        self.collections = [0, 0, 0]
+        self.pause = 0.0
+        self.max_pause = 0.0
+        self._blocks = blocks
+        return report
+
+
+_monitor: Optional[GCMonitor] = None
+
+
+def setup_gc(settings: GCSettings) -> None:
+    """
+    Tune the garbage collector for the ETL loop. Called once the consumers are created.
+
+    Objects created during startup (modules, settings, clients) are moved to the permanent generation,
+    so collections do not traverse them again. A higher threshold of the youngest generation makes
+    collections rare: a batch allocates a lot of short-lived objects, which are freed by reference counting
+    anyway, and with the default threshold of 700 a batch triggers hundreds of collections.
+    """
+    global _monitor
+    gc.collect()
+    if settings.freeze:
+        gc.freeze()
+    gc.set_threshold(settings.threshold0, settings.threshold1, settings.threshold2)
+    logger.info(f'GC thresholds: {gc.get_threshold()}, frozen objects: {gc.get_freeze_count()}')
+    if settings.instrumentation and _monitor is None:
+        _monitor = GCMonitor()
+
+
+def log_batch_stats(task_name: str, rows: int) -> None:
+    """Log allocations and GC pauses since the previous batch if instrumentation is enabled."""
+    if _monitor is not None:
+        logger.info(f'"{task_name}" batch of {rows} rows: {_monitor.report()}')
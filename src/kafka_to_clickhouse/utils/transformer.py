@@ -16,3 +16,13 @@ def transformer(
         data_class.create_from_message(kafka_message).get_tuple()
         for kafka_message in kafka_messages
     ]
+
+
+def columnar_transformer(
+        data_class: Type[TransferClass], kafka_messages: List[Message],
+) -> List[list]:
+    """Transform kafka messages into columns for a columnar insert."""
+    logger.info(f'Transformed kafka data into columns: {len(kafka_messages)} messages')
+    if not kafka_messages:
+        return []
+    return data_class.get_columns(kafka_messages)
@@ -0,0 +1,360 @@
+import asyncio
+import json
+import re
+import shlex
+import time
+from functools import partial
+from typing import Callable, Optional
+
+import asyncpg
+import backoff
+import elasticsearch
+import metrics
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan, async_streaming_bulk
+from log_utils import get_logger
+from nested_updates import report_update
+from pg_utils import DBItem
+from pipeline import END, Chunk, Watermark
+from redis_utils import CacheInvalidationPublisher
+from settings.settings import ETLTask, NestedUpdate, Settings
+from state import Checkpoint, State
+
+logger = get_logger(__name__)
+
+# Параметры запросов psycopg2: %(name)s и %s.
+QUERY_PARAM = re.compile(r'%\((\w+)\)s|%s')
+# Ошибки, после которых проход задачи повторяется с паузой.
+RETRY_ERRORS = (OSError, asyncpg.PostgresConnectionError, elasticsearch.exceptions.ConnectionError)
+
+
+def backoff_hdlr(details):
+    logger.error(
+        'Взяли паузу {wait:0.1f} секунд после {tries} попыток '
+        'вызова функции {target} с аргументами {args} и позиционными аргументами '
+        '{kwargs}'.format(**details),
+    )
+    metrics.count_backoff(details)
+
+
+def to_asyncpg_query(query: str) -> tuple[str, list[str]]:
+    """
+    Переводит запрос с параметрами psycopg2 (%(name)s, %s) в запрос asyncpg ($1, $2, ...),
+    чтобы асинхронный режим использовал те же файлы запросов задач.
+
+    Returns:
+        Запрос и имена параметров в порядке номеров (у параметра %s имя - пустая строка).
+    """
+    names = []
+
+    def replace(match: re.Match) -> str:
+        name = match.group(1) or ''
+        if name not in names:
+            names.append(name)
+        return f'${names.index(name) + 1}'
+
+    return QUERY_PARAM.sub(replace, query), names
+
+
+def get_server_settings(options: str) -> dict[str, str]:
+    """Переводит параметры подключения libpq вида "-c search_path=content" в server_settings asyncpg."""
+    tokens = shlex.split(options)
+    return dict(value.split('=', 1) for flag, value in zip(tokens, tokens[1:]) if flag == '-c')
+
+
+async def init_connection(connection: asyncpg.Connection) -> None:
+    # Как и psycopg2: json разбирается в объекты Python, uuid передается строкой.
+    for type_name in ('json', 'jsonb'):
+        await connection.set_type_codec(
+            type_name, encoder=json.dumps, decoder=json.loads, schema='pg_catalog',
+        )
+    await connection.set_type_codec(
+        'uuid', encoder=str, decoder=str, schema='pg_catalog', format='text',
+    )
+
+
+@backoff.on_exception(backoff.expo, RETRY_ERRORS, on_backoff=backoff_hdlr)
+async def create_pool(settings: Settings) -> asyncpg.Pool:
+    """Создает пул подключений к PostgreSQL на все задачи ETL."""
+    dsn = settings.postgress_dsn
+    # Каждой задаче: извлечение, обогащение и частичные обновления.
+    max_size = sum(task.enrich_workers + 2 for task in settings.etl_tasks)
+    return await asyncpg.create_pool(
+        host=dsn.host,
+        port=dsn.port,
+        database=dsn.dbname,
+        user=dsn.user,
+        password=dsn.password,
+        server_settings=get_server_settings(dsn.options),
+        init=init_connection,
+        min_size=1,
+        max_size=max_size,
+    )
+
+
+class AsyncETLPipeline:
+    """
+    Асинхронный конвейер переноса данных одной задачи ETL.
+
+    Повторяет ETLPipeline на корутинах: извлечение (серверный курсор) -> обогащение
+    (enrich_workers корутин) -> загрузка (load_workers корутин), связанные очередями из queue_size пачек.
+    Подключения к Postgres берутся из общего для всех задач пула.
+    """
+
+    def __init__(
+        self,
+        etl_task: ETLTask,
+        pool: asyncpg.Pool,
+        es: AsyncElasticsearch,
+        cache_invalidation: Optional[CacheInvalidationPublisher] = None,
+    ):
+        self.etl_task = etl_task
+        self.pool = pool
+        self.es = es
+        self.cache_invalidation = cache_invalidation
+        self.failed = False
+
+    async def run(self, checkpoint: Checkpoint, on_advance: Callable[[Checkpoint], None]) -> Checkpoint:
+        """
+        Переносит записи, измененные после отметки.
+
+        Returns:
+            Отметку, до которой данные загружены.
+        """
+        task = self.etl_task
+        watermark = Watermark(checkpoint, on_advance)
+        enrich_queue: asyncio.Queue = asyncio.Queue(maxsize=task.queue_size)
+        load_queue: asyncio.Queue = asyncio.Queue(maxsize=task.queue_size)
+        enrichers_left = [task.enrich_workers]
+        workers = [
+            asyncio.create_task(self._extract(checkpoint, enrich_queue)),
+            *[
+                asyncio.create_task(self._enrich(enrich_queue, load_queue, enrichers_left))
+                for _ in range(task.enrich_workers)
+            ],
+            *[asyncio.create_task(self._load(load_queue, watermark)) for _ in range(task.load_workers)],
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            # Остальные корутины иначе навсегда остались бы ждать в очередях.
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        self.failed = watermark.failed
+        return watermark.value
+
+    async def _extract(self, checkpoint: Checkpoint, enrich_queue: asyncio.Queue) -> None:
+        query, names = to_asyncpg_query(self.etl_task.pg.queries.extract.read_text())
+        params = {'updated_at': checkpoint.updated_at, 'id': checkpoint.id}
+        index = self.etl_task.es.index
+        chunk_size = self.etl_task.chunk_size
+        seq, data = 0, []
+        async with self.pool.acquire() as connection, connection.transaction(readonly=True):
+            cursor = connection.cursor(query, *[params[name] for name in names], prefetch=self.etl_task.pg.itersize)
+            started = time.monotonic()
+            async for record in cursor:
+                data.append(DBItem(record[0], record[1]))
+                if len(data) == chunk_size:
+                    metrics.observe_stage(index, 'extract', time.monotonic() - started, len(data))
+                    await enrich_queue.put(Chunk(seq=seq, items=data))
+                    seq, data = seq + 1, []
+                    started = time.monotonic()
+        if data:
+            metrics.observe_stage(index, 'extract', time.monotonic() - started, len(data))
+            await enrich_queue.put(Chunk(seq=seq, items=data))
+        logger.info(f'Извлечено записей для "{index}": {seq * chunk_size + len(data)}.')
+        for _ in range(self.etl_task.enrich_workers):
+            await enrich_queue.put(END)
+
+    async def _enrich(self, enrich_queue: asyncio.Queue, load_queue: asyncio.Queue, enrichers_left: list) -> None:
+        query, _ = to_asyncpg_query(self.etl_task.pg.queries.enrich.read_text())
+        data_class = self.etl_task.data_class
+        index = self.etl_task.es.index
+        while (chunk := await enrich_queue.get()) is not END:
+            started = time.monotonic()
+            records = await self.pool.fetch(query, [item.id for item in chunk.items])
+            metrics.observe_stage(index, 'enrich', time.monotonic() - started, len(chunk.items))
+            with metrics.stage_timer(index, 'transform', len(records)):
+                chunk.documents = [data_class.create_from_sql_data(dict(record)).to_es() for record in records]
+            await load_queue.put(chunk)
+        # Загрузчики получают метку конца, когда закончил работу последний обогатитель.
+        enrichers_left[0] -= 1
+        if not enrichers_left[0]:
+            for _ in range(self.etl_task.load_workers):
+                await load_queue.put(END)
+
+    async def _load(self, load_queue: asyncio.Queue, watermark: Watermark) -> None:
+        index = self.etl_task.es.index
+        while (chunk := await load_queue.get()) is not END:
+            started = time.monotonic()
+            success, failed_ids = 0, set()
+            async for ok, item in async_streaming_bulk(
+                self.es, chunk.documents, index=index, raise_on_error=False, max_retries=3,
+            ):
+                result = next(iter(item.values()))
+                if ok:
+                    success += 1
+                else:
+                    failed_ids.add(result.get('_id'))
+                    logger.error(result)
+            metrics.observe_stage(index, 'bulk', time.monotonic() - started, len(chunk.documents))
+            metrics.ES_ERRORS.labels(index).inc(len(failed_ids))
+            if failed_ids:
+                logger.error(
+                    f'При загрузке записей в ElasticSearch возникли ошибки: '
+                    f'загружено {success}, с ошибками {len(failed_ids)}.',
+                )
+            else:
+                logger.info(f'Успешно загружено записей в ElasticSearch: {success}')
+            if self.cache_invalidation:
+                # Иначе API успело бы до обновления индекса снова закешировать старые документы.
+                await self.es.indices.refresh(index=index)
+                loaded_ids = [document['_id'] for document in chunk.documents if document['_id'] not in failed_ids]
+                await asyncio.to_thread(self.cache_invalidation.publish, index, loaded_ids)
+            watermark.complete(chunk, success=not failed_ids)
+
+
+class AsyncNestedUpdater:
+    """Асинхронный вариант NestedUpdater: частичное обновление документов при изменении связанных строк."""
+
+    def __init__(
+        self,
+        etl_task: ETLTask,
+        nested_update: NestedUpdate,
+        pool: asyncpg.Pool,
+        es: AsyncElasticsearch,
+        cache_invalidation: Optional[CacheInvalidationPublisher] = None,
+    ):
+        self.etl_task = etl_task
+        self.nested_update = nested_update
+        self.pool = pool
+        self.es = es
+        self.cache_invalidation = cache_invalidation
+        self.state_key = f'{etl_task.pg.table}.{nested_update.table}'
+
+    async def run(self, checkpoint: Checkpoint, on_advance: Callable[[Checkpoint], None]) -> Checkpoint:
+        """Обновляет документы по строкам, измененным после отметки, и возвращает новую отметку."""
+        query, names = to_asyncpg_query(self.nested_update.queries.extract.read_text())
+        params = {'updated_at': checkpoint.updated_at, 'id': checkpoint.id}
+        records = await self.pool.fetch(query, *[params[name] for name in names])
+        items = [DBItem(record[0], record[1]) for record in records]
+        chunk_size = self.etl_task.chunk_size
+        for start in range(0, len(items), chunk_size):
+            data_chunk = items[start:start + chunk_size]
+            if not await self._update(data_chunk):
+                break
+            checkpoint = max(checkpoint, max(Checkpoint(item.updated_at, item.id) for item in data_chunk))
+            on_advance(checkpoint)
+        return checkpoint
+
+    async def _update(self, data_chunk: list[DBItem]) -> bool:
+        index = self.etl_task.es.index
+        data_class = self.nested_update.data_class
+        query, _ = to_asyncpg_query(self.nested_update.queries.enrich.read_text())
+        records = await self.pool.fetch(query, [item.id for item in data_chunk])
+        updates = [data_class.create_from_sql_data(dict(record)) for record in records]
+        if not updates:
+            return True
+        body = data_class.to_es_update(updates)
+        document_ids = []
+        if self.cache_invalidation:
+            document_ids = [
+                hit['_id'] async for hit in async_scan(
+                    self.es, index=index, query={'query': body['query'], '_source': False},
+                )
+            ]
+        result = await self.es.update_by_query(
+            index=index, body=body, conflicts='proceed', refresh=True, request_timeout=600,
+        )
+        if not report_update(index, self.nested_update, len(updates), result):
+            return False
+        if self.cache_invalidation:
+            await asyncio.to_thread(self.cache_invalidation.publish, index, document_ids)
+        return True
+
+
+class AsyncETLRunner:
+    """
+    Асинхронный режим ETL: все задачи из settings.yaml выполняются одновременно в одном процессе.
+
+    Синхронному режиму для этого нужны потоки на каждую стадию каждой задачи; здесь ожидание
+    Postgres и Elasticsearch не блокирует процесс, а подключения берутся из общих пулов
+    (asyncpg и AsyncElasticsearch).
+    """
+
+    def __init__(
+        self, settings: Settings, state: State, cache_invalidation: Optional[CacheInvalidationPublisher] = None,
+    ):
+        self.settings = settings
+        self.state = state
+        self.cache_invalidation = cache_invalidation
+
+    def run(self) -> None:
+        """Запускает бесконечный цикл ETL."""
+        asyncio.run(self._run_forever())
+
+    async def _run_forever(self) -> None:
+        pool = await create_pool(self.settings)
+        es = AsyncElasticsearch([{'host': self.settings.elastic.host, 'port': self.settings.elastic.port}])
+        try:
+            tasks = [
+                (
+                    AsyncETLPipeline(etl_task, pool, es, self.cache_invalidation),
+                    [
+                        AsyncNestedUpdater(etl_task, nested_update, pool, es, self.cache_invalidation)
+                        for nested_update in etl_task.nested_updates
+                    ],
+                )
+                for etl_task in self.settings.etl_tasks
+            ]
+            while True:
+                await self._run_tasks(tasks)
+                logger.info(f'Цикл окончен, засыпаем на {self.settings.cycles_delay} секунд.')
+                await asyncio.sleep(self.settings.cycles_delay)
+        finally:
+            await es.close()
+            await pool.close()
+
+    async def _run_tasks(self, tasks: list[tuple[AsyncETLPipeline, list[AsyncNestedUpdater]]]) -> None:
+        """
+        Выполняет проход по всем задачам одновременно.
+        Если одна задача упала, остальные отменяются и дожидаются отмены:
+        иначе пул и клиент Elasticsearch закрылись бы, пока они еще ими пользуются.
+        """
+        runs = [asyncio.create_task(self._run_task(pipeline, updaters)) for pipeline, updaters in tasks]
+        try:
+            await asyncio.gather(*runs)
+        except BaseException:
+            for run in runs:
+                run.cancel()
+            await asyncio.gather(*runs, return_exceptions=True)
+            raise
+
+    def _save_checkpoint(self, etl_task: ETLTask, checkpoint: Checkpoint) -> None:
+        self.state.set_checkpoint(etl_task.pg.table, checkpoint)
+        metrics.set_watermark(etl_task.es.index, checkpoint.updated_at)
+
+    @backoff.on_exception(backoff.expo, RETRY_ERRORS, on_backoff=backoff_hdlr)
+    async def _run_task(self, pipeline: AsyncETLPipeline, updaters: list[AsyncNestedUpdater]) -> None:
+        etl_task = pipeline.etl_task
+        if not await pipeline.es.indices.exists(index=etl_task.es.index):
+            await pipeline.es.indices.create(
+                index=etl_task.es.index,
+                mappings=json.load(etl_task.es.mapping.open()),
+                settings=json.load(etl_task.es.settings.open()),
+                ignore=400,  # Игнорирование кода 400 - Индекс уже существует
+            )
+        checkpoint = self.state.get_checkpoint(etl_task.pg.table)
+        for updater in updaters:
+            if self.state.get_state(updater.state_key) is None:
+                # Отметка задачи берется до прохода: он не пересобирает фильмы при изменении персон и жанров.
+                self.state.set_checkpoint(updater.state_key, checkpoint)
+        await pipeline.run(checkpoint, partial(self._save_checkpoint, etl_task))
+
+        for updater in updaters:
+            checkpoint = self.state.get_checkpoint(updater.state_key)
+            await updater.run(
+                checkpoint, lambda value, key=updater.state_key: self.state.set_checkpoint(key, value),
+            )
@@ -1,14 +1,22 @@
 import json
+import threading
+import time
+from typing import Iterator
 
 import backoff
 import elasticsearch
+import metrics
 from elasticsearch import Elasticsearch, helpers
 from log_utils import get_logger
-from settings.settings import get_settings
+from settings.settings import Bulk, get_settings
 
 settings = get_settings()
 logger = get_logger(__name__)
 
+# Объем документов оценивается по каждому такому по счету документу: сериализовать все только ради
+# измерения - двойная работа, клиент все равно сериализует их при отправке.
+DOCUMENT_SAMPLE_RATE = 16
+
 
 def backoff_hdlr(details):
     logger.error(
@@ -16,6 +24,7 @@ def backoff_hdlr(details):
         'вызова функции {target} с аргументами {args} и позиционными аргументами '
         '{kwargs}'.format(**details),
     )
+    metrics.count_backoff(details)
 
 
 @backoff.on_exception(
@@ -36,6 +45,126 @@ def get_connection() -> Elasticsearch:
         raise e
 
 
+class AdaptiveBulkLoader:
+    """
+    Загрузка документов запросами _bulk заданного объема в байтах.
+
+    Объем запроса подстраивается под кластер: уменьшается вдвое, если запрос выполнялся дольше
+    target_latency или кластер отклонил документы (429), и плавно растет, пока запросы быстрые.
+    Повторно отправляются только отклоненные документы, а если кластер отклонил запрос целиком -
+    весь запрос. Документы с другими ошибками (например, несоответствие схеме) не повторяются
+    и возвращаются вызывающему.
+    """
+
+    def __init__(self, es: Elasticsearch, bulk_settings: Bulk):
+        self._es = es
+        self.settings = bulk_settings
+        self.batch_bytes = bulk_settings.initial_bytes
+        self._avg_document_bytes = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def batch_size_hint(self) -> int:
+        """Примерное количество документов в запросе текущего объема."""
+        if not self._avg_document_bytes:
+            return 0
+        return max(1, int(self.batch_bytes / self._avg_document_bytes))
+
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def load(self, documents: list[dict], es_index: str) -> tuple[int, list[dict]]:
+        """Загружает документы и возвращает количество загруженных и ошибки по незагруженным."""
+        success, errors = 0, []
+        pending = documents
+        for attempt in range(self.settings.max_retries + 1):
+            rejected = []
+            for batch, batch_bytes in self._split(pending):
+                metrics.BULK_BYTES.labels(es_index).inc(batch_bytes)
+                batch_success, batch_rejected, batch_errors = self._send(batch, es_index)
+                success += batch_success
+                rejected += batch_rejected
+                errors += batch_errors
+            if not rejected:
+                break
+            if attempt == self.settings.max_retries:
+                errors += [{'_id': doc['_id'], 'status': 429, 'error': 'rejected'} for doc in rejected]
+                break
+            delay = min(self.settings.max_backoff, self.settings.initial_backoff * 2 ** attempt)
+            logger.warning(
+                f'Кластер отклонил {len(rejected)} документов, повтор через {delay:0.1f} секунд.',
+            )
+            time.sleep(delay)
+            pending = rejected
+        return success, errors
+
+    def _split(self, documents: list[dict]) -> Iterator[tuple[list[dict], int]]:
+        """
+        Делит документы на запросы объемом не больше текущего batch_bytes и возвращает их с объемом.
+        Объем оценивается по среднему объему документа, который уточняется по выборке документов.
+        """
+        serializer = self._es.transport.serializer
+        batch, batch_bytes = [], 0.0
+        for number, document in enumerate(documents):
+            if not self._avg_document_bytes:
+                self._avg_document_bytes = len(serializer.dumps(document).encode())
+            elif not number % DOCUMENT_SAMPLE_RATE:
+                document_bytes = len(serializer.dumps(document).encode())
+                self._avg_document_bytes += (document_bytes - self._avg_document_bytes) * 0.1
+            if batch and batch_bytes + self._avg_document_bytes > self.batch_bytes:
+                yield batch, int(batch_bytes)
+                batch, batch_bytes = [], 0.0
+            batch.append(document)
+            batch_bytes += self._avg_document_bytes
+        if batch:
+            yield batch, int(batch_bytes)
+
+    def _send(self, batch: list[dict], es_index: str) -> tuple[int, list[dict], list[dict]]:
+        """Отправляет один запрос _bulk и подстраивает объем следующих запросов по его результату."""
+        by_id = {document['_id']: document for document in batch}
+        success, rejected, errors = 0, [], []
+        answered = set()
+        started = time.monotonic()
+        try:
+            for ok, item in helpers.streaming_bulk(
+                self._es,
+                batch,
+                index=es_index,
+                chunk_size=len(batch),
+                max_chunk_bytes=self.settings.max_bytes * 2,
+                raise_on_error=False,
+                max_retries=0,
+            ):
+                result = next(iter(item.values()))
+                answered.add(result['_id'])
+                if ok:
+                    success += 1
+                elif result.get('status') == 429:
+                    rejected.append(by_id[result['_id']])
+                else:
+                    errors.append(
+                        {'_id': result.get('_id'), 'status': result.get('status'), 'error': result.get('error')},
+                    )
+        except elasticsearch.exceptions.TransportError as e:
+            if e.status_code != 429:
+                raise
+            # Кластер отклонил запрос целиком: документы без ответа повторяются вместе с отклоненными.
+            rejected += [document for pk, document in by_id.items() if pk not in answered]
+        latency = time.monotonic() - started
+        metrics.ES_REJECTIONS.labels(es_index).inc(len(rejected))
+        metrics.ES_ERRORS.labels(es_index).inc(len(errors))
+        self._adapt(latency, overloaded=bool(rejected))
+        return success, rejected, errors
+
+    def _adapt(self, latency: float, overloaded: bool) -> None:
+        with self._lock:
+            if overloaded or latency > self.settings.target_latency:
+                self.batch_bytes = max(self.settings.min_bytes, self.batch_bytes // 2)
+                logger.info(f'Объем запроса _bulk уменьшен до {self.batch_bytes} байт.')
+            elif latency < self.settings.target_latency / 2:
+                self.batch_bytes = min(self.settings.max_bytes, int(self.batch_bytes * 1.25))
+
+
 class ES:
     """
     Вспомогательный класс для работы с Elasticsearch.
@@ -43,6 +172,9 @@ class ES:
 
     def __init__(self):
         self._es = get_connection()
+        self._bulk_loader = None
+        if settings.elastic.bulk:
+            self._bulk_loader = AdaptiveBulkLoader(self._es, settings.elastic.bulk)
 
     @backoff.on_exception(
         backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
@@ -69,12 +201,108 @@ class ES:
         )
         return result
 
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def put_index_settings(self, index_name: str, index_settings: dict) -> None:
+        """Изменяет динамические настройки индекса."""
+        self._es.indices.put_settings(index=index_name, body={'index': index_settings})
+
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def optimize_index(self, index_name: str) -> None:
+        """Делает загруженные документы видимыми и сливает сегменты индекса в один."""
+        self._es.indices.refresh(index=index_name)
+        self._es.indices.forcemerge(index=index_name, max_num_segments=1, request_timeout=3600)
+
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def refresh_index(self, index_name: str) -> None:
+        """Делает загруженные документы видимыми для поиска."""
+        self._es.indices.refresh(index=index_name)
+
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def wait_for_index(self, index_name: str) -> None:
+        """Ждет, пока все первичные шарды индекса будут размещены."""
+        self._es.cluster.health(index=index_name, wait_for_status='yellow', request_timeout=600)
+
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def switch_alias(self, alias: str, index_name: str) -> list[str]:
+        """
+        Атомарно переключает псевдоним на индекс и возвращает индексы, на которые он указывал.
+        Если вместо псевдонима существует индекс с таким именем, он удаляется в той же операции.
+        """
+        actions = [{'add': {'index': index_name, 'alias': alias}}]
+        if self._es.indices.exists_alias(name=alias):
+            old_indices = list(self._es.indices.get_alias(name=alias))
+            actions += [{'remove': {'index': old, 'alias': alias}} for old in old_indices]
+        elif self._es.indices.exists(index=alias):
+            old_indices = []
+            actions.append({'remove_index': {'index': alias}})
+        else:
+            old_indices = []
+        self._es.indices.update_aliases(body={'actions': actions})
+        logger.info(f'Псевдоним "{alias}" переключен на индекс "{index_name}".')
+        return old_indices
+
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def delete_index(self, index_name: str) -> None:
+        """Удаляет индекс."""
+        self._es.indices.delete(index=index_name, ignore=404)
+        logger.info(f'Индекс "{index_name}" удален.')
+
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def search_ids(self, index_name: str, query: dict) -> list[str]:
+        """Возвращает id всех документов, подходящих под запрос."""
+        hits = helpers.scan(self._es, index=index_name, query={'query': query, '_source': False})
+        return [hit['_id'] for hit in hits]
+
+    @backoff.on_exception(
+        backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
+    )
+    def update_by_query(self, index_name: str, body: dict) -> dict:
+        """
+        Изменяет скриптом все документы, подходящие под запрос, и возвращает итог операции.
+        Документы, измененные другим запросом во время операции, пропускаются и учитываются в version_conflicts.
+        """
+        return self._es.update_by_query(
+            index=index_name, body=body, conflicts='proceed', refresh=True, request_timeout=600,
+        )
+
     @backoff.on_exception(
         backoff.expo, elasticsearch.exceptions.ConnectionError, on_backoff=backoff_hdlr,
     )
     def insert_chunk(self, chunk: list[dict], es_index: str) -> tuple[int, list]:
         return helpers.bulk(self._es, chunk, index=es_index)
 
+    @property
+    def batch_size_hint(self) -> int:
+        """Сколько документов стоит загружать за раз (0 - загружать пачки как есть)."""
+        return self._bulk_loader.batch_size_hint if self._bulk_loader else 0
+
+    def load(self, documents: list[dict], es_index: str) -> tuple[int, list[dict]]:
+        """
+        Загружает документы в индекс.
+
+        Returns:
+            Количество загруженных документов и ошибки по каждому незагруженному документу.
+        """
+        if self._bulk_loader:
+            return self._bulk_loader.load(documents, es_index)
+        success, errors = self.insert_chunk(documents, es_index)
+        metrics.ES_ERRORS.labels(es_index).inc(len(errors))
+        return success, [next(iter(error.values())) for error in errors]
+
 
 def get_es_instance() -> ES:
     return ES()
@@ -0,0 +1,3 @@
+SELECT film_work.id, film_work.updated_at
+FROM film_work
+WHERE film_work.id = ANY( %(film_work)s::uuid[] );
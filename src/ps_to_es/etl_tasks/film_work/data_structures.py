@@ -31,16 +31,9 @@ class FilmWork:
 
     @staticmethod
     def create_from_sql_data(data: dict) -> 'FilmWork':
-        genres = [
-            FilmWorkGenre(*raw_genre.split('<separator>'))
-            for raw_genre in data['genres']
-            if raw_genre
-        ]
-        persons = [
-            FilmWorkPerson(*raw_person.split('<separator>'))
-            for raw_person in data['persons']
-            if raw_person
-        ]
+        # genres и persons приходят из Postgres массивами json (json_agg) и уже разобраны psycopg2.
+        genres = [FilmWorkGenre(**genre) for genre in data['genres']]
+        persons = [FilmWorkPerson(**person) for person in data['persons']]
         return FilmWork(
             id=data['id'],
             title=data['title'],
@@ -85,3 +78,103 @@ class FilmWork:
             ],
         }
         return result
+
+
+# Вложенные поля персон фильма; рядом с каждым хранится поле <поле>_names с именами через запятую.
+PERSON_FIELDS = ('directors', 'actors', 'writers')
+
+# Переименовывает персон (params.names: uuid -> имя) во вложенных полях и пересобирает поля *_names.
+RENAME_PERSONS_SCRIPT = """
+for (String field : params.fields) {
+    def persons = ctx._source[field];
+    if (persons == null) {
+        continue;
+    }
+    List names = new ArrayList();
+    for (def person : persons) {
+        String name = params.names.get(person.uuid);
+        if (name != null) {
+            person.full_name = name;
+        }
+        names.add(person.full_name);
+    }
+    ctx._source[field + '_names'] = String.join(',', names);
+}
+"""
+
+# Переименовывает жанры (params.names: uuid -> название) во вложенном поле genres.
+RENAME_GENRES_SCRIPT = """
+for (def genre : ctx._source.genres) {
+    String name = params.names.get(genre.uuid);
+    if (name != null) {
+        genre.name = name;
+    }
+}
+"""
+
+
+@dataclass(frozen=True)
+class PersonNestedUpdate:
+    """Новое имя персоны для частичного обновления фильмов с ней."""
+
+    __slots__ = ('id', 'full_name')
+    id: str
+    full_name: str
+
+    @staticmethod
+    def create_from_sql_data(data: dict) -> 'PersonNestedUpdate':
+        return PersonNestedUpdate(id=data['id'], full_name=data['full_name'])
+
+    @staticmethod
+    def to_es_update(updates: list['PersonNestedUpdate']) -> dict:
+        """Тело запроса _update_by_query для фильмов с этими персонами."""
+        ids = [update.id for update in updates]
+        return {
+            'query': {
+                'bool': {
+                    'should': [
+                        {'nested': {'path': field, 'query': {'terms': {f'{field}.uuid': ids}}}}
+                        for field in PERSON_FIELDS
+                    ],
+                    'minimum_should_match': 1,
+                },
+            },
+            'script': {
+                'source': RENAME_PERSONS_SCRIPT,
+                'lang': 'painless',
+                'params': {
+                    'fields': list(PERSON_FIELDS),
+                    'names': {update.id: update.full_name for update in updates},
+                },
+            },
+        }
+
+
+@dataclass(frozen=True)
+class GenreNestedUpdate:
+    """Новое название жанра для частичного обновления фильмов с ним."""
+
+    __slots__ = ('id', 'name')
+    id: str
+    name: str
+
+    @staticmethod
+    def create_from_sql_data(data: dict) -> 'GenreNestedUpdate':
+        return GenreNestedUpdate(id=data['id'], name=data['name'])
+
+    @staticmethod
+    def to_es_update(updates: list['GenreNestedUpdate']) -> dict:
+        """Тело запроса _update_by_query для фильмов с этими жанрами."""
+        return {
+            'query': {
+                'nested': {
+                    'path': 'genres',
+                    'query': {'terms': {'genres.uuid': [update.id for update in updates]}},
+                },
+            },
+            'script': {
+                'source': RENAME_GENRES_SCRIPT,
+                'lang': 'painless',
+                'params': {'names': {update.id: update.name for update in updates}},
+            },
+        }
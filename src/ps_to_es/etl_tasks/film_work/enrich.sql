@@ -4,15 +4,26 @@ SELECT
     film_work.rating,
     film_work.description,
     film_work.updated_at,
-    ARRAY_AGG(DISTINCT genre.id || '<separator>' || genre.name)                                                  AS genres,
-    ARRAY_AGG(DISTINCT person.id || '<separator>' || person.full_name || '<separator>' || person_film_work.role) AS persons
+    COALESCE(
+        (
+            SELECT json_agg(json_build_object('id', genre.id, 'name', genre.name) ORDER BY genre.id)
+            FROM genre_film_work JOIN genre ON genre.id = genre_film_work.genre_id
+            WHERE genre_film_work.film_work_id = film_work.id
+        ),
+        '[]'
+    ) AS genres,
+    COALESCE(
+        (
+            SELECT json_agg(
+                json_build_object('id', person.id, 'full_name', person.full_name, 'role', person_film_work.role)
+                ORDER BY person.id, person_film_work.role
+            )
+            FROM person_film_work JOIN person ON person.id = person_film_work.person_id
+            WHERE person_film_work.film_work_id = film_work.id
+        ),
+        '[]'
+    ) AS persons
 FROM
     film_work
-    LEFT JOIN genre_film_work ON genre_film_work.film_work_id = film_work.id
-    LEFT JOIN genre ON genre.id = genre_film_work.genre_id
-    LEFT JOIN person_film_work ON person_film_work.film_work_id = film_work.id
-    LEFT JOIN person ON person.id = person_film_work.person_id
 WHERE
-    film_work.id = ANY( %s::uuid[] )
-GROUP BY
-    film_work.id;
+    film_work.id = ANY( %s::uuid[] );
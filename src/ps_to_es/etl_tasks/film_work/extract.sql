@@ -3,15 +3,17 @@ FROM
     (
         SELECT id AS film_work_id, updated_at FROM film_work
         UNION (
-            SELECT film_work_id, updated_at FROM genre JOIN genre_film_work ON genre.id = genre_id
+            SELECT film_work_id, created_at FROM genre_film_work
         )
         UNION (
-            SELECT film_work_id, updated_at FROM person JOIN person_film_work ON person.id = person_id
+            SELECT film_work_id, created_at FROM person_film_work
         )
     ) t
 WHERE
-    updated_at > %s
+    updated_at >= %(updated_at)s::timestamptz
 GROUP BY
     film_work_id
+HAVING
+    (MAX(updated_at), film_work_id) > (%(updated_at)s::timestamptz, %(id)s::uuid)
 ORDER BY
-    MAX(updated_at);
+    MAX(updated_at), film_work_id;
@@ -0,0 +1,7 @@
+SELECT
+    id,
+    name
+FROM
+    genre
+WHERE
+    genre.id = ANY( %s::uuid[] );
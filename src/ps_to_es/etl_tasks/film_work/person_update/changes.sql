@@ -0,0 +1,3 @@
+SELECT person.id, person.updated_at
+FROM person
+WHERE person.id = ANY( %(person)s::uuid[] );
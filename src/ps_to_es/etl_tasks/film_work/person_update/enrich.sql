@@ -0,0 +1,7 @@
+SELECT
+    id,
+    full_name
+FROM
+    person
+WHERE
+    person.id = ANY( %s::uuid[] );
@@ -0,0 +1,9 @@
+SELECT
+    id,
+    updated_at
+FROM
+    person
+WHERE
+    (updated_at, id) > (%(updated_at)s::timestamptz, %(id)s::uuid)
+ORDER BY
+    updated_at, id;
@@ -0,0 +1,3 @@
+SELECT genre.id, genre.updated_at
+FROM genre
+WHERE genre.id = ANY( %(genre)s::uuid[] );
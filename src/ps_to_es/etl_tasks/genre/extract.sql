@@ -4,4 +4,6 @@ SELECT
 FROM
     genre
 WHERE
-    updated_at > %s;
+    (updated_at, id) > (%(updated_at)s::timestamptz, %(id)s::uuid)
+ORDER BY
+    updated_at, id;
@@ -0,0 +1,44 @@
+-- Уведомления ETL об изменениях строк (LISTEN/NOTIFY).
+-- Сообщение: {"table": "film_work" | "genre" | "person", "id": "<uuid>"}.
+-- Изменения таблиц связей сообщаются как изменения связанных кинопроизведений и персон.
+CREATE OR REPLACE FUNCTION content.notify_etl_change() RETURNS trigger AS $$
+DECLARE
+    changed record;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME IN ('film_work', 'genre', 'person') THEN
+        PERFORM pg_notify(TG_ARGV[0], json_build_object('table', TG_TABLE_NAME, 'id', changed.id)::text);
+    ELSE
+        PERFORM pg_notify(TG_ARGV[0], json_build_object('table', 'film_work', 'id', changed.film_work_id)::text);
+        IF TG_TABLE_NAME = 'person_film_work' THEN
+            PERFORM pg_notify(TG_ARGV[0], json_build_object('table', 'person', 'id', changed.person_id)::text);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_etl_change ON content.film_work;
+CREATE TRIGGER notify_etl_change AFTER INSERT OR UPDATE OR DELETE ON content.film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change(%(channel)s);
+
+DROP TRIGGER IF EXISTS notify_etl_change ON content.genre;
+CREATE TRIGGER notify_etl_change AFTER INSERT OR UPDATE OR DELETE ON content.genre
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change(%(channel)s);
+
+DROP TRIGGER IF EXISTS notify_etl_change ON content.person;
+CREATE TRIGGER notify_etl_change AFTER INSERT OR UPDATE OR DELETE ON content.person
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change(%(channel)s);
+
+DROP TRIGGER IF EXISTS notify_etl_change ON content.genre_film_work;
+CREATE TRIGGER notify_etl_change AFTER INSERT OR UPDATE OR DELETE ON content.genre_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change(%(channel)s);
+
+DROP TRIGGER IF EXISTS notify_etl_change ON content.person_film_work;
+CREATE TRIGGER notify_etl_change AFTER INSERT OR UPDATE OR DELETE ON content.person_film_work
+    FOR EACH ROW EXECUTE FUNCTION content.notify_etl_change(%(channel)s);
@@ -0,0 +1,7 @@
+SELECT person.id, person.updated_at
+FROM person
+WHERE person.id = ANY( %(person)s::uuid[] )
+UNION
+SELECT person.id, person.updated_at
+FROM person JOIN person_film_work ON person_film_work.person_id = person.id
+WHERE person_film_work.film_work_id = ANY( %(film_work)s::uuid[] );
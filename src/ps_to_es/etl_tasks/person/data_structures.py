@@ -24,11 +24,8 @@ class Person:
 
     @staticmethod
     def create_from_sql_data(data: dict) -> 'Person':
-        film_works = [
-            PersonFilmWork(*film_work.split('<separator>'))
-            for film_work in data['film_works']
-            if film_work
-        ]
+        # film_works приходит из Postgres массивом json (json_agg) и уже разобран psycopg2.
+        film_works = [PersonFilmWork(**film_work) for film_work in data['film_works']]
         return Person(
             id=data['id'],
             full_name=data['full_name'],
@@ -7,8 +7,10 @@ FROM
         )
     ) t
 WHERE
-    updated_at > %s
+    updated_at >= %(updated_at)s::timestamptz
 GROUP BY
     person_id
+HAVING
+    (MAX(updated_at), person_id) > (%(updated_at)s::timestamptz, %(id)s::uuid)
 ORDER BY
-    MAX(updated_at);
+    MAX(updated_at), person_id;
@@ -1,5 +1,6 @@
 import logging
 import os
+import resource
 from logging.handlers import RotatingFileHandler
 from typing import Optional
 
@@ -17,3 +18,14 @@ def get_logger(logger_name: str, level: Optional[int] = logging.DEBUG) -> loggin
     logger.addHandler(handler)
 
     return logger
+
+
+def get_memory_usage() -> tuple[float, float]:
+    """Возвращает текущий и пиковый объем памяти процесса (RSS) в мегабайтах."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        current = peak
+    return current, peak
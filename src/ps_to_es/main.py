@@ -1,54 +1,157 @@
+import argparse
 import json
 import time
+from functools import partial
 
-from es_utils import get_es_instance
+import backoff
+import metrics
+import psycopg2
+from es_utils import ES, get_es_instance
 from log_utils import get_logger
-from pg_utils import PGFilmWorkEnricher, PGFilmWorkExtractor
-from settings.settings import get_settings
-from state import get_state
+from nested_updates import NestedUpdater
+from pg_utils import PGChangeListener, PGFilmWorkExtractor, backoff_hdlr
+from pipeline import ETLPipeline
+from redis_utils import get_cache_invalidation_publisher
+from reindex import FullReindex
+from settings.settings import CDC, ETLTask, get_settings
+from state import Checkpoint, State, get_state
 
 logger = get_logger('main')
 
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Перенос данных из PostgreSQL в Elasticsearch.')
+    parser.add_argument(
+        '--full-reindex',
+        nargs='*',
+        metavar='INDEX',
+        help='перестроить индексы (все или перечисленные) в новые версии и переключить на них псевдонимы',
+    )
+    parser.add_argument(
+        '--partitions', type=int, default=4, help='количество параллельных частей при полной переиндексации',
+    )
+    parser.add_argument(
+        '--cdc',
+        action='store_true',
+        help='переносить изменения по уведомлениям Postgres (LISTEN/NOTIFY), а не раз в cycles_delay секунд',
+    )
+    parser.add_argument(
+        '--asyncio',
+        action='store_true',
+        help='выполнять все задачи одновременно в одном процессе на asyncio (asyncpg и AsyncElasticsearch)',
+    )
+    return parser.parse_args()
+
+
+def save_checkpoint(state: State, etl_task: ETLTask, checkpoint: Checkpoint) -> None:
+    """Сохраняет отметку задачи и обновляет метрику ее отставания."""
+    state.set_checkpoint(etl_task.pg.table, checkpoint)
+    metrics.set_watermark(etl_task.es.index, checkpoint.updated_at)
+
+
+def run_incremental(
+    pipelines: list[ETLPipeline], updaters: list[NestedUpdater], es: ES, state: State,
+) -> None:
+    """Переносит все записи, измененные после сохраненных отметок."""
+    for pipeline in pipelines:
+        etl_task = pipeline.etl_task
+        checkpoint = state.get_checkpoint(etl_task.pg.table)
+        for updater in updaters:
+            if updater.etl_task is etl_task and state.get_state(updater.state_key) is None:
+                # До появления частичных обновлений такие изменения переносились пересборкой документов,
+                # и она учтена отметкой самой задачи - но только до этого прохода: он уже не пересобирает
+                # фильмы при изменении персон и жанров, поэтому отметка берется до него.
+                state.set_checkpoint(updater.state_key, checkpoint)
+        if not es.is_index_exist(etl_task.es.index):
+            index_mapping = json.load(etl_task.es.mapping.open())
+            index_settings = json.load(etl_task.es.settings.open())
+            es.create_index(etl_task.es.index, index_mapping, index_settings)
+        # Состояние сохраняется при каждом сдвиге отметки, а не в конце прохода,
+        # чтобы после перезапуска не загружать уже загруженные пачки заново.
+        if checkpoint != Checkpoint.start():
+            metrics.set_watermark(etl_task.es.index, checkpoint.updated_at)
+        pipeline.run(checkpoint, partial(save_checkpoint, state, etl_task))
+
+    for updater in updaters:
+        checkpoint = state.get_checkpoint(updater.state_key)
+        updater.run(checkpoint, partial(state.set_checkpoint, updater.state_key))
+
+
+@backoff.on_exception(backoff.expo, psycopg2.OperationalError, on_backoff=backoff_hdlr)
+def run_cdc(
+    pipelines: list[ETLPipeline], updaters: list[NestedUpdater], es: ES, state: State, cdc: CDC,
+) -> None:
+    """
+    Переносит изменения по мере их фиксации в Postgres.
+
+    Подписка на уведомления выполняется до прохода по отметке, поэтому изменения,
+    сделанные во время прохода, не теряются. Уведомления не переживают разрыв соединения,
+    поэтому при переподключении (backoff) проход по отметке повторяется. Раз в poll_interval
+    секунд проход выполняется и без переподключения - на случай уведомлений, потерянных иначе.
+    """
+    listener = PGChangeListener(cdc.channel)
+    listener.install_triggers(cdc.triggers.read_text())
+    listener.listen()
+    try:
+        while True:
+            run_incremental(pipelines, updaters, es, state)
+            poll_deadline = time.monotonic() + cdc.poll_interval
+            logger.info(f'Ожидаем изменений в канале "{cdc.channel}".')
+            while (timeout := poll_deadline - time.monotonic()) > 0:
+                changes = listener.wait_changes(timeout, cdc.debounce)
+                if not changes:
+                    continue
+                logger.info(
+                    'Получены изменения: '
+                    + ', '.join(f'{table} - {len(ids)}' for table, ids in changes.items()),
+                )
+                for pipeline in pipelines:
+                    pipeline.apply_changes(changes)
+                for updater in updaters:
+                    updater.apply_changes(changes)
+    finally:
+        listener.connection.close()
+
+
 if __name__ == '__main__':
+    args = parse_args()
     settings = get_settings()
+    if settings.metrics_port:
+        metrics.start_metrics_server(settings.metrics_port)
     state = get_state()
-    pg_extractor = PGFilmWorkExtractor()
-    pg_enricher = PGFilmWorkEnricher()
     es = get_es_instance()
 
-    while True:
+    # После переиндексации продолжаем обычный цикл: он догонит изменения, сделанные во время нее.
+    if args.full_reindex is not None:
         for etl_task in settings.etl_tasks:
-            last_updated = state.get_state(
-                etl_task.pg.table, '1000-01-01 00:00:00.000000 +0000',
-            )
-            data_chunks = pg_extractor.create_iterator(
-                query=etl_task.pg.queries.extract.read_text(),
-                last_updated=last_updated,
-                chunk_size=etl_task.chunk_size,
-            )
-            for data_chunk in data_chunks:
-                enriched_data_chunk = pg_enricher.get_enriched_data_chunk(
-                    query=etl_task.pg.queries.enrich.read_text(),
-                    data_chunk=data_chunk,
-                    data_class=etl_task.data_class,
-                )
-                es_data = [enriched_data.to_es() for enriched_data in enriched_data_chunk]
-
-                if not es.is_index_exist(etl_task.es.index):
-                    index_mapping = json.load(etl_task.es.mapping.open())
-                    index_settings = json.load(etl_task.es.settings.open())
-                    es.create_index(etl_task.es.index, index_mapping, index_settings)
-                success, errors = es.insert_chunk(es_data, etl_task.es.index)
-                if not errors:
-                    last_updated = data_chunk[-1].updated_at.strftime(
-                        '%Y-%m-%d %H:%M:%S.%f %z',
-                    )
-                    logger.info(f'Успешно загружено записей в ElasticSearch: {success}')
-                else:
-                    logger.error('При загрузке записей в ElasticSearch возникли ошибки.')
-                    for error in errors:
-                        logger.error(error)
-            state.set_state(key=etl_task.pg.table, value=last_updated)
+            if not args.full_reindex or etl_task.es.index in args.full_reindex:
+                FullReindex(etl_task, es, state, args.partitions).run()
+
+    cache_invalidation = get_cache_invalidation_publisher()
+    if args.asyncio:
+        if args.cdc:
+            raise SystemExit('Режим --cdc пока не поддерживается вместе с --asyncio.')
+        # Импорт здесь: зависимости асинхронного режима не нужны синхронному.
+        from async_runner import AsyncETLRunner
 
+        AsyncETLRunner(settings, state, cache_invalidation).run()
+
+    pg_extractor = PGFilmWorkExtractor()
+    pipelines = [
+        ETLPipeline(etl_task, pg_extractor, es, cache_invalidation) for etl_task in settings.etl_tasks
+    ]
+    updaters = [
+        NestedUpdater(etl_task, nested_update, pg_extractor, es, cache_invalidation)
+        for etl_task in settings.etl_tasks
+        for nested_update in etl_task.nested_updates
+    ]
+
+    if args.cdc:
+        if settings.cdc is None:
+            raise SystemExit('Для режима --cdc нужен блок cdc в settings.yaml.')
+        run_cdc(pipelines, updaters, es, state, settings.cdc)
+
+    while True:
+        run_incremental(pipelines, updaters, es, state)
         logger.info(f'Цикл окончен, засыпаем на {settings.cycles_delay} секунд.')
         time.sleep(settings.cycles_delay)
@@ -0,0 +1,90 @@
+import datetime
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from log_utils import get_logger
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = get_logger(__name__)
+
+# Границы гистограммы длительности стадий, секунд: от одной быстрой пачки до тяжелого запроса.
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    'ps_to_es_stage_seconds',
+    'Длительность обработки одной пачки стадией ETL (extract, enrich, transform, bulk).',
+    ['index', 'stage'],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_ROWS = Counter(
+    'ps_to_es_stage_rows',
+    'Записи, прошедшие стадию ETL. Скорость стадии - rate() этого счетчика.',
+    ['index', 'stage'],
+)
+BULK_BYTES = Counter(
+    'ps_to_es_bulk_bytes',
+    'Объем документов, отправленных в Elasticsearch запросами _bulk (в режиме elastic.bulk).',
+    ['index'],
+)
+ES_REJECTIONS = Counter(
+    'ps_to_es_es_rejections',
+    'Документы, отклоненные Elasticsearch из-за перегрузки (429), включая повторно отправленные.',
+    ['index'],
+)
+ES_ERRORS = Counter(
+    'ps_to_es_es_errors',
+    'Документы, не загруженные в Elasticsearch из-за ошибок, кроме перегрузки.',
+    ['index'],
+)
+WATERMARK_TIMESTAMP = Gauge(
+    'ps_to_es_watermark_timestamp_seconds',
+    'updated_at последней загруженной записи задачи (отметка переноса данных).',
+    ['index'],
+)
+WATERMARK_LAG = Gauge(
+    'ps_to_es_watermark_lag_seconds',
+    'Текущее время минус updated_at последней загруженной записи задачи.',
+    ['index'],
+)
+BACKOFFS = Counter(
+    'ps_to_es_backoffs',
+    'Паузы перед повторным вызовом после ошибки подключения.',
+    ['target'],
+)
+
+_watermarks: dict[str, float] = {}
+
+
+def start_metrics_server(port: int) -> None:
+    """Запускает HTTP-сервер с метриками в формате Prometheus (/metrics) в фоновом потоке."""
+    start_http_server(port)
+    logger.info(f'Метрики доступны на порту {port}.')
+
+
+def observe_stage(index: str, stage: str, seconds: float, rows: int) -> None:
+    """Учитывает обработку пачки из rows записей стадией за seconds секунд."""
+    STAGE_SECONDS.labels(index, stage).observe(seconds)
+    STAGE_ROWS.labels(index, stage).inc(rows)
+
+
+@contextmanager
+def stage_timer(index: str, stage: str, rows: int) -> Iterator[None]:
+    """Замеряет обработку пачки из rows записей стадией."""
+    started = time.monotonic()
+    yield
+    observe_stage(index, stage, time.monotonic() - started, rows)
+
+
+def set_watermark(index: str, updated_at: datetime.datetime) -> None:
+    """Запоминает отметку задачи. Отставание считается в момент сбора метрик."""
+    is_new = index not in _watermarks
+    _watermarks[index] = updated_at.timestamp()
+    if is_new:
+        WATERMARK_LAG.labels(index).set_function(lambda: time.time() - _watermarks[index])
+    WATERMARK_TIMESTAMP.labels(index).set(_watermarks[index])
+
+
+def count_backoff(details: dict) -> None:
+    """Учитывает паузу backoff (вызывается из обработчиков on_backoff)."""
+    BACKOFFS.labels(getattr(details['target'], '__qualname__', str(details['target']))).inc()
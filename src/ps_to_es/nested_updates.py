@@ -0,0 +1,111 @@
+from typing import Callable, Iterable, Optional
+
+from es_utils import ES
+from log_utils import get_logger
+from pg_utils import DBItem, PGFilmWorkEnricher, PGFilmWorkExtractor
+from redis_utils import CacheInvalidationPublisher
+from settings.settings import ETLTask, NestedUpdate
+from state import Checkpoint
+
+logger = get_logger(__name__)
+
+
+def report_update(index: str, nested_update: NestedUpdate, updates: int, result: dict) -> bool:
+    """
+    Логирует итог запроса _update_by_query по пачке изменений.
+
+    Returns:
+        True, если документы обновлены без ошибок и конфликтов и отметку можно сдвигать.
+    """
+    if result.get('failures') or result.get('version_conflicts'):
+        logger.error(
+            f'Частичное обновление "{index}" по изменениям "{nested_update.table}" '
+            f'выполнено с ошибками: обновлено {result.get("updated")}, '
+            f'конфликтов {result.get("version_conflicts")}, ошибки: {result.get("failures")}',
+        )
+        return False
+    logger.info(
+        f'Изменения "{nested_update.table}" ({updates}) '
+        f'обновили документов в "{index}": {result.get("updated")}',
+    )
+    return True
+
+
+class NestedUpdater:
+    """
+    Частичное обновление документов задачи ETL при изменении связанных строк.
+
+    Например, переименование персоны меняет во всех фильмах с ней только вложенные поля
+    actors/directors/writers и поля *_names: один запрос _update_by_query на пачку персон вместо
+    обогащения и полной перезагрузки каждого такого фильма. Отметка у каждого обновления своя
+    (ключ состояния "<таблица задачи>.<таблица обновления>") и сдвигается только после пачки,
+    обновленной без ошибок и конфликтов.
+    """
+
+    def __init__(
+        self,
+        etl_task: ETLTask,
+        nested_update: NestedUpdate,
+        extractor: PGFilmWorkExtractor,
+        es: ES,
+        cache_invalidation: Optional[CacheInvalidationPublisher] = None,
+    ):
+        self.etl_task = etl_task
+        self.nested_update = nested_update
+        self.extractor = extractor
+        self.enricher = PGFilmWorkEnricher()
+        self.es = es
+        self.cache_invalidation = cache_invalidation
+        self.state_key = f'{etl_task.pg.table}.{nested_update.table}'
+
+    def run(self, checkpoint: Checkpoint, on_advance: Callable[[Checkpoint], None]) -> Checkpoint:
+        """
+        Обновляет документы по строкам, измененным после отметки.
+
+        Returns:
+            Отметку, до которой документы обновлены.
+        """
+        data_chunks = self.extractor.create_iterator(
+            query=self.nested_update.queries.extract.read_text(),
+            checkpoint=checkpoint,
+            chunk_size=self.etl_task.chunk_size,
+            itersize=self.etl_task.pg.itersize,
+        )
+        for data_chunk in data_chunks:
+            if not self._update(data_chunk):
+                # Следующие пачки не обновляем: отметка не может перешагнуть необновленную.
+                break
+            checkpoint = max(checkpoint, max(Checkpoint(item.updated_at, item.id) for item in data_chunk))
+            on_advance(checkpoint)
+        return checkpoint
+
+    def apply_changes(self, changes: dict[str, set[str]]) -> None:
+        """Обновляет документы по изменениям строк (id по таблицам), минуя отметку."""
+        query = self.nested_update.queries.changes
+        if query is None or not changes.get(self.nested_update.table):
+            return
+        items = self.extractor.get_changed_items(query.read_text(), changes)
+        chunk_size = self.etl_task.chunk_size
+        for start in range(0, len(items), chunk_size):
+            self._update(items[start:start + chunk_size])
+
+    def _update(self, data_chunk: Iterable[DBItem]) -> bool:
+        index = self.etl_task.es.index
+        data_class = self.nested_update.data_class
+        updates = self.enricher.get_enriched_data_chunk(
+            query=self.nested_update.queries.enrich.read_text(),
+            data_chunk=data_chunk,
+            data_class=data_class,
+        )
+        if not updates:
+            return True
+        body = data_class.to_es_update(updates)
+        # Id документов нужны только для очистки кэша API: сама операция их не возвращает.
+        document_ids = self.es.search_ids(index, body['query']) if self.cache_invalidation else []
+
+        result = self.es.update_by_query(index, body)
+        if not report_update(index, self.nested_update, len(updates), result):
+            return False
+        if self.cache_invalidation:
+            self.cache_invalidation.publish(index, document_ids)
+        return True
@@ -1,19 +1,31 @@
 import datetime
+import json
+import select
+import time
+import uuid
+from collections import defaultdict
 from dataclasses import dataclass
 from typing import Iterator, Type, TypeVar
 
 import backoff
+import metrics
 import psycopg2
-from log_utils import get_logger
+from log_utils import get_logger, get_memory_usage
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from psycopg2.extensions import connection as pg_connection
 from psycopg2.extras import RealDictCursor
 from settings.settings import get_settings
+from state import Checkpoint
 
 settings = get_settings()
 logger = get_logger(__name__)
 
 DT = TypeVar('DT')
 
+# Как часто логировать ход извлечения, секунд.
+PROGRESS_LOG_INTERVAL = 10
+
 
 @dataclass(frozen=True)
 class DBItem:
@@ -28,6 +40,7 @@ def backoff_hdlr(details):
         'вызова функции {target} с аргументами {args} и позиционными аргументами '
         '{kwargs}'.format(**details),
     )
+    metrics.count_backoff(details)
 
 
 @backoff.on_exception(backoff.expo, psycopg2.DatabaseError, on_backoff=backoff_hdlr)
@@ -46,31 +59,131 @@ def get_connection() -> pg_connection:
 class PGFilmWorkExtractor:
     """
     Класс для извлечения записей из Postgres необходимых для переноса в Elasticsearch.
+
+    Записи читаются именованным (серверным) курсором: Postgres отдает их порциями по itersize строк,
+    поэтому память процесса не зависит от количества извлекаемых записей.
     """
 
     def __init__(self):
         self.connection = get_connection()
-        self.cursor = self.connection.cursor()
 
     @backoff.on_exception(backoff.expo, psycopg2.DatabaseError, on_backoff=backoff_hdlr)
     def create_iterator(
-        self, query: str, last_updated: str, chunk_size: int,
+        self, query: str, checkpoint: Checkpoint, chunk_size: int, itersize: int = 2000,
     ) -> Iterator[list[DBItem]]:
         """
-        Возвращает данные из базы по частям заданной длинны.
+        Возвращает данные из базы, следующие за отметкой, по частям заданной длинны.
 
         Yields:
             list of dataclass: Список записей таблицы.
         """
+        cursor = self.connection.cursor(name=f'extract_{uuid.uuid4().hex}')
+        cursor.itersize = itersize
+        started = last_logged = time.monotonic()
+        rows = 0
         try:
-            self.cursor.execute(query, (last_updated,))
-            while results := self.cursor.fetchmany(chunk_size):
-                data = list(DBItem(*result) for result in results)
+            cursor.execute(query, checkpoint.to_state())
+            data = []
+            for result in cursor:
+                data.append(DBItem(*result))
+                if len(data) == chunk_size:
+                    rows += len(data)
+                    yield data
+                    data = []
+                    if time.monotonic() - last_logged > PROGRESS_LOG_INTERVAL:
+                        self._log_progress(rows, started)
+                        last_logged = time.monotonic()
+            if data:
+                rows += len(data)
                 yield data
+            self._log_progress(rows, started)
 
         except (Exception, psycopg2.DatabaseError) as error:
             logger.error(f'ОШИБКА: {error}')
             raise error
+        finally:
+            cursor.close()
+            # Завершаем транзакцию серверного курсора, чтобы не удерживать снимок данных.
+            self.connection.rollback()
+
+    @backoff.on_exception(backoff.expo, psycopg2.DatabaseError, on_backoff=backoff_hdlr)
+    def get_changed_items(self, query: str, changes: dict[str, set[str]]) -> list[DBItem]:
+        """
+        Возвращает записи, затронутые изменениями строк.
+        Запрос получает списки id измененных строк в параметрах %(film_work)s, %(genre)s и %(person)s.
+        """
+        params = {table: list(changes.get(table, ())) for table in ('film_work', 'genre', 'person')}
+        with self.connection.cursor() as cursor:
+            cursor.execute(query, params)
+            items = [DBItem(*result) for result in cursor.fetchall()]
+        self.connection.rollback()
+        return items
+
+    def get_db_time(self) -> datetime.datetime:
+        """Возвращает текущее время сервера Postgres."""
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT now()')
+            db_time = cursor.fetchone()[0]
+        self.connection.rollback()
+        return db_time
+
+    @staticmethod
+    def _log_progress(rows: int, started: float) -> None:
+        elapsed = time.monotonic() - started
+        current, peak = get_memory_usage()
+        logger.info(
+            f'Извлечено записей: {rows} за {elapsed:0.1f} с ({rows / max(elapsed, 1e-6):0.0f} записей/с), '
+            f'память: {current:0.1f} МБ (пик {peak:0.1f} МБ).',
+        )
+
+
+class PGChangeListener:
+    """
+    Получение изменений строк из Postgres по мере их фиксации (LISTEN/NOTIFY).
+    Уведомления отправляют триггеры, которые устанавливает install_triggers.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.connection = get_connection()
+        self.connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+
+    def install_triggers(self, query: str) -> None:
+        """Устанавливает (или обновляет) триггеры, уведомляющие об изменениях."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(query, {'channel': self.channel})
+        logger.info(f'Триггеры уведомлений об изменениях установлены, канал "{self.channel}".')
+
+    def listen(self) -> None:
+        """Подписывается на уведомления. Изменения, зафиксированные после этого, не будут пропущены."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql.SQL('LISTEN {}').format(sql.Identifier(self.channel)))
+
+    def wait_changes(self, timeout: float, debounce: float) -> dict[str, set[str]]:
+        """
+        Ждет изменений не дольше timeout секунд и возвращает id измененных строк по таблицам.
+        После первого уведомления еще debounce секунд собирает следующие, чтобы обработать их одной пачкой.
+        """
+        changes = defaultdict(set)
+        if not self._wait(timeout):
+            return changes
+        deadline = time.monotonic() + debounce
+        while True:
+            self.connection.poll()
+            while self.connection.notifies:
+                notify = self.connection.notifies.pop(0)
+                try:
+                    payload = json.loads(notify.payload)
+                    changes[payload['table']].add(payload['id'])
+                except (json.JSONDecodeError, KeyError) as e:
+                    logger.error(f'Некорректное уведомление об изменении "{notify.payload}": {e}')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._wait(remaining):
+                return changes
+
+    def _wait(self, timeout: float) -> bool:
+        readable, _, _ = select.select([self.connection], [], [], timeout)
+        return bool(readable)
 
 
 class PGFilmWorkEnricher:
@@ -0,0 +1,285 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional
+
+import metrics
+from es_utils import ES
+from log_utils import get_logger
+from pg_utils import DBItem, PGFilmWorkEnricher, PGFilmWorkExtractor
+from redis_utils import CacheInvalidationPublisher
+from settings.settings import ETLTask
+from state import Checkpoint
+
+logger = get_logger(__name__)
+
+# Как часто заблокированный на очереди поток проверяет, не остановлен ли конвейер, секунд.
+QUEUE_POLL_INTERVAL = 0.1
+# Метка конца данных в очереди.
+END = None
+
+
+class PipelineStopped(Exception):
+    """Конвейер остановлен из-за ошибки в одном из потоков."""
+
+
+@dataclass
+class Chunk:
+    """Пачка записей на пути через конвейер."""
+
+    seq: int
+    items: list[DBItem]
+    documents: Optional[list[dict]] = None
+
+
+class Watermark:
+    """
+    Отметка, до которой данные гарантированно загружены в Elasticsearch.
+
+    Пачки загружаются параллельно и завершаются в произвольном порядке, поэтому отметка
+    сдвигается только через непрерывный префикс полностью загруженных пачек.
+    После пачки, загруженной с ошибками, отметка больше не сдвигается до конца прохода:
+    ее записи будут прочитаны повторно в следующем цикле.
+    """
+
+    def __init__(self, value: Checkpoint, on_advance: Callable[[Checkpoint], None]):
+        self.value = value
+        self.on_advance = on_advance
+        self._next_seq = 0
+        self._done: dict[int, Optional[Checkpoint]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def failed(self) -> bool:
+        """Есть ли пачки, загруженные с ошибками."""
+        return any(checkpoint is None for checkpoint in self._done.values())
+
+    def complete(self, chunk: Chunk, success: bool) -> None:
+        """Отмечает пачку как обработанную."""
+        with self._lock:
+            self._done[chunk.seq] = None
+            if success:
+                self._done[chunk.seq] = max(Checkpoint(item.updated_at, item.id) for item in chunk.items)
+
+            advanced = False
+            while self._done.get(self._next_seq) is not None:
+                self.value = max(self.value, self._done.pop(self._next_seq))
+                self._next_seq += 1
+                advanced = True
+            if advanced:
+                self.on_advance(self.value)
+
+
+class ETLPipeline:
+    """
+    Конвейер переноса данных одной задачи ETL.
+
+    Стадии работают одновременно и связаны ограниченными очередями:
+    извлечение id (один поток) -> обогащение и преобразование в документы (enrich_workers потоков,
+    у каждого свое подключение к Postgres) -> загрузка в Elasticsearch (load_workers потоков).
+    Ограниченные очереди не дают быстрой стадии набрать в памяти больше queue_size пачек.
+    """
+
+    def __init__(
+        self,
+        etl_task: ETLTask,
+        extractor: PGFilmWorkExtractor,
+        es: ES,
+        cache_invalidation: Optional[CacheInvalidationPublisher] = None,
+        es_index: Optional[str] = None,
+        extract_query: Optional[str] = None,
+    ):
+        """
+        Args:
+            es_index: индекс, в который загружаются документы (по умолчанию - индекс задачи).
+            extract_query: запрос извлечения вместо запроса задачи.
+        """
+        self.etl_task = etl_task
+        self.extractor = extractor
+        self.es = es
+        self.cache_invalidation = cache_invalidation
+        self.es_index = es_index or etl_task.es.index
+        self.extract_query = extract_query
+        self.failed = False
+        self.enrichers = [PGFilmWorkEnricher() for _ in range(etl_task.enrich_workers)]
+        self._enrich_queue: queue.Queue = queue.Queue(maxsize=etl_task.queue_size)
+        self._load_queue: queue.Queue = queue.Queue(maxsize=etl_task.queue_size)
+        self._stopped = threading.Event()
+
+    def apply_changes(self, changes: dict[str, set[str]]) -> None:
+        """Переносит записи, затронутые изменениями строк (id по таблицам), минуя отметку."""
+        query = self.etl_task.pg.queries.changes
+        if query is None:
+            return
+        items = self.extractor.get_changed_items(query.read_text(), changes)
+        if not items:
+            return
+        chunk_size = self.etl_task.chunk_size
+        chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+        logger.info(f'Изменения затронули записей: {len(items)}.')
+        self.run(Checkpoint.start(), lambda checkpoint: None, chunks)
+
+    def run(
+        self,
+        checkpoint: Checkpoint,
+        on_advance: Callable[[Checkpoint], None],
+        data_chunks: Optional[Iterable[list[DBItem]]] = None,
+    ) -> Checkpoint:
+        """
+        Переносит записи, измененные после отметки.
+
+        Args:
+            checkpoint: отметка, с которой начинается проход.
+            on_advance: вызывается с новым значением отметки при каждом ее сдвиге.
+            data_chunks: готовые пачки записей вместо извлечения по отметке.
+
+        Returns:
+            Отметку, до которой данные загружены.
+        """
+        watermark = Watermark(checkpoint, on_advance)
+        task = self.etl_task
+        self._enrich_queue = queue.Queue(maxsize=task.queue_size)
+        self._load_queue = queue.Queue(maxsize=task.queue_size)
+        self._stopped.clear()
+        with ThreadPoolExecutor(
+            max_workers=2 + task.enrich_workers + task.load_workers,
+            thread_name_prefix=f'etl-{self.es_index}',
+        ) as executor:
+            futures = [executor.submit(self._extract, checkpoint, data_chunks)]
+            futures += [executor.submit(self._enrich, enricher) for enricher in self.enrichers]
+            load_futures = [executor.submit(self._load, watermark) for _ in range(task.load_workers)]
+            # Загрузчики получают метку конца, когда все обогатители закончили работу.
+            executor.submit(self._finish_enrich, futures[1:])
+
+            for future in futures + load_futures:
+                try:
+                    future.result()
+                except PipelineStopped:
+                    pass
+                except Exception:
+                    self._stopped.set()
+                    raise
+        self.failed = watermark.failed
+        return watermark.value
+
+    def _extract(self, checkpoint: Checkpoint, data_chunks: Optional[Iterable[list[DBItem]]]) -> None:
+        try:
+            if data_chunks is None:
+                data_chunks = self.extractor.create_iterator(
+                    query=self.extract_query or self.etl_task.pg.queries.extract.read_text(),
+                    checkpoint=checkpoint,
+                    chunk_size=self.etl_task.chunk_size,
+                    itersize=self.etl_task.pg.itersize,
+                )
+            started = time.monotonic()
+            for seq, data_chunk in enumerate(data_chunks):
+                metrics.observe_stage(self.es_index, 'extract', time.monotonic() - started, len(data_chunk))
+                self._put(self._enrich_queue, Chunk(seq=seq, items=data_chunk))
+                started = time.monotonic()
+        except PipelineStopped:
+            raise
+        except Exception:
+            self._stopped.set()
+            raise
+        finally:
+            if not self._stopped.is_set():
+                for _ in range(self.etl_task.enrich_workers):
+                    self._put(self._enrich_queue, END)
+
+    def _enrich(self, enricher: PGFilmWorkEnricher) -> None:
+        query = self.etl_task.pg.queries.enrich.read_text()
+        try:
+            while (chunk := self._get(self._enrich_queue)) is not END:
+                with metrics.stage_timer(self.es_index, 'enrich', len(chunk.items)):
+                    enriched_data_chunk = enricher.get_enriched_data_chunk(
+                        query=query, data_chunk=chunk.items, data_class=self.etl_task.data_class,
+                    )
+                with metrics.stage_timer(self.es_index, 'transform', len(enriched_data_chunk)):
+                    chunk.documents = [enriched_data.to_es() for enriched_data in enriched_data_chunk]
+                self._put(self._load_queue, chunk)
+        except PipelineStopped:
+            raise
+        except Exception:
+            self._stopped.set()
+            raise
+
+    def _finish_enrich(self, enrich_futures: list) -> None:
+        for future in enrich_futures:
+            if future.exception() is not None:
+                return
+        for _ in range(self.etl_task.load_workers):
+            self._put(self._load_queue, END)
+
+    def _load(self, watermark: Watermark) -> None:
+        index = self.es_index
+        try:
+            finished = False
+            while not finished and (chunk := self._get(self._load_queue)) is not END:
+                chunks = [chunk]
+                finished = self._take_more(chunks)
+                documents = [document for chunk in chunks for document in chunk.documents]
+                with metrics.stage_timer(index, 'bulk', len(documents)):
+                    success, errors = self.es.load(documents, index)
+                failed_ids = {error.get('_id') for error in errors}
+                if not errors:
+                    logger.info(f'Успешно загружено записей в ElasticSearch: {success}')
+                else:
+                    logger.error(
+                        f'При загрузке записей в ElasticSearch возникли ошибки: '
+                        f'загружено {success}, с ошибками {len(errors)}.',
+                    )
+                    for error in errors:
+                        logger.error(error)
+                if self.cache_invalidation:
+                    # Иначе API успело бы до обновления индекса снова закешировать старые документы.
+                    self.es.refresh_index(index)
+                    loaded_ids = [document['_id'] for document in documents]
+                    self.cache_invalidation.publish(
+                        index, [pk for pk in loaded_ids if pk not in failed_ids],
+                    )
+                for loaded_chunk in chunks:
+                    chunk_ids = {document['_id'] for document in loaded_chunk.documents}
+                    watermark.complete(loaded_chunk, success=not chunk_ids & failed_ids)
+        except PipelineStopped:
+            raise
+        except Exception:
+            self._stopped.set()
+            raise
+
+    def _take_more(self, chunks: list[Chunk]) -> bool:
+        """
+        Добавляет к загрузке уже готовые пачки, пока документов меньше, чем загрузчик ES
+        готов принять за один запрос. Возвращает True, если из очереди взята метка конца.
+        """
+        documents_count = len(chunks[0].documents)
+        while documents_count < self.es.batch_size_hint:
+            try:
+                chunk = self._load_queue.get_nowait()
+            except queue.Empty:
+                return False
+            if chunk is END:
+                return True
+            chunks.append(chunk)
+            documents_count += len(chunk.documents)
+        return False
+
+    def _put(self, target: queue.Queue, item: Any) -> None:
+        while True:
+            if self._stopped.is_set():
+                raise PipelineStopped
+            try:
+                target.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, source: queue.Queue) -> Any:
+        while True:
+            if self._stopped.is_set():
+                raise PipelineStopped
+            try:
+                return source.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                continue
@@ -0,0 +1,66 @@
+import json
+from typing import Optional
+
+import backoff
+import metrics
+import redis
+from log_utils import get_logger
+from settings.settings import get_settings
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+
+def backoff_hdlr(details):
+    logger.error(
+        'Взяли паузу {wait:0.1f} секунд после {tries} попыток '
+        'вызова функции {target} с аргументами {args} и позиционными аргументами '
+        '{kwargs}'.format(**details),
+    )
+    metrics.count_backoff(details)
+
+
+@backoff.on_exception(
+    backoff.expo, redis.exceptions.ConnectionError, on_backoff=backoff_hdlr, max_tries=5,
+)
+def get_connection() -> redis.Redis:
+    """Организует подключение к Redis."""
+    logger.debug('Подключение к Redis...')
+    connection = redis.Redis(host=settings.redis.host, port=settings.redis.port)
+    connection.ping()
+    logger.debug('Успех!')
+    return connection
+
+
+class CacheInvalidationPublisher:
+    """
+    Сообщает API об измененных документах, чтобы те сразу удалялись из кэша.
+    """
+
+    def __init__(self):
+        self._redis: Optional[redis.Redis] = None
+
+    def publish(self, index: str, ids: list[str]) -> None:
+        """
+        Публикует id загруженных в индекс документов.
+        Ошибки только логируются: загрузку в Elasticsearch они не останавливают,
+        а устаревшие записи в любом случае истекут по времени жизни кэша.
+        """
+        if not ids:
+            return
+        message = json.dumps({'index': index, 'ids': ids})
+        try:
+            if self._redis is None:
+                self._redis = get_connection()
+            receivers = self._redis.publish(settings.redis.channel, message)
+            logger.debug(f'Сообщение об изменении {len(ids)} документов получили подписчики: {receivers}')
+        except redis.exceptions.RedisError as e:
+            self._redis = None
+            logger.error(f'Не удалось опубликовать сообщение об изменении документов: {e}')
+
+
+def get_cache_invalidation_publisher() -> Optional[CacheInvalidationPublisher]:
+    """Возвращает публикатора изменений или None, если Redis не указан в настройках."""
+    if settings.redis is None:
+        return None
+    return CacheInvalidationPublisher()
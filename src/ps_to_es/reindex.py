@@ -0,0 +1,99 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from es_utils import ES
+from log_utils import get_logger
+from pg_utils import PGFilmWorkExtractor
+from pipeline import ETLPipeline
+from settings.settings import ETLTask
+from state import MIN_ID, Checkpoint, State
+
+logger = get_logger(__name__)
+
+# Настройки индекса на время загрузки: без обновления поиска и без реплик.
+BULK_LOAD_SETTINGS = {'refresh_interval': '-1', 'number_of_replicas': 0}
+# Значения, к которым возвращаются настройки, если они не заданы в index_settings.json.
+DEFAULT_INDEX_SETTINGS = {'refresh_interval': '1s', 'number_of_replicas': 1}
+
+
+def partition_query(extract_query: str, partitions: int, partition: int) -> str:
+    """
+    Оборачивает запрос извлечения так, чтобы он возвращал только записи одной из partitions частей.
+    Записи распределяются по частям по хэшу id, поэтому части примерно равны и не пересекаются.
+    """
+    return (
+        f'SELECT * FROM ({extract_query.strip().rstrip(";")}) AS extract (id, updated_at)\n'
+        f'WHERE mod(hashtext(extract.id::text) & 2147483647, {int(partitions)}) = {int(partition)}\n'
+        f'ORDER BY extract.updated_at, extract.id'
+    )
+
+
+class FullReindex:
+    """
+    Полная переиндексация задачи ETL без простоя (blue/green).
+
+    Данные загружаются в новый индекс с версией в имени, пока API читает старый через псевдоним.
+    На время загрузки у нового индекса отключены обновление поиска и реплики, а записи
+    читаются из Postgres несколькими частями параллельно. После загрузки настройки
+    восстанавливаются, сегменты сливаются, и псевдоним атомарно переключается на новый индекс.
+    """
+
+    def __init__(self, etl_task: ETLTask, es: ES, state: State, partitions: int):
+        self.etl_task = etl_task
+        self.es = es
+        self.state = state
+        self.partitions = partitions
+
+    def run(self) -> None:
+        alias = self.etl_task.es.index
+        index_name = f'{alias}_{datetime.utcnow():%Y%m%d%H%M%S}'
+        index_mapping = json.load(self.etl_task.es.mapping.open())
+        index_settings = json.load(self.etl_task.es.settings.open())
+
+        logger.info(f'Полная переиндексация "{alias}" в индекс "{index_name}", частей: {self.partitions}.')
+        self.es.create_index(index_name, index_mapping, {**index_settings, **BULK_LOAD_SETTINGS})
+
+        try:
+            # Записи, измененные во время загрузки, догонит обычный цикл ETL начиная с этого времени.
+            extractor = PGFilmWorkExtractor()
+            started_at = Checkpoint(extractor.get_db_time(), MIN_ID)
+            extract_query = self.etl_task.pg.queries.extract.read_text()
+            pipelines = [
+                ETLPipeline(
+                    self.etl_task,
+                    extractor if partition == 0 else PGFilmWorkExtractor(),
+                    self.es,
+                    es_index=index_name,
+                    extract_query=partition_query(extract_query, self.partitions, partition),
+                )
+                for partition in range(self.partitions)
+            ]
+            with ThreadPoolExecutor(max_workers=self.partitions, thread_name_prefix='reindex') as executor:
+                futures = [
+                    executor.submit(pipeline.run, Checkpoint.start(), lambda checkpoint: None)
+                    for pipeline in pipelines
+                ]
+                for future in futures:
+                    future.result()
+            if any(pipeline.failed for pipeline in pipelines):
+                raise RuntimeError(f'Переиндексация "{alias}" прервана: часть документов не загружена.')
+
+            self.es.optimize_index(index_name)
+            self.es.put_index_settings(
+                index_name,
+                {key: index_settings.get(key, default) for key, default in DEFAULT_INDEX_SETTINGS.items()},
+            )
+            self.es.wait_for_index(index_name)
+
+            old_indices = self.es.switch_alias(alias, index_name)
+        except BaseException:
+            # Недогруженный индекс без реплик и обновления поиска не должен оставаться в кластере.
+            logger.error(f'Переиндексация "{alias}" прервана, индекс "{index_name}" удаляется.')
+            self.es.delete_index(index_name)
+            raise
+
+        self.state.set_checkpoint(self.etl_task.pg.table, started_at)
+        for old_index in old_indices:
+            self.es.delete_index(old_index)
+        logger.info(f'Полная переиндексация "{alias}" завершена.')
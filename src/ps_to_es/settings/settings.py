@@ -1,10 +1,10 @@
 import os
 from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import yaml
-from pydantic import BaseSettings
+from pydantic import BaseSettings, root_validator
 from pydantic.types import FilePath
 from yaml import Loader
 
@@ -13,9 +13,30 @@ with settings_path.open('r') as f:
     yaml_settings = yaml.load(f, Loader=Loader)
 
 
+class Bulk(BaseSettings):
+    # Размер запроса _bulk в байтах: начальный и границы, в которых он подстраивается под задержку.
+    initial_bytes: int = 1024 * 1024
+    min_bytes: int = 64 * 1024
+    max_bytes: int = 10 * 1024 * 1024
+    # Задержка запроса, выше которой размер запроса уменьшается, секунд.
+    target_latency: float = 1.0
+    # Повторы документов, отклоненных кластером из-за перегрузки (429).
+    max_retries: int = 5
+    initial_backoff: float = 1.0
+    max_backoff: float = 30.0
+
+
 class Elastic(BaseSettings):
     host: str
     port: int
+    # Если не указано, каждая пачка загружается одним вызовом helpers.bulk.
+    bulk: Optional[Bulk] = None
+
+
+class Redis(BaseSettings):
+    host: str
+    port: int
+    channel: str
 
 
 class PostgressDsn(BaseSettings):
@@ -30,11 +51,32 @@ class PostgressDsn(BaseSettings):
 class Queries(BaseSettings):
     extract: FilePath
     enrich: FilePath
+    # Записи, затронутые изменениями строк (для режима --cdc).
+    changes: Optional[FilePath] = None
+
+
+class CDC(BaseSettings):
+    # Канал LISTEN/NOTIFY и триггеры, которые в него пишут.
+    channel: str
+    triggers: FilePath
+    # Сколько секунд собирать уведомления в одну пачку.
+    debounce: float = 0.2
+    # Как часто на всякий случай выполнять полный проход по отметке, секунд.
+    poll_interval: int = 3600
 
 
 class ETLTaskPG(BaseSettings):
     table: str
     queries: Queries
+    # Сколько строк серверный курсор передает из Postgres за один раз.
+    itersize: int = 2000
+
+
+class NestedUpdate(BaseSettings):
+    # Таблица, изменения строк которой частично обновляют вложенные поля документов задачи.
+    table: str
+    data_class: Any
+    queries: Queries
 
 
 class ETLTaskES(BaseSettings):
@@ -45,18 +87,36 @@ class ETLTaskES(BaseSettings):
 
 class ETLTask(BaseSettings):
     chunk_size: int
+    # Количество потоков обогащения и загрузки и размер очередей между ними (в пачках).
+    enrich_workers: int = 1
+    load_workers: int = 1
+    queue_size: int = 4
     data_class: Any
     pg: ETLTaskPG
     es: ETLTaskES
+    nested_updates: list[NestedUpdate] = []
 
 
 class Settings(BaseSettings):
     cycles_delay: int
+    # Хранилище состояния: file (state_storage.json) или redis (подключение из блока redis).
+    state_storage: str = 'file'
+    # Порт HTTP-сервера с метриками Prometheus (/metrics). Если не указан, метрики не публикуются.
+    metrics_port: Optional[int] = None
 
     elastic: Elastic
+    redis: Optional[Redis] = None
+    cdc: Optional[CDC] = None
     postgress_dsn: PostgressDsn
     etl_tasks: list[ETLTask]
 
+    @root_validator(skip_on_failure=True)
+    def check_state_storage(cls, values: dict) -> dict:
+        """Хранилищу состояния redis нужен блок redis с подключением."""
+        if values.get('state_storage') == 'redis' and values.get('redis') is None:
+            raise ValueError('Для state_storage: redis нужен блок redis с подключением.')
+        return values
+
 
 @lru_cache
 def get_settings() -> Settings:
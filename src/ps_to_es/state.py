@@ -1,13 +1,55 @@
 import abc
+import datetime
 import json
+import os
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
+import redis
 from log_utils import get_logger
+from settings.settings import get_settings
 
 storage_path = Path('state_storage.json')
+settings = get_settings()
 logger = get_logger(__name__)
 
+STATE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f %z'
+MIN_ID = '00000000-0000-0000-0000-000000000000'
+
+
+@dataclass(frozen=True, order=True)
+class Checkpoint:
+    """
+    Отметка переноса данных: последняя загруженная запись в порядке (updated_at, id).
+    Сравнение по паре, а не только по времени, не пропускает и не повторяет записи
+    с одинаковым updated_at, попавшие в разные пачки.
+    """
+
+    __slots__ = ('updated_at', 'id')
+    updated_at: datetime.datetime
+    id: str
+
+    @classmethod
+    def start(cls) -> 'Checkpoint':
+        """Отметка до всех записей."""
+        return cls.from_state('1000-01-01 00:00:00.000000 +0000')
+
+    @classmethod
+    def from_state(cls, value: Any) -> 'Checkpoint':
+        """Восстанавливает отметку из состояния. Строка - отметка в прежнем формате (только время)."""
+        if isinstance(value, str):
+            value = {'updated_at': value, 'id': MIN_ID}
+        return cls(
+            updated_at=datetime.datetime.strptime(value['updated_at'], STATE_DATETIME_FORMAT),
+            id=value['id'],
+        )
+
+    def to_state(self) -> dict:
+        """Значение для сохранения в состоянии (оно же - параметры %(updated_at)s и %(id)s запроса извлечения)."""
+        return {'updated_at': self.updated_at.strftime(STATE_DATETIME_FORMAT), 'id': self.id}
+
 
 class BaseStorage:
     """
@@ -34,9 +76,22 @@ class JsonFileStorage(BaseStorage):
         self.file_path = file_path
 
     def save_state(self, state: dict) -> None:
-        """Сохраняет состояние в постоянное хранилище."""
-        with self.file_path.open(mode='w+', encoding='utf-8') as f:
+        """
+        Сохраняет состояние в постоянное хранилище.
+        Запись атомарна: файл пишется рядом, сбрасывается на диск и заменяет прежний,
+        поэтому сбой во время записи не оставляет поврежденный файл.
+        """
+        tmp_path = self.file_path.with_name(f'{self.file_path.name}.tmp')
+        with tmp_path.open(mode='w', encoding='utf-8') as f:
             json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.file_path)
+        dir_fd = os.open(self.file_path.parent.resolve(), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
     def retrieve_state(self) -> dict:
         """Загружает состояние из постоянного хранилища."""
@@ -56,24 +111,54 @@ class JsonFileStorage(BaseStorage):
             return {}
 
 
+class RedisStorage(BaseStorage):
+    """
+    Реализация хранилища использующая Redis: состояние переживает пересоздание контейнера ETL.
+    """
+
+    def __init__(self, redis_client: redis.Redis, key: str = 'ps_to_es:state'):
+        self.redis = redis_client
+        self.key = key
+
+    def save_state(self, state: dict) -> None:
+        """Сохраняет состояние в постоянное хранилище."""
+        self.redis.set(self.key, json.dumps(state, ensure_ascii=False))
+
+    def retrieve_state(self) -> dict:
+        """Загружает состояние из постоянного хранилища."""
+        raw_state = self.redis.get(self.key)
+        if not raw_state:
+            return {}
+        try:
+            return json.loads(raw_state)
+        except json.JSONDecodeError as e:
+            logger.warning(f'Ошибка чтения состояния из Redis по ключу "{self.key}": {e}')
+            return {}
+
+
 class State:
     """
     Класс для хранения состояния при работе с данными, чтобы постоянно не перечитывать данные с начала.
+    Состояние читается из хранилища один раз и держится в памяти, в хранилище пишутся только изменения.
     """
 
     def __init__(self, storage: BaseStorage):
         self.storage = storage
+        self._data: Optional[dict] = None
+        self._lock = threading.Lock()
 
     def set_state(self, key: str, value: Any) -> None:
         """Устанавливает состояние для определённого ключа."""
-        data = self.storage.retrieve_state()
-        data[key] = value
-        logger.debug(f'Устанавливаем значение "{value}" для ключа "{key}".')
-        self.storage.save_state(data)
+        with self._lock:
+            data = {**self._load(), key: value}
+            logger.debug(f'Устанавливаем значение "{value}" для ключа "{key}".')
+            self.storage.save_state(data)
+            self._data = data
 
     def get_state(self, key: str, default: Any = None) -> Any:
         """Возвращает состояние по определённому ключу."""
-        data = self.storage.retrieve_state()
+        with self._lock:
+            data = self._load()
         if key not in data:
             logger.warning(f'Ключ "{key}" не найден! Возвращено значение "{default}".')
             return default
@@ -81,9 +166,27 @@ class State:
         logger.debug(f'Возвращено значение "{value}" для ключа "{key}".')
         return value
 
+    def get_checkpoint(self, key: str) -> Checkpoint:
+        """Возвращает отметку переноса данных по ключу."""
+        value = self.get_state(key)
+        return Checkpoint.start() if value is None else Checkpoint.from_state(value)
+
+    def set_checkpoint(self, key: str, checkpoint: Checkpoint) -> None:
+        """Сохраняет отметку переноса данных по ключу."""
+        self.set_state(key, checkpoint.to_state())
+
+    def _load(self) -> dict:
+        if self._data is None:
+            self._data = self.storage.retrieve_state()
+        return self._data
+
 
 def get_state() -> State:
-    """Возвращает состояние работы с данными."""
+    """Возвращает состояние работы с данными в хранилище, выбранном в настройках."""
+    if settings.state_storage == 'redis':
+        redis_client = redis.Redis(host=settings.redis.host, port=settings.redis.port)
+        return State(RedisStorage(redis_client))
+
     if not storage_path.is_file():
         storage_path.touch(exist_ok=True)
 